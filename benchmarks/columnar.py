@@ -0,0 +1,76 @@
+"""
+Benchmark of the columnar fitting of regular batches
+(`InferenceEngine.get_schema` with `columnar` on and off)
+
+Usage:
+    python benchmarks/columnar.py --count 1000 --width 300 --repeat 3
+
+Workloads:
+    - flat: records with the same `width` keys and random scalar values
+    - nested: records with the same keys, with nested records and arrays of scalars
+    - irregular: records with missing keys (the columnar fitting falls back)
+"""
+import argparse
+import random
+import time
+import jsonschema_inference
+from jsonschema_inference.schema import InferenceEngine
+
+VALUES = [1, 1.5, 'a', None]
+
+
+def flat_json(rng, width):
+    return {f'field_{i}': rng.choice(VALUES) for i in range(width)}
+
+
+def nested_json(rng, width):
+    json = {f'field_{i}': {'value': rng.choice(VALUES), 'tags': ['x'] * rng.randrange(3)}
+            for i in range(width // 2)}
+    json['id'] = rng.randrange(1000)
+    return json
+
+
+def irregular_json(rng, width):
+    return {f'field_{i}': rng.choice(VALUES) for i in range(width) if rng.random() < 0.98}
+
+
+WORKLOADS = {
+    'flat': flat_json,
+    'nested': nested_json,
+    'irregular': irregular_json,
+}
+
+
+def run(count, width, repeat, seed=0):
+    results = []
+    for name, generate in WORKLOADS.items():
+        rng = random.Random(seed)
+        batch = [generate(rng, width) for _ in range(count)]
+        schemas = dict()
+        timings = dict()
+        for columnar in (False, True):
+            jsonschema_inference.init(columnar=columnar, shape_cache_size=0)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                schemas[columnar] = InferenceEngine.get_schema(batch)
+            timings[columnar] = (time.perf_counter() - start) / repeat
+        assert schemas[True] is schemas[False]
+        results.append((name, timings[False], timings[True]))
+        print(f'{name:>10}: per document {timings[False] * 1000:9.2f} ms, '
+              f'columnar {timings[True] * 1000:9.2f} ms '
+              f'(x{timings[False] / timings[True]:.1f})')
+    jsonschema_inference.init()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the columnar fitting of regular batches')
+    parser.add_argument('--count', type=int, default=1000,
+                        help='number of jsons in the batch')
+    parser.add_argument('--width', type=int, default=300,
+                        help='number of fields of the jsons')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    run(args.count, args.width, args.repeat, seed=args.seed)
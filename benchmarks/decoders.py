@@ -0,0 +1,41 @@
+"""
+Benchmark of the json decoder backends
+
+Usage:
+    python benchmarks/decoders.py --jsonl examples/data/small_test.jsonl
+
+Report the lines decoded per second by each installed backend
+(the lines are read as bytes before timing).
+"""
+import argparse
+import time
+from jsonschema_inference.inference.decoders import available_decoders, get_decoder
+
+
+def run(jsonl_path, repeat=3):
+    with open(jsonl_path, 'rb') as f:
+        lines = [line for line in f if not line.isspace()]
+    results = []
+    for name in available_decoders():
+        loads = get_decoder(name)
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for line in lines:
+                loads(line)
+            best = min(best, time.perf_counter() - start)
+        results.append((name, len(lines) / best))
+        print(f'{name:>9}: {len(lines) / best:12.0f} lines/sec')
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the json decoder backends')
+    parser.add_argument('--jsonl', type=str,
+                        default='examples/data/small_test.jsonl',
+                        help='the jsonl file to decode')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of timed runs (the best is reported)')
+    args = parser.parse_args()
+    run(args.jsonl, repeat=args.repeat)
@@ -0,0 +1,64 @@
+"""
+Benchmark of the executor backends of the inference stage
+across batch sizes (`json_per_worker` of `APIInferenceEngine`)
+
+Usage:
+    python benchmarks/executors.py --count 20000 --workers 4 --batch-sizes 10 100 1000
+
+The jsons are generated in memory (no downloading), so only
+the inference stage and the transfer of the batches / schemas are timed.
+(The pool startup is included, as it is paid once per `get_schema`.)
+"""
+import argparse
+import random
+import time
+from jsonschema_inference.inference import APIInferenceEngine
+from jsonschema_inference.inference.executors import EXECUTORS, get_executor
+from jsonschema_inference.inference.pipeline import bounded_imap_unordered
+from jsonschema_inference.schema import InferenceEngine
+from jsonschema_inference.schema.inference.reduce import reduce_schema
+
+
+def package_json(rng, i):
+    return {
+        'info': {'name': f'package-{i}', 'version': '1.0',
+                 'summary': rng.choice(['a package', None]),
+                 'classifiers': ['Programming Language :: Python'] * rng.randrange(5)},
+        'releases': {f'0.{v}': [{'size': rng.randrange(10000), 'yanked': False,
+                                 'digests': {'md5': 'x', 'sha256': 'y'}}]
+                     for v in range(rng.randrange(1, 10))}
+    }
+
+
+def run(count, workers, batch_sizes, executors, seed=0):
+    rng = random.Random(seed)
+    jsons = [(package_json(rng, i), str(i)) for i in range(count)]
+    results = []
+    for name in executors:
+        for batch_size in batch_sizes:
+            start = time.perf_counter()
+            with get_executor(name, workers) as pool:
+                batches = InferenceEngine._batchwise_generator(jsons, batch_size=batch_size)
+                reduce_schema(schema for schema, _ in bounded_imap_unordered(
+                    pool, APIInferenceEngine._pr_run, batches, max_pending=2 * workers))
+            elapsed = time.perf_counter() - start
+            results.append((name, batch_size, elapsed))
+            print(f'{name:>8} batch={batch_size:<6}: {elapsed * 1000:9.2f} ms '
+                  f'({count / elapsed:10.0f} jsons/sec)')
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the executor backends of the inference stage')
+    parser.add_argument('--count', type=int, default=20000,
+                        help='number of jsons inferenced')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='number of inference workers')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[10, 100, 1000],
+                        help='json_per_worker values to compare')
+    parser.add_argument('--executors', nargs='+', default=['thread', 'process', 'inline'],
+                        choices=EXECUTORS)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    run(args.count, args.workers, args.batch_sizes, args.executors, seed=args.seed)
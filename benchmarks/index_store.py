@@ -0,0 +1,111 @@
+"""
+Benchmark of the stores of the processed indices:
+`IndexCuckooFilter` (approximate, in memory) vs `SQLiteIndexStore` (exact, on disk)
+
+Usage:
+    python benchmarks/index_store.py --count 10000000 --processed 0.5
+
+For each store, in a fresh process (so that the peak RSS is its own):
+- build: building the store from `index_generator()` (the cuckoo filter only)
+- remove: recording the `processed` share of the indices as processed, then saving
+- filter: filtering `index_generator()` (after reloading the store from disk)
+- errors: number of indices wrongly filtered in or out
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import resource
+import tempfile
+import time
+from jsonschema_inference.inference.api import IndexCuckooFilter
+from jsonschema_inference.inference.index_store import SQLiteIndexStore
+
+
+def indices(count):
+    return (f'package-{i}' for i in range(count))
+
+
+def is_processed(i, processed):
+    # spread the processed indices over the index space
+    return (i * 2654435761) % 1000 < processed * 1000
+
+
+def run_store(name, count, processed, directory, results):
+    path = os.path.join(directory, f'{name}.dump')
+    timings = dict()
+    start = time.perf_counter()
+    if name == 'cuckoo':
+        store = IndexCuckooFilter(lambda: indices(count), dump_file_path=path)
+    else:
+        store = SQLiteIndexStore(path)
+    timings['build'] = time.perf_counter() - start
+    start = time.perf_counter()
+    for i, index in enumerate(indices(count)):
+        if is_processed(i, processed):
+            store.remove(index)
+    store.save()
+    timings['remove'] = time.perf_counter() - start
+    del store
+    start = time.perf_counter()
+    if name == 'cuckoo':
+        store = IndexCuckooFilter(lambda: indices(count), dump_file_path=path)
+    else:
+        store = SQLiteIndexStore(path)
+    pending_cnt = sum(1 for _ in store.filter(indices(count)))
+    timings['filter'] = time.perf_counter() - start
+    # NOTE: the stores filter in order
+    pending = store.filter(indices(count))
+    next_pending = next(pending, None)
+    errors = 0
+    for i, index in enumerate(indices(count)):
+        is_pending = index == next_pending
+        if is_pending:
+            next_pending = next(pending, None)
+        errors += is_pending == is_processed(i, processed)
+    size = sum(os.path.getsize(os.path.join(directory, file))
+               for file in os.listdir(directory) if file.startswith(name))
+    results.put(dict(
+        store=name, count=count, pending=pending_cnt, errors=errors, dump_bytes=size,
+        peak_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        **{f'{key}_sec': value for key, value in timings.items()}))
+
+
+def run(count, processed, stores):
+    context = multiprocessing.get_context('spawn')
+    rows = []
+    for name in stores:
+        with tempfile.TemporaryDirectory() as directory:
+            results = context.Queue()
+            process = context.Process(
+                target=run_store, args=(name, count, processed, directory, results))
+            process.start()
+            row = None
+            while row is None and (process.is_alive() or not results.empty()):
+                try:
+                    row = results.get(timeout=1)
+                except queue.Empty:
+                    pass
+            process.join()
+        if row is None:
+            # e.g., killed when out of memory
+            print(f'{name:>7}: failed (exit code {process.exitcode})')
+            continue
+        rows.append(row)
+        print(f"{name:>7}: build {row['build_sec']:8.2f}s remove {row['remove_sec']:8.2f}s "
+              f"filter {row['filter_sec']:8.2f}s errors {row['errors']:>8} "
+              f"dump {row['dump_bytes'] / 1e6:8.1f}MB peak rss {row['peak_rss_mb']:8.1f}MB")
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the stores of the processed indices')
+    parser.add_argument('--count', type=int, default=10_000_000,
+                        help='number of indices')
+    parser.add_argument('--processed', type=float, default=0.5,
+                        help='share of the indices processed')
+    parser.add_argument('--stores', nargs='+', default=['cuckoo', 'sqlite'],
+                        choices=['cuckoo', 'sqlite'])
+    args = parser.parse_args()
+    run(args.count, args.processed, args.stores)
@@ -0,0 +1,70 @@
+"""
+Micro-benchmark of the `reduce_schema` strategies
+
+Usage:
+    python benchmarks/reduce_strategies.py --count 2000 --repeat 3
+
+Workloads:
+    - wide: records with hundreds of fields (each field sometimes missing)
+    - deep: deeply nested records
+    - heterogeneous: records with many different keys and value types
+"""
+import argparse
+import random
+import time
+from jsonschema_inference import fit
+from jsonschema_inference.schema.inference.reduce import reduce_schema, STRATEGIES
+
+VALUES = [1, 1.5, 'a', True, None]
+
+
+def wide_json(rng, width=300):
+    return {f'field_{i}': rng.choice(VALUES[:3])
+            for i in range(width) if rng.random() < 0.98}
+
+
+def deep_json(rng, depth=30):
+    json = {'leaf': rng.choice(VALUES)}
+    for i in range(depth):
+        json = {'level': i, 'child': json, 'tags': ['x'] * rng.randint(0, 3)}
+    return json
+
+
+def heterogeneous_json(rng, key_cnt=2000):
+    return {f'key_{rng.randrange(key_cnt)}': rng.choice(VALUES)
+            for _ in range(rng.randint(1, 20))}
+
+
+WORKLOADS = {
+    'wide': wide_json,
+    'deep': deep_json,
+    'heterogeneous': heterogeneous_json
+}
+
+
+def run(count, repeat, seed=0):
+    results = []
+    for name, generate in WORKLOADS.items():
+        rng = random.Random(seed)
+        schemas = [fit(generate(rng)) for _ in range(count)]
+        for strategy in STRATEGIES:
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                reduce_schema(iter(schemas), strategy=strategy)
+                best = min(best, time.perf_counter() - start)
+            results.append((name, strategy, best))
+            print(f'{name:>14} {strategy:>7}: {best * 1000:9.2f} ms')
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the reduce_schema strategies')
+    parser.add_argument('--count', type=int, default=2000,
+                        help='number of schemas to reduce per workload')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of timed runs (the best is reported)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    run(args.count, args.repeat, seed=args.seed)
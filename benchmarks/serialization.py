@@ -0,0 +1,69 @@
+"""
+Benchmark of the json schema serialization formats:
+the binary format of `schema.serialization`, pickle (which wraps the
+binary format), pickle node by node (the former pickling of the schemas)
+and repr / eval (the former wire format of the execnet engines)
+
+Usage:
+    python benchmarks/serialization.py --count 2000 --repeat 5
+"""
+import argparse
+import copyreg
+import io
+import pickle
+import random
+import timeit
+from collections import Counter  # noqa: F401 (used by eval)
+from jsonschema_inference import fit
+from jsonschema_inference.schema.inference.reduce import reduce_schema
+from jsonschema_inference.schema.objs import *  # noqa: F401,F403 (used by eval)
+from jsonschema_inference.schema.serialization import dumps, loads
+from reduce_strategies import WORKLOADS
+
+# the reduction of each schema node into its class and arguments
+_NODE_TABLE = copyreg.dispatch_table.copy()
+for _cls in (Unknown, Atomic, Union, Optional, Array, Record, DynamicRecord, UniformRecord):  # noqa: F405
+    _NODE_TABLE[_cls] = lambda schema: (type(schema), schema._args())
+
+
+def node_pickle(schema) -> bytes:
+    out = io.BytesIO()
+    pickler = pickle.Pickler(out, protocol=pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = _NODE_TABLE
+    pickler.dump(schema)
+    return out.getvalue()
+
+
+FORMATS = {
+    'binary': (dumps, loads),
+    'pickle': (lambda schema: pickle.dumps(schema, protocol=pickle.HIGHEST_PROTOCOL), pickle.loads),
+    'node pickle': (node_pickle, pickle.loads),
+    'repr': (repr, eval)
+}
+
+
+def run(count, repeat, seed=0):
+    results = []
+    for name, generate in WORKLOADS.items():
+        rng = random.Random(seed)
+        schema = reduce_schema(fit(generate(rng)) for _ in range(count))
+        for fmt, (serialize, deserialize) in FORMATS.items():
+            data = serialize(schema)
+            dump_time = min(timeit.repeat(lambda: serialize(schema), number=1, repeat=repeat))
+            load_time = min(timeit.repeat(lambda: deserialize(data), number=1, repeat=repeat))
+            results.append((name, fmt, len(data), dump_time, load_time))
+            print(f'{name:>14} {fmt:>11}: {len(data):9d} bytes, dumps {dump_time * 1000:8.3f} ms, '
+                  f'loads {load_time * 1000:8.3f} ms')
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the json schema serialization formats')
+    parser.add_argument('--count', type=int, default=2000,
+                        help='number of jsons fitted into the schema per workload')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of timed runs (the best is reported)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    run(args.count, args.repeat, seed=args.seed)
@@ -0,0 +1,261 @@
+"""
+Benchmark suite of the json schema inference
+
+Usage:
+    python benchmarks/suite.py --count 1000 --workers 1 2 4 --output results.json
+    python benchmarks/suite.py --benchmarks fit reduce_schema --workloads pypi_like
+    python benchmarks/suite.py --output new.json --compare results.json --tolerance 0.2
+
+Benchmarks, on each workload of `benchmarks/workloads.py`:
+    - fit: `fit` of each json
+    - reduce_schema: `reduce_schema` of the fitted jsons, with each strategy
+    - get_schema_iteratively: `InferenceEngine.get_schema_iteratively` of the jsons
+    - jsonl: `JsonlInferenceEngine.get_schema` of a jsonl file of the jsons,
+        with each number of `workers`
+    - api: `APIInferenceEngine.get_schema` of the jsons downloaded from a local HTTP
+        stub (the first `api_count` jsons, as the downloads dominate)
+
+Each benchmark is timed `repeat` times from cold caches, and the best timing is
+reported (`seconds`): before each run, the config is reset, the shape cache
+is cleared and the interned schemas left from the previous runs are collected.
+The timing of one more run right after, with the caches warm, is reported as
+`warm_seconds` (the comparison with a baseline uses `seconds`).
+
+The results are written as json to `output` (with the python version, the
+platform and the git commit). With `compare`, the results slower than those
+of the baseline file by more than `tolerance` are reported, and the
+suite exits with status 1.
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import typing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import jsonschema_inference
+from jsonschema_inference import fit
+from jsonschema_inference.inference import APIInferenceEngine, JsonlInferenceEngine
+from jsonschema_inference.schema import InferenceEngine
+from jsonschema_inference.schema.inference.reduce import reduce_schema, STRATEGIES
+from jsonschema_inference.schema.shape import shape_cache
+from workloads import WORKLOADS, generate
+
+BENCHMARKS = ['fit', 'reduce_schema', 'get_schema_iteratively', 'jsonl', 'api']
+
+
+def reset():
+    """
+    Reset the caches: the config, the shape cache and
+    the interned schemas not referenced anymore.
+    """
+    jsonschema_inference.init()
+    shape_cache.clear()
+    gc.collect()
+
+
+def best_of(repeat: int, func: typing.Callable[[], typing.Any]) -> typing.Tuple[float, float]:
+    """
+    The best timing of `repeat` cold runs, and the timing of a warm run.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        reset()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    start = time.perf_counter()
+    func()
+    return best, time.perf_counter() - start
+
+
+def bench_fit(jsons, args):
+    yield (dict(), len(jsons)) + best_of(args.repeat, lambda: [fit(json) for json in jsons])
+
+
+def bench_reduce_schema(jsons, args):
+    schemas = [fit(json) for json in jsons]
+    for strategy in STRATEGIES:
+        # NOTE: the fitted schemas (the input) stay interned
+        yield ({'strategy': strategy}, len(jsons)) + best_of(
+            args.repeat, lambda: reduce_schema(iter(schemas), strategy=strategy))
+
+
+def bench_get_schema_iteratively(jsons, args):
+    yield ({'batch_size': args.batch_size}, len(jsons)) + best_of(
+        args.repeat,
+        lambda: InferenceEngine(batch_size=args.batch_size).get_schema_iteratively(iter(jsons)))
+
+
+def bench_jsonl(jsons, args):
+    path = os.path.join(args.tmp_dir, 'workload.jsonl')
+    with open(path, 'w') as f:
+        for json_dict in jsons:
+            f.write(json.dumps(json_dict) + '\n')
+
+    class Engine(JsonlInferenceEngine):
+        @property
+        def jsonl_path(self):
+            return path
+    for workers in args.workers:
+        yield ({'workers': workers}, len(jsons)) + best_of(
+            args.repeat,
+            lambda: Engine(inference_worker_cnt=workers).get_schema(verbose=False))
+
+
+@contextlib.contextmanager
+def serve(jsons: typing.List[dict]):
+    """
+    A local HTTP stub serving the jsons at `/json/<i>` (yields its url).
+    """
+    bodies = [json.dumps(json_dict).encode() for json_dict in jsons]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            body = bodies[int(self.path.rsplit('/', 1)[1])]
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def bench_api(jsons, args):
+    jsons = jsons[:args.api_count]
+    with serve(jsons) as url:
+        class Engine(APIInferenceEngine):
+            def index_generator(self) -> typing.Iterable[str]:
+                return map(str, range(len(jsons)))
+
+            def get_url(self, index: str) -> str:
+                return f'{url}/json/{index}'
+
+            def is_valid_json(self, json_dict: typing.Dict) -> bool:
+                return True
+
+        def run():
+            # NOTE: a fresh dump directory, as the indices already processed are skipped
+            dump_dir = tempfile.mkdtemp(dir=args.tmp_dir)
+            engine = Engine(
+                api_thread_cnt=args.api_threads, inference_worker_cnt=1,
+                json_per_worker=args.batch_size,
+                cuckoo_dump=os.path.join(dump_dir, 'cuckoo.pickle'),
+                schema_dump=os.path.join(dump_dir, 'schema.pickle'))
+            engine.get_schema(verbose=False)
+        timings = best_of(args.repeat, run)
+    yield ({'api_threads': args.api_threads}, len(jsons)) + timings
+
+
+def git_commit() -> typing.Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    results = []
+    for workload in args.workloads:
+        jsons = generate(workload, args.count, seed=args.seed)
+        for benchmark in args.benchmarks:
+            for params, documents, seconds, warm_seconds in globals()[f'bench_{benchmark}'](jsons, args):
+                results.append({'benchmark': benchmark, 'workload': workload, 'params': params,
+                                'documents': documents, 'seconds': seconds,
+                                'documents_per_second': documents / seconds,
+                                'warm_seconds': warm_seconds})
+                param_text = ' '.join(f'{key}={value}' for key, value in params.items())
+                print(f'{workload:>18} {benchmark:>22} {param_text:<20}: '
+                      f'{seconds * 1000:10.2f} ms ({documents / seconds:10.0f} jsons/sec), '
+                      f'warm {warm_seconds * 1000:10.2f} ms')
+    return {
+        'python': sys.version,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'commit': git_commit(),
+        'time': time.time(),
+        'args': {key: value for key, value in vars(args).items()
+                 if key not in ('output', 'compare', 'tmp_dir')},
+        'results': results,
+    }
+
+
+def _key(result: dict) -> typing.Tuple[str, str, str]:
+    return result['benchmark'], result['workload'], json.dumps(result['params'], sort_keys=True)
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> typing.List[dict]:
+    """
+    The results slower than those of the baseline by more than `tolerance`
+    (the results missing from the baseline are ignored).
+    """
+    baseline_seconds = {_key(result): result['seconds'] for result in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        before = baseline_seconds.get(_key(result))
+        if before is not None and result['seconds'] > before * (1 + tolerance):
+            regressions.append(dict(result, baseline_seconds=before,
+                                    slowdown=result['seconds'] / before))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the json schema inference on synthetic workloads')
+    parser.add_argument('--count', type=int, default=1000,
+                        help='number of jsons per workload')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of timed runs (the best is reported)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workloads', nargs='+', default=list(WORKLOADS), choices=list(WORKLOADS))
+    parser.add_argument('--benchmarks', nargs='+', default=BENCHMARKS, choices=BENCHMARKS)
+    parser.add_argument('--batch-size', type=int, default=100,
+                        help='batch size of InferenceEngine / json_per_worker of APIInferenceEngine')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4],
+                        help='numbers of workers of JsonlInferenceEngine')
+    parser.add_argument('--api-count', type=int, default=200,
+                        help='number of jsons downloaded by APIInferenceEngine')
+    parser.add_argument('--api-threads', type=int, default=16,
+                        help='number of downloading threads of APIInferenceEngine')
+    parser.add_argument('--output', default=None,
+                        help='path to write the json results to')
+    parser.add_argument('--compare', default=None,
+                        help='path to the json results of a baseline run')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='slowdown over the baseline reported as a regression')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        args.tmp_dir = tmp_dir
+        report = run(args)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for result in regressions:
+            print(f'regression: {result["workload"]} {result["benchmark"]} {result["params"]}: '
+                  f'{result["baseline_seconds"] * 1000:.2f} ms -> {result["seconds"] * 1000:.2f} ms '
+                  f'(x{result["slowdown"]:.2f})')
+        if regressions:
+            sys.exit(1)
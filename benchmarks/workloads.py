@@ -0,0 +1,76 @@
+"""
+Seeded generators of synthetic json workloads (used by `benchmarks/suite.py`)
+
+Workloads:
+    - flat_wide: records with hundreds of scalar fields (each sometimes missing)
+    - deep_nested: records nested dozens of levels deep
+    - pypi_like: PyPI-like package documents, whose `releases` maps versions
+        to lists of files (fitted as a UniformRecord)
+    - heterogeneous_keys: records with keys drawn from thousands of distinct
+        ones (merged into a DynamicRecord with a large key counter)
+    - long_arrays: records with arrays of thousands of scalars
+
+The same `seed` always generates the same jsons.
+"""
+import random
+import typing
+
+__all__ = ['WORKLOADS', 'generate']
+
+VALUES = [1, 1.5, 'a', True, None]
+
+
+def flat_wide(rng: random.Random, width: int = 300) -> dict:
+    return {f'field_{i}': rng.choice(VALUES[:3])
+            for i in range(width) if rng.random() < 0.98}
+
+
+def deep_nested(rng: random.Random, depth: int = 30) -> dict:
+    json: dict = {'leaf': rng.choice(VALUES)}
+    for i in range(depth):
+        json = {'level': i, 'child': json, 'tags': ['x'] * rng.randint(0, 3)}
+    return json
+
+
+def pypi_like(rng: random.Random) -> dict:
+    return {
+        'info': {'name': f'package-{rng.randrange(100000)}', 'version': '1.0',
+                 'summary': rng.choice(['a package', None]),
+                 'requires_dist': rng.choice([None, ['requests>=2', 'numpy']]),
+                 'classifiers': ['Programming Language :: Python'] * rng.randrange(5)},
+        'releases': {f'0.{v}': [{'size': rng.randrange(10000), 'yanked': False,
+                                 'upload_time': '2020-01-01T00:00:00',
+                                 'digests': {'md5': 'x', 'sha256': 'y'}}
+                                for _ in range(rng.randrange(3))]
+                     for v in range(rng.randrange(1, 20))},
+        'urls': [],
+    }
+
+
+def heterogeneous_keys(rng: random.Random, key_cnt: int = 2000) -> dict:
+    return {f'key_{rng.randrange(key_cnt)}': rng.choice(VALUES)
+            for _ in range(rng.randint(1, 20))}
+
+
+def long_arrays(rng: random.Random, length: int = 2000) -> dict:
+    return {'id': rng.randrange(1000),
+            'values': [rng.random() for _ in range(rng.randrange(length))],
+            'flags': [rng.random() < 0.5 for _ in range(rng.randrange(length))],
+            'labels': [rng.choice(['a', 'b', None]) for _ in range(rng.randrange(length // 10))]}
+
+
+WORKLOADS: typing.Dict[str, typing.Callable[[random.Random], dict]] = {
+    'flat_wide': flat_wide,
+    'deep_nested': deep_nested,
+    'pypi_like': pypi_like,
+    'heterogeneous_keys': heterogeneous_keys,
+    'long_arrays': long_arrays,
+}
+
+
+def generate(name: str, count: int, seed: int = 0) -> typing.List[dict]:
+    """
+    Generate `count` jsons of a workload.
+    """
+    rng = random.Random(seed)
+    return [WORKLOADS[name](rng) for _ in range(count)]
@@ -1,3 +1,12 @@
-from .config import init
+import functools
+from .config import config as _config
 from .schema.fitter import fit
+from .schema.shape import shape_cache
 __all__ = ['init', 'fit']
+
+
+@functools.wraps(_config.init)
+def init(*args, **kwargs):
+    _config.init(*args, **kwargs)
+    # NOTE: the schemas cached under the previous config are dropped
+    shape_cache.clear()
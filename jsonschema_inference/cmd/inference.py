@@ -1,6 +1,6 @@
 import argparse
 import autopep8
-from jsonschema_inference.inference import JsonlInferenceEngine
+from jsonschema_inference.inference import JsonlInferenceEngine, Metrics
 
 
 def run() -> None:
@@ -15,6 +15,47 @@ def run() -> None:
                         type=int, required=False, default=1,
                         help="Inference Worker Count")
 
+    parser.add_argument('--engine',
+                        type=str, required=False, default='native',
+                        choices=['native', 'pypy', 'python'],
+                        help="Parallel Inference Engine (native: worker processes, pypy/python: execnet gateways)")
+
+    parser.add_argument('--decoder',
+                        type=str, required=False, default='json',
+                        choices=['auto', 'json', 'orjson', 'ujson', 'simdjson'],
+                        help="Json Decoder Backend (fall back to json if not installed)")
+
+    parser.add_argument('--format',
+                        type=str, required=False, default='jsonl',
+                        choices=['jsonl', 'array', 'stream'],
+                        help="Input Format (jsonl: one json per line, array: a top-level json array, stream: concatenated jsons)")
+
+    parser.add_argument('--sampling',
+                        type=str, required=False, default=None,
+                        choices=['reservoir', 'offset'],
+                        help="Inference a Sample of the Lines (reservoir: uniform sample read through, offset: lines at random offsets)")
+
+    parser.add_argument('--sample-size',
+                        type=int, required=False, default=10000,
+                        help="Number of Lines Sampled")
+
+    parser.add_argument('--converge-after',
+                        type=int, required=False, default=None,
+                        help="Stop once the Schema has not Changed for this Number of Batches")
+
+    parser.add_argument('--state',
+                        type=str, required=False, default=None,
+                        help="Inference Incrementally: only the Lines Appended since the Run Saving this State File")
+
+    parser.add_argument('--verify-prefix',
+                        type=str, required=False, default='full',
+                        choices=['full', 'sample'],
+                        help="How the Processed Prefix is Checked (full: read through, the default; sample: blocks seeked, faster but misses edits between them)")
+
+    parser.add_argument('--metrics',
+                        type=str, required=False, default=None,
+                        help="Saving the Metrics of the Run (Throughput, Time per Stage, Peak RSS) into a json File")
+
     parser.add_argument('--verbose',
                         type=bool, required=False, default=False,
                         help="Showing the Result by Pretty Print")
@@ -32,9 +73,22 @@ def run() -> None:
         def jsonl_path(self):
             return args.jsonl
 
-    schema = Engine(
-        inference_worker_cnt=args.nworkers).get_schema(
-        verbose=args.verbose)
+    engine = Engine(
+        inference_worker_cnt=args.nworkers,
+        engine=args.engine,
+        decoder=args.decoder,
+        input_format=args.format,
+        sampling=args.sampling,
+        sample_size=args.sample_size,
+        converge_after=args.converge_after,
+        state_path=args.state,
+        verify_prefix=args.verify_prefix,
+        metrics=Metrics(report_path=args.metrics))
+    schema = engine.get_schema(verbose=args.verbose)
+    if engine.documents_seen is not None:
+        print('documents seen:', engine.documents_seen)
+    if engine.rebuilt is not None:
+        print('rebuilt:', engine.rebuilt)
     schema_str = autopep8.fix_code(str(schema))
     if args.verbose:
         print(schema_str)
@@ -1,6 +1,7 @@
 """
 Config the Json Schema Inference Model
 """
+import typing
 
 
 class Config:
@@ -9,17 +10,72 @@ class Config:
         - kind: Turn on DynamicRecord for unifing Records with different fields
         - label: Turn off DynamicRecord and construct Union of Records with inconsistent fields
     - 2. enable_uniform_record: True | False (whether try to unify Record values for Record with values of same kind)
+    - 3. shape_cache_size: max number of document shapes whose fitted schema is cached (0 disables the cache)
+    - 4. decoder: json decoder backend: auto | json | orjson | ujson | simdjson
+        (fall back to json if the backend is not installed. See `inference.decoders`)
+    - 5. columnar: True | False (whether batches of regular records are fitted column by column.
+        See `schema.columnar`)
+    - 6. array_sample_size: max number of elements of an array fitted (0 fits them all).
+        The elements of a longer array are sampled evenly. See `schema.fitter.sampling_stats`.
+    - 7. profile: True | False (whether the merges of the schemas are profiled during the runs of
+        `InferenceEngine`, reported as its `profile`. See `schema.profiling`)
+        - profile_slowest: number of the slowest merges reported
+        - profile_dump: path to save a cProfile / pstats dump of each run to (not saved if None)
     """
 
-    def __init__(self, unify_records=True, equivalence_mode='kind'):
+    def __init__(self, unify_records=True, equivalence_mode='kind',
+                 shape_cache_size=1024, decoder='json', columnar=True,
+                 array_sample_size=0, profile=False, profile_slowest=10, profile_dump=None):
         self.init(
             unify_records=unify_records,
-            equivalence_mode=equivalence_mode)
+            equivalence_mode=equivalence_mode,
+            shape_cache_size=shape_cache_size,
+            decoder=decoder,
+            columnar=columnar,
+            array_sample_size=array_sample_size,
+            profile=profile,
+            profile_slowest=profile_slowest,
+            profile_dump=profile_dump)
 
-    def init(self, unify_records=True, equivalence_mode='kind'):
+    def init(self, unify_records=True, equivalence_mode='kind',
+             shape_cache_size=1024, decoder='json', columnar=True,
+             array_sample_size=0, profile=False, profile_slowest=10, profile_dump=None):
         self._unify_records = unify_records
         assert equivalence_mode == 'kind' or equivalence_mode == 'label'
         self._equivalence_mode = equivalence_mode
+        assert shape_cache_size >= 0
+        self._shape_cache_size = shape_cache_size
+        self._decoder = decoder
+        self._columnar = columnar
+        assert array_sample_size >= 0
+        self._array_sample_size = array_sample_size
+        self._profile = profile
+        assert profile_slowest >= 0
+        self._profile_slowest = profile_slowest
+        self._profile_dump = profile_dump
+
+    def state(self) -> dict:
+        """
+        The arguments of `init` giving the current config
+        (e.g. to init the config of the worker processes).
+        """
+        return dict(
+            unify_records=self._unify_records,
+            equivalence_mode=self._equivalence_mode,
+            shape_cache_size=self._shape_cache_size,
+            decoder=self._decoder,
+            columnar=self._columnar,
+            array_sample_size=self._array_sample_size,
+            profile=self._profile,
+            profile_slowest=self._profile_slowest,
+            profile_dump=self._profile_dump)
+
+    def fingerprint(self) -> str:
+        """
+        The settings changing the json schemas fitted
+        (e.g. to tell the schemas cached under another config).
+        """
+        return f'{self._unify_records}:{self._equivalence_mode}:{self._array_sample_size}'
 
     @property
     def unify_records(self) -> bool:
@@ -29,6 +85,34 @@ class Config:
     def equivalence_mode(self) -> str:
         return self._equivalence_mode
 
+    @property
+    def shape_cache_size(self) -> int:
+        return self._shape_cache_size
+
+    @property
+    def decoder(self) -> str:
+        return self._decoder
+
+    @property
+    def columnar(self) -> bool:
+        return self._columnar
+
+    @property
+    def array_sample_size(self) -> int:
+        return self._array_sample_size
+
+    @property
+    def profile(self) -> bool:
+        return self._profile
+
+    @property
+    def profile_slowest(self) -> int:
+        return self._profile_slowest
+
+    @property
+    def profile_dump(self) -> typing.Optional[str]:
+        return self._profile_dump
+
 
 config = Config()
 init = config.init
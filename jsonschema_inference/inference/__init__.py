@@ -1,3 +1,8 @@
 from .api import APIInferenceEngine
+from .fetch import AsyncFetcher
+from .http_cache import ResponseCache
 from .jsonl import JsonlInferenceEngine
-__all__ = ['APIInferenceEngine', 'JsonlInferenceEngine']
+from .metrics import Metrics
+from .rate_limit import RateController
+__all__ = ['APIInferenceEngine', 'AsyncFetcher', 'JsonlInferenceEngine', 'Metrics',
+           'RateController', 'ResponseCache']
@@ -36,21 +36,40 @@ https://dl.acm.org/doi/pdf/10.1145/2674005.2674994
 
 """
 import abc
+import collections
+import contextlib
+import functools
 import os
 import pickle
 import math
 import logging
 import signal
+import struct
 import sys
+import threading
+import time
 import typing
 import requests
 import tqdm
 from multiprocessing.pool import ThreadPool
 import json as json_package
-from ..schema.objs import JsonSchema
-from ..schema import InferenceEngine
+from ..schema.objs import JsonSchema, Unknown
+from ..schema import InferenceEngine, serialization
+from ..schema.inference.reduce import reduce_schema
+from .archive import ArchiveWriter
+from .checkpoint import DeltaLog, read_snapshot, write_snapshot
+from .decoders import get_decoder
+from .executors import get_executor
+from .fetch import RETRY_STATUSES, AsyncFetcher, HTTPError
+from .http_cache import CachedSchema, FittedJson, ResponseCache, fetch_cached
+from .index_store import SQLiteIndexStore
+from .rate_limit import RateController
+from .metrics import Metrics
+from .pipeline import bounded_imap_unordered
 
-__all__ = ['APIInferenceEngine']
+__all__ = ['APIInferenceEngine', 'INDEX_STORES']
+
+INDEX_STORES = ('cuckoo', 'sqlite')
 
 
 class APIInferenceEngine:
@@ -58,9 +77,33 @@ class APIInferenceEngine:
     Args:
         - api_thread_cnt: number of threads downloading json from url
         - inference_worker_cnt: number of processes inferencing the json schema
+        - executor: the executor backend of the inference workers: 'thread', 'process', 'inline' or 'ray'
+            ('process' if inference_worker_cnt > 1 else 'thread' if not provided. See `inference.executors`)
         - json_per_worker: number of json files an inference worker takes as input
         - cuckoo_dump: path to a dump file to store the record of processed index
+        - index_store: the store of the processed indices: 'cuckoo' (`IndexCuckooFilter`, approximate,
+            built in memory from `index_generator`) or 'sqlite' (`SQLiteIndexStore`, exact, on disk)
         - schema_dump: path to a dump to store the inferenced json schema.
+        - jsonl_dump: path to a jsonl archive the jsons are appended to (not archived if not provided)
+        - jsonl_compression / jsonl_rotate_bytes: the compression ('gzip' or 'zstd') and
+            the max shard size of the archive (see `archive.ArchiveWriter`)
+        - async_fetcher: an `AsyncFetcher` downloading the jsons with asyncio
+            (pooled keep-alive connections, timeouts and retries)
+            instead of the `api_thread_cnt` threads.
+        - fetch_queue_size: max number of jsons being downloaded or waiting to be inferenced
+            (2 * api_thread_cnt if not provided. Ignored with `async_fetcher`, see its `max_in_flight`)
+        - inference_queue_size: max number of json batches being inferenced or waiting to be reduced
+            (2 * inference_worker_cnt if not provided)
+        - checkpoint_every_batches / checkpoint_every_seconds / compact_bytes:
+            how often the reduced batches are made durable, and the log size
+            triggering a background snapshot (see `SchemaReducer`)
+        - response_cache: a `ResponseCache` making the downloads conditional: the json
+            schema of an unmodified json is reused from the cache (see `http_cache`)
+        - rate_controller: a `RateController` adapting the requests in flight to each host
+            (the `api_thread_cnt` threads wait for its window. See `rate_limit`;
+            for `async_fetcher`, pass it to the `AsyncFetcher`)
+        - metrics: the `Metrics` of the runs (with a json report, snapshots or a
+            Prometheus endpoint if configured. See `inference.metrics`)
     Methods to be overide:
         - index_generator: a generator yeilding index (or url) strings referencing to a json file
         - index_to_url: a function takes the index from index_generator as input and convert it to an url
@@ -70,30 +113,60 @@ class APIInferenceEngine:
     """
 
     def __init__(self, api_thread_cnt=1000, inference_worker_cnt=4, json_per_worker=1000,
-                 cuckoo_dump='cuckoo.pickle', schema_dump='schema.pickle', jsonl_dump=None):
+                 cuckoo_dump='cuckoo.pickle', schema_dump='schema.pickle', jsonl_dump=None,
+                 async_fetcher: typing.Optional[AsyncFetcher] = None,
+                 fetch_queue_size=None, inference_queue_size=None, executor=None,
+                 checkpoint_every_batches=10, checkpoint_every_seconds=10.,
+                 compact_bytes=16 << 20, index_store='cuckoo',
+                 jsonl_compression=None, jsonl_rotate_bytes=None,
+                 response_cache: typing.Optional[ResponseCache] = None,
+                 rate_controller: typing.Optional[RateController] = None,
+                 metrics: typing.Optional[Metrics] = None):
         self._api_thread_cnt = api_thread_cnt
+        self._async_fetcher = async_fetcher
+        self._response_cache = response_cache
+        self._rate_controller = rate_controller
+        self._fetch_queue_size = fetch_queue_size or 2 * api_thread_cnt
+        self._inference_queue_size = inference_queue_size or 2 * inference_worker_cnt
+        self.metrics = Metrics() if metrics is None else metrics
+        # numbers of the items passed through each stage of `get_schema`
+        self.counter: collections.Counter = self.metrics.counter
         self._inference_worker_cnt = inference_worker_cnt
-        if self._inference_worker_cnt > 1:
-            from ray.util.multiprocessing import Pool
-            self.Pool = Pool
-        else:
-            self.Pool = ThreadPool
+        if executor is None:
+            executor = 'process' if inference_worker_cnt > 1 else 'thread'
+        self._executor = executor
         self._json_per_worker = json_per_worker
-        self._index_filter = IndexCuckooFilter(
-            self.index_generator, dump_file_path=cuckoo_dump)
-        self._schema_holder = SchemaReducer(
-            self._index_filter, dump_file_path=schema_dump)
-        self._register_graceful_exist(
-            [self._index_filter, self._schema_holder])
+        assert index_store in INDEX_STORES, f'index_store should be one of {INDEX_STORES}'
+        self._index_filter = self._build_index_store(index_store, cuckoo_dump)
         self._jsonl_dump = jsonl_dump
         if self._jsonl_dump is not None:
-            self._jsonl_index_filter = IndexCuckooFilter(
-                self.index_generator, dump_file_path='jsonl_cuckoo.pickle'
-            )
+            self._jsonl_index_filter = self._build_index_store(
+                index_store,
+                'jsonl_cuckoo.pickle' if index_store == 'cuckoo' else 'jsonl_index.sqlite')
             self._jsonl_saver = JsonlSaver(
                 self._jsonl_index_filter,
-                archieve_file_path=jsonl_dump)
-            self._register_graceful_exist([self._jsonl_index_filter])
+                archieve_file_path=jsonl_dump, compression=jsonl_compression,
+                rotate_bytes=jsonl_rotate_bytes,
+                refetch=lambda index: APIInferenceEngine._get_json(self.get_url(index)))
+        # NOTE: the index filter is saved along with the schema by the reducer
+        # (after the jsons of the indices are archived)
+        self._schema_holder = SchemaReducer(
+            self._index_filter, dump_file_path=schema_dump,
+            checkpoint_every_batches=checkpoint_every_batches,
+            checkpoint_every_seconds=checkpoint_every_seconds,
+            compact_bytes=compact_bytes,
+            before_checkpoint=None if jsonl_dump is None else self._jsonl_saver.flush)
+        graceful_exit_objs: typing.List = [self._schema_holder]
+        if self._jsonl_dump is not None:
+            # NOTE: the pending jsons are archived before the index store is saved
+            graceful_exit_objs.extend([self._jsonl_saver, self._jsonl_index_filter])
+        self._register_graceful_exist(graceful_exit_objs)
+
+    def _build_index_store(self, index_store: str, dump_file_path: str) -> 'IndexStore':
+        if index_store == 'cuckoo':
+            return IndexCuckooFilter(self.index_generator, dump_file_path=dump_file_path)
+        else:
+            return SQLiteIndexStore(dump_file_path=dump_file_path)
 
     def _register_graceful_exist(self, objs):
         def do_exit(*args):
@@ -123,13 +196,26 @@ class APIInferenceEngine:
         """
         A pipeline for inferencing json schema from a
         json files generated from url indices.
+
+        The stages (index -> url -> download -> validate -> batch -> inference -> reduce)
+        are chained lazily with bounded queues, so the memory does not grow
+        with the number of indices. The numbers of items passed through
+        the stages are counted in `self.counter`, and the throughput, the
+        time spent in each activity (io, decode, fit, reduce, checkpoint),
+        the queue depths and the peak RSS are recorded in `self.metrics`.
         """
-        # Get indices (ignroe already processed ones)
-        indexs = list(self._index_filter.filter(self.index_generator()))
-        index_name_pipe = indexs
+        metrics = self.metrics
+        metrics.start(workers=self._inference_worker_cnt)
         try:
-            with ThreadPool(processes=self._api_thread_cnt) as th_exc:
-                with self.Pool(processes=self._inference_worker_cnt) as pr_exc:
+            if self._async_fetcher is None:
+                thread_pool = ThreadPool(processes=self._api_thread_cnt)
+            else:
+                thread_pool = contextlib.nullcontext()
+            with thread_pool as th_exc:
+                with get_executor(self._executor, self._inference_worker_cnt) as pr_exc:
+                    # Get indices (ignroe already processed ones)
+                    index_name_pipe = metrics.count(
+                        self._index_filter.filter(self.index_generator()), 'index')
                     if verbose:
                         index_name_pipe = tqdm.tqdm(
                             index_name_pipe,
@@ -143,17 +229,26 @@ class APIInferenceEngine:
                         index_name_pipe)
 
                     # Download Json from URL
-                    json_index_name_pipe = th_exc.imap_unordered(
-                        APIInferenceEngine._th_run, url_index_name_pipe)
+                    if self._async_fetcher is None:
+                        # NOTE: the urls skipped for their error statuses come back as None
+                        json_index_name_pipe = filter(None, bounded_imap_unordered(
+                            th_exc, functools.partial(
+                                APIInferenceEngine._th_run, cache=self._response_cache,
+                                controller=self._rate_controller, metrics=metrics),
+                            url_index_name_pipe, max_pending=self._fetch_queue_size,
+                            gauge=metrics.gauge('fetch_queue')))
+                    else:
+                        json_index_name_pipe = self._async_fetcher.fetch_all(
+                            url_index_name_pipe, cache=self._response_cache, metrics=metrics)
+                    json_index_name_pipe = metrics.count(json_index_name_pipe, 'json')
 
                     if verbose:
                         json_index_name_pipe = tqdm.tqdm(
-                            json_index_name_pipe, total=len(indexs),
-                            desc='json-flow')
+                            json_index_name_pipe, desc='json-flow')
 
                     # Remove errorneous Json
-                    json_index_name_pipe = self.filter_errorneous_json(
-                        json_index_name_pipe)
+                    json_index_name_pipe = metrics.count(
+                        self.filter_errorneous_json(json_index_name_pipe), 'valid_json')
 
                     # Saving json into jsonl file
                     if self._jsonl_dump is not None:
@@ -165,58 +260,141 @@ class APIInferenceEngine:
                         json_index_name_pipe, batch_size=self._json_per_worker)
 
                     # Inferencing Json schemas from Json Batches
-                    json_schema_indexs_pipe = pr_exc.imap_unordered(
-                        APIInferenceEngine._pr_run, json_index_name_batch_pipe)
+                    json_schema_indexs_pipe = metrics.count(
+                        map(functools.partial(APIInferenceEngine._record_fit_time, metrics),
+                            bounded_imap_unordered(
+                                pr_exc, APIInferenceEngine._pr_run_timed, json_index_name_batch_pipe,
+                                max_pending=self._inference_queue_size,
+                                gauge=metrics.gauge('inference_queue'))),
+                        'schema_batch')
 
                     if verbose:
                         json_schema_indexs_pipe = tqdm.tqdm(
-                            json_schema_indexs_pipe, total=round(
-                                len(indexs) / self._json_per_worker),
-                            desc='schema-batch-flow')
+                            json_schema_indexs_pipe, desc='schema-batch-flow')
 
                     # Reducing Json Schemas into One Union Json Schema
-                    self._schema_holder.reduce(json_schema_indexs_pipe)
+                    self._schema_holder.reduce(json_schema_indexs_pipe, metrics=metrics)
             return self._schema_holder.union_schema
         except BaseException as e:
             raise e
         finally:
-            # Saving the final schema and process record as Pickles
+            # Saving the final schema and process record
             self._schema_holder.save()
-            self._index_filter.save()
             if self._jsonl_dump is not None:
+                self._jsonl_saver.close()
                 self._jsonl_index_filter.save()
+            metrics.stop()
 
     @staticmethod
-    def _th_run(instance):
+    def _th_run(instance, cache: typing.Optional[ResponseCache] = None,
+                controller: typing.Optional[RateController] = None,
+                metrics: typing.Optional[Metrics] = None):
+        """
+        Download and decode the json of an (url, index) tuple.
+        An url answering an error status is skipped (None is returned, and the body
+        is not decoded), as by `AsyncFetcher`, unless the status is retryable.
+        """
         url, index = instance
-        json_result = APIInferenceEngine._get_json(url)
-        return json_result, index
+        try:
+            if cache is None and controller is None and metrics is None:
+                return APIInferenceEngine._get_json(url), index
+            get = APIInferenceEngine._get_response
+            if controller is not None:
+                get = functools.partial(controller.request, get=get)
+            get = APIInferenceEngine._checked_get(get)
+            decoder = get_decoder()
+            if metrics is not None:
+                get = APIInferenceEngine._measured_get(get, metrics)
+                decoder = metrics.timed(decoder, 'decode')
+            if cache is not None:
+                json_result = fetch_cached(cache, url, get, decoder)
+            else:
+                json_result = decoder(get(url, dict())[2])
+            return json_result, index
+        except HTTPError as e:
+            if e.status in RETRY_STATUSES:
+                raise
+            # NOTE: the url is skipped (and not recorded as processed)
+            logging.warning(f'skip {url} ({e})')
+            if metrics is not None:
+                metrics.add('fetch_error')
+            return None
+
+    @staticmethod
+    def _checked_get(get):
+        def checked_get(url, headers):
+            response = get(url, headers)
+            if not (200 <= response[0] < 300 or response[0] == 304):
+                raise HTTPError(url, response[0])
+            return response
+        return checked_get
+
+    @staticmethod
+    def _measured_get(get, metrics: Metrics):
+        def measured_get(url, headers):
+            # NOTE: a response with an error status (raising an `HTTPError`) is not measured
+            start = time.perf_counter()
+            response = get(url, headers)
+            metrics.add_time('io', time.perf_counter() - start)
+            metrics.add('json', items=0, nbytes=len(response[2]))
+            return response
+        return measured_get
 
     @staticmethod
     def _get_json(url):
-        result = requests.get(url).json()
+        response = requests.get(url)
+        if not 200 <= response.status_code < 300:
+            raise HTTPError(url, response.status_code)
+        result = get_decoder()(response.content)
         return result
 
+    @staticmethod
+    def _get_response(url, headers):
+        response = requests.get(url, headers=headers)
+        return response.status_code, response.headers, response.content
+
     def filter_errorneous_json(
             self, json_index_name_pipe: typing.Iterable[typing.Tuple[typing.Dict, str]]):
-        def remove_index_of_errorneous_json(instance):
+        def is_valid(instance):
             json_result, index = instance
-            if not self.is_valid_json(json_result):
+            if isinstance(json_result, CachedSchema):
+                valid = json_result.valid
+            else:
+                valid = self.is_valid_json(
+                    json_result.json if isinstance(json_result, FittedJson) else json_result)
+                if not valid and self._response_cache is not None:
+                    self._response_cache.invalidate(self.get_url(index))
+            if not valid:
                 self._index_filter.remove(index)
-            return json_result, index
-        json_index_name_pipe = map(
-            remove_index_of_errorneous_json,
-            json_index_name_pipe)
-        json_index_name_pipe = filter(
-            lambda x: self.is_valid_json(x[0]), json_index_name_pipe)
+            return valid
+        json_index_name_pipe = filter(is_valid, json_index_name_pipe)
         return json_index_name_pipe
 
+    @staticmethod
+    def _pr_run_timed(
+            json_index_name_batch: typing.List[typing.Tuple[typing.Union[typing.Dict, CachedSchema, FittedJson], str]]):
+        start = time.perf_counter()
+        json_schema, index_name_batch = APIInferenceEngine._pr_run(json_index_name_batch)
+        return json_schema, index_name_batch, time.perf_counter() - start
+
+    @staticmethod
+    def _record_fit_time(metrics: Metrics, result):
+        json_schema, index_name_batch, seconds = result
+        metrics.add_time('fit', seconds)
+        return json_schema, index_name_batch
+
     @staticmethod
     def _pr_run(
-            json_index_name_batch: typing.List[typing.Tuple[typing.Dict, str]]):
-        json_batch = [x[0] for x in json_index_name_batch]
+            json_index_name_batch: typing.List[typing.Tuple[typing.Union[typing.Dict, CachedSchema, FittedJson], str]]):
+        json_batch = [x[0] for x in json_index_name_batch
+                      if not isinstance(x[0], (CachedSchema, FittedJson))]
         index_name_batch = [x[1] for x in json_index_name_batch]
         json_schema = InferenceEngine.get_schema(json_batch)
+        # NOTE: the schemas of the cached jsons (fitted when cached) are not fitted again
+        cached_schemas = [x[0].schema for x in json_index_name_batch
+                          if isinstance(x[0], (CachedSchema, FittedJson))]
+        if cached_schemas:
+            json_schema = reduce_schema([json_schema] + cached_schemas)
         return json_schema, index_name_batch
 
 
@@ -230,16 +408,22 @@ class IndexCuckooFilter:
             construct the index set.
         - dump_file_path: the path to store the index set status information.
         - error_rate: the error rate of identifying an non-existing item in the set.
+
+    The filter is saved as an atomic snapshot (see `checkpoint.write_snapshot`),
+    where `seq` is the last log segment of the `SchemaReducer` applied to it.
     """
 
     def __init__(self, index_gen_builder=typing.Callable[[
     ], typing.Iterable], dump_file_path='cuckoo.pickle', error_rate: float = 0.01):
         self._dump_file_path = dump_file_path
+        self.seq = 0
         if os.path.exists(self._dump_file_path):
-            self._cuckoo = self.load()
+            self.seq, self._cuckoo = self.load()
         else:
             # build the cuckoo filter from scratch
-            indexs = list(index_gen_builder())
+            # NOTE: the indices are generated twice (counted, then inserted)
+            # instead of being held in a list
+            index_cnt = sum(1 for _ in index_gen_builder())
             assert error_rate <= 1. and error_rate > 0.
             bucket_size = round(- math.log10(error_rate)) + 1
             # fingerprint_size = int(math.ceil(math.log(1.0 / error_rate, 2) + math.log(2 * bucket_size, 2)))
@@ -251,7 +435,7 @@ class IndexCuckooFilter:
                 alpha = 0.95
             elif bucket_size >= 8:
                 alpha = 0.98
-            capacity = round(len(indexs) / alpha)
+            capacity = max(round(index_cnt / alpha), 1)
             logging.info('capacity of cuckoo filter:', capacity)
             logging.info(
                 'false positive error rate of cuckoo filter:',
@@ -262,57 +446,155 @@ class IndexCuckooFilter:
                 capacity=capacity,
                 error_rate=error_rate,
                 bucket_size=bucket_size)
-            for index in indexs:
+            for index in index_gen_builder():
                 self._cuckoo.insert(index)
 
     def remove(self, index: str):
         self._cuckoo.delete(index)
 
+    def contains(self, index: str) -> bool:
+        """
+        Whether the index is not processed yet.
+        """
+        return self._cuckoo.contains(index)
+
     def filter(self, index_gen: typing.Iterable):
         for index in index_gen:
             if self._cuckoo.contains(index):
                 yield index
 
+    def checkpoint(self):
+        # NOTE: the snapshots are only updated by `save` and `compact`
+        pass
+
+    def compact(self, seq: int, removed_since: typing.Callable[[int], typing.Iterable[str]]):
+        """
+        Bring the snapshot on disk up to the log segment `seq`
+        (run in the background while the filter in memory is being updated).
+
+        Args:
+            - seq: the last log segment to be included
+            - removed_since: a function giving the indices removed in the
+                log segments after a sequence number (up to `seq`)
+        """
+        snapshot_seq, data = read_snapshot(self._dump_file_path)
+        cuckoo = pickle.loads(data)
+        for index in removed_since(snapshot_seq):
+            cuckoo.delete(index)
+        write_snapshot(self._dump_file_path, seq, pickle.dumps(
+            cuckoo, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @property
+    def dump_file_path(self) -> str:
+        return self._dump_file_path
+
     def load(self):
-        with open(self._dump_file_path, 'rb') as handle:
-            result = pickle.load(handle)
+        """
+        Load the (seq, cuckoo filter) of the dump.
+        """
+        seq, data = read_snapshot(self._dump_file_path)
+        result = pickle.loads(data)
         print(f'{self._dump_file_path} Loaded')
-        return result
+        return seq, result
 
     def exit_gracefully(self, *args):
         self.save()
         print('[PackageCuckooFilter] exit gracefully')
 
     def save(self):
-        with open(self._dump_file_path, 'wb') as handle:
-            pickle.dump(self._cuckoo, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        write_snapshot(self._dump_file_path, self.seq, pickle.dumps(
+            self._cuckoo, protocol=pickle.HIGHEST_PROTOCOL))
         print(f'{self._dump_file_path} Saved')
 
 
+# the stores of the processed indices
+IndexStore = typing.Union[IndexCuckooFilter, SQLiteIndexStore]
+
+
 class JsonlSaver:
     """
     This class enable saving the json(s) into a archive jsonl file.
+
+    The jsons are appended to the archive (a resumed run keeps the jsons
+    archived before) by a background `archive.ArchiveWriter`.
+
+    Args:
+        - cuckoo_filter: the store of the indices not archived yet
+        - archieve_file_path: path to the archive jsonl file
+        - compression / rotate_bytes / buffer_bytes: see `archive.ArchiveWriter`
+        - refetch: download the json of an index again, if the cached body
+            of its `CachedSchema` has been evicted before it is archived
+            (the json is left unarchived if not provided or if the download fails)
     """
 
-    def __init__(self, cuckoo_filter: IndexCuckooFilter,
-                 archieve_file_path='archieve.jsonl'):
+    def __init__(self, cuckoo_filter: 'IndexStore',
+                 archieve_file_path='archieve.jsonl', compression=None,
+                 rotate_bytes=None, buffer_bytes=1 << 20,
+                 refetch: typing.Optional[typing.Callable[[str], typing.Any]] = None):
         self._cuckoo_filter = cuckoo_filter
+        self._refetch = refetch
         self._archieve_file_path = archieve_file_path
+        self._compression = compression
+        self._rotate_bytes = rotate_bytes
+        self._buffer_bytes = buffer_bytes
+        self._writer: typing.Optional[ArchiveWriter] = None
 
     def save(
             self, json_index_producer: typing.Iterable[typing.Tuple[dict, str]]):
         """
         Check and save the passing index-json tuple
         """
-        with open(self._archieve_file_path, 'w') as f:
+        self._writer = ArchiveWriter(
+            self._archieve_file_path, compression=self._compression,
+            rotate_bytes=self._rotate_bytes, buffer_bytes=self._buffer_bytes)
+        try:
             for json, index in json_index_producer:
-                if self._cuckoo_filter._cuckoo.contains(index):
-                    f.write(json_package.dumps(json))
-                    f.write('\n')
-                    self._cuckoo_filter.remove(index)
-                else:
-                    pass
+                if self._cuckoo_filter.contains(index):
+                    archived = self._archived_json(json, index)
+                    if archived is not None:
+                        self._writer.write(archived)
+                        self._cuckoo_filter.remove(index)
                 yield json, index
+        finally:
+            self.close()
+
+    def _archived_json(self, json, index: str):
+        if isinstance(json, FittedJson):
+            return json.json
+        elif not isinstance(json, CachedSchema):
+            return json
+        try:
+            return json.load()
+        except FileNotFoundError:
+            # NOTE: the body is evicted by the bodies cached since its 304 response
+            if self._refetch is None:
+                logging.warning(f'not archived {index} (cached body evicted)')
+                return None
+        try:
+            return self._refetch(index)
+        except Exception as e:
+            logging.warning(f'not archived {index} ({e!r})')
+            return None
+
+    def flush(self):
+        """
+        Make the jsons archived so far durable
+        (before their indices are checkpointed as processed).
+        """
+        if self._writer is not None and not self._writer.closed:
+            self._writer.flush()
+            self._cuckoo_filter.checkpoint()
+
+    def close(self):
+        """
+        Write the jsons pending (before the index store is saved).
+        """
+        if self._writer is not None:
+            self._writer.close()
+
+    def exit_gracefully(self, *args):
+        self.close()
+        print('jsonl archive closed gracefully')
 
 
 class SchemaReducer:
@@ -323,40 +605,211 @@ class SchemaReducer:
     It stored the union schema of the inferenced json schemas
     and captured the record the corresponding indices
     in the IndexCuckooFilter.
-    """
 
-    def __init__(self, cuckoo_filter: IndexCuckooFilter,
-                 dump_file_path='schema.pickle'):
+    The union schema is saved in the binary format of
+    `schema.serialization` (pickled dumps of the previous versions are still loaded).
+
+    Checkpoints: each reduced batch (its schema and indices) is appended to
+    a log (`{dump_file_path}.log.{seq}`, see `checkpoint.DeltaLog`), made
+    durable every `checkpoint_every_batches` batches or `checkpoint_every_seconds`
+    seconds. When the log segment grows over `compact_bytes`, a new segment is
+    started and the snapshots of the schema and the cuckoo filter are brought
+    up to date with the previous segments in a background thread, so the reduce
+    loop is not stalled. On loading, the segments newer than the snapshots
+    are replayed, so at most the batches of the last checkpoint interval
+    are lost (and inferenced again) on a crash.
+
+    Args:
+        - cuckoo_filter: the filter of the processed indices (or None)
+        - dump_file_path: the path to store the union schema
+        - checkpoint_every_batches: number of batches between two checkpoints
+        - checkpoint_every_seconds: max seconds between two checkpoints
+        - compact_bytes: size of a log segment triggering a compaction
+        - before_checkpoint: called before the processed indices are checkpointed
+            (e.g. to make the jsons archived so far durable, see `JsonlSaver.flush`)
+    """
+    _LENGTH = struct.Struct('<I')
+
+    def __init__(self, cuckoo_filter: typing.Optional['IndexStore'],
+                 dump_file_path='schema.pickle',
+                 checkpoint_every_batches: int = 10,
+                 checkpoint_every_seconds: float = 10.,
+                 compact_bytes: int = 16 << 20,
+                 before_checkpoint: typing.Optional[typing.Callable[[], None]] = None):
+        assert checkpoint_every_batches > 0
         self._cuckoo_filter = cuckoo_filter
+        self._before_checkpoint = before_checkpoint
         self._dump_file_path = dump_file_path
+        self._checkpoint_every_batches = checkpoint_every_batches
+        self._checkpoint_every_seconds = checkpoint_every_seconds
+        self._compact_bytes = compact_bytes
+        self._log = DeltaLog(dump_file_path + '.log')
+        self._compaction: typing.Optional[threading.Thread] = None
+        # the last log segment included in the schema snapshot
+        self._seq = 0
         if os.path.exists(self._dump_file_path):
-            self._current_schema = self.load()
+            self._seq, self._current_schema = self.load()
         else:
             self._current_schema = None
+        self._recover()
 
-    def reduce(
-            self, schema_indices_producer: typing.Iterable[typing.Tuple[JsonSchema, typing.List[str]]]):
-        for schema, indices in schema_indices_producer:
+    def _recover(self):
+        """
+        Replay the log segments not included in the snapshots.
+        """
+        segments = self._log.segments()
+        filter_seq = self._seq if self._cuckoo_filter is None else self._cuckoo_filter.seq
+        for seq in segments:
+            if seq <= min(self._seq, filter_seq):
+                continue
+            for schema, indices in map(self._decode, self._log.read(seq)):
+                if seq > self._seq:
+                    self._merge(schema)
+                if seq > filter_seq:
+                    self._remove(indices)
+        last = max(segments + [self._seq, filter_seq])
+        if segments and segments[-1] > min(self._seq, filter_seq):
+            print(f'{self._dump_file_path} Recovered from the log')
+        if self._cuckoo_filter is not None and (
+                self._cuckoo_filter.seq != last or
+                not os.path.exists(self._cuckoo_filter.dump_file_path)):
+            # NOTE: the replayed (or built) filter is the base of the later compactions
+            self._cuckoo_filter.seq = last
+            self._cuckoo_filter.save()
+        # the next segment
+        self._log.seq = last
+
+    def _merge(self, schema: JsonSchema):
+        if self._current_schema is not None:
+            self._current_schema |= schema
+        else:
+            self._current_schema = schema
+
+    def _remove(self, indices: typing.List[str]):
+        if self._cuckoo_filter is not None:
             for index in indices:
                 self._cuckoo_filter.remove(index)
-            if self._current_schema is not None:
-                self._current_schema |= schema
-            else:
-                self._current_schema = schema
+
+    @staticmethod
+    def _encode(schema: JsonSchema, indices: typing.List[str]) -> bytes:
+        data = serialization.dumps(schema)
+        return SchemaReducer._LENGTH.pack(len(data)) + data + json_package.dumps(indices).encode()
+
+    @staticmethod
+    def _decode(record: bytes) -> typing.Tuple[JsonSchema, typing.List[str]]:
+        length, = SchemaReducer._LENGTH.unpack_from(record)
+        start = SchemaReducer._LENGTH.size
+        schema = serialization.loads(record[start:start + length])
+        return schema, json_package.loads(record[start + length:])
+
+    def reduce(
+            self, schema_indices_producer: typing.Iterable[typing.Tuple[JsonSchema, typing.List[str]]],
+            metrics: typing.Optional[Metrics] = None):
+        """
+        Reduce the (schema, indices) of the batches (the time spent merging,
+        and logging / checkpointing, is recorded as the `reduce` and
+        `checkpoint` activities of `metrics` if provided).
+        """
+        batch_cnt = 0
+        last_checkpoint = time.monotonic()
+        for schema, indices in schema_indices_producer:
+            start = time.perf_counter()
+            if self._log.closed:
+                self._log.open(self._log.seq + 1)
+            self._log.append(self._encode(schema, indices))
+            logged = time.perf_counter()
+            self._merge(schema)
+            self._remove(indices)
+            if metrics is not None:
+                metrics.add_time('checkpoint', logged - start)
+                metrics.add_time('reduce', time.perf_counter() - logged)
+            batch_cnt += 1
+            if batch_cnt >= self._checkpoint_every_batches or \
+                    time.monotonic() - last_checkpoint >= self._checkpoint_every_seconds:
+                self._timed_checkpoint(metrics)
+                batch_cnt = 0
+                last_checkpoint = time.monotonic()
+        self._timed_checkpoint(metrics)
+
+    def _timed_checkpoint(self, metrics: typing.Optional[Metrics]):
+        if metrics is None:
+            self.checkpoint()
+        else:
+            with metrics.timer('checkpoint'):
+                self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Make the reduced batches durable, and start a compaction
+        if the log segment is large enough.
+        """
+        if self._before_checkpoint is not None:
+            self._before_checkpoint()
+        self._log.sync()
+        # NOTE: the log is made durable first, so no index is recorded
+        # as processed without its schema (nor without its archived json)
+        if self._cuckoo_filter is not None:
+            self._cuckoo_filter.checkpoint()
+        if self._log.size >= self._compact_bytes and (
+                self._compaction is None or not self._compaction.is_alive()):
+            seq = self._log.seq
+            self._log.close()
+            self._compaction = threading.Thread(
+                target=self._compact, args=(seq, self._current_schema), daemon=True)
+            self._compaction.start()
+
+    def _compact(self, seq: int, schema: typing.Optional[JsonSchema]):
+        """
+        Bring the snapshots up to the log segment `seq` (included).
+        The schema is the (immutable) union schema at the end of segment `seq`,
+        while the index filter is being updated by the reduce loop, so
+        it brings its state on disk up to date by itself (see `IndexCuckooFilter.compact`).
+        """
+        self._save_schema(seq, schema)
+        if self._cuckoo_filter is not None:
+            def removed_since(filter_seq: int) -> typing.Iterator[str]:
+                for segment in self._log.segments():
+                    if filter_seq < segment <= seq:
+                        for _, indices in map(self._decode, self._log.read(segment)):
+                            yield from indices
+            self._cuckoo_filter.compact(seq, removed_since)
+        self._log.remove(seq)
 
     def load(self):
-        with open(self._dump_file_path, 'rb') as handle:
-            result = pickle.load(handle)
+        """
+        Load the (seq, union schema) of the dump.
+        """
+        seq, data = read_snapshot(self._dump_file_path)
+        if data.startswith(serialization.MAGIC):
+            result = serialization.loads(data)
+            # NOTE: no schema reduced yet is saved as Unknown
+            if result is Unknown():
+                result = None
+        else:
+            result = pickle.loads(data)
         print(f'{self._dump_file_path} Loaded')
-        return result
+        return seq, result
+
+    def _save_schema(self, seq: int, schema: typing.Optional[JsonSchema]):
+        write_snapshot(self._dump_file_path, seq, serialization.dumps(
+            Unknown() if schema is None else schema))
 
     def save(self):
-        with open(self._dump_file_path, 'wb') as handle:
-            pickle.dump(
-                self._current_schema,
-                handle,
-                protocol=pickle.HIGHEST_PROTOCOL)
+        """
+        Save the snapshots of the union schema and the cuckoo filter,
+        including every reduced batch.
+        """
+        if self._compaction is not None:
+            self._compaction.join()
+        seq = self._log.seq
+        self._log.close()
+        self._save_schema(seq, self._current_schema)
+        self._seq = seq
         print(f'{self._dump_file_path} Saved')
+        if self._cuckoo_filter is not None:
+            self._cuckoo_filter.seq = seq
+            self._cuckoo_filter.save()
+        self._log.remove(seq)
 
     def exit_gracefully(self, *args):
         self.save()
@@ -0,0 +1,201 @@
+"""
+Archiving of jsons into jsonl files
+
+`ArchiveWriter` appends the jsons to a jsonl archive from a background
+thread: the jsons are passed through a bounded queue, dumped by the
+writer thread and written in chunks of `buffer_bytes`, so the pipeline
+feeding it only enqueues them.
+
+- compression:
+    - gzip: each chunk is written as a gzip member (a file of concatenated
+        members is a valid gzip file, e.g. for `gzip.open`).
+    - zstd: each chunk is written as a zstd frame (requires `zstandard`).
+    As the chunks are compressed independently, appending to an archive
+    is safe, and a crash only loses (or tears) the last chunk.
+    (`flush` makes the jsons enqueued so far durable, e.g. before they are
+    recorded as processed, see `APIInferenceEngine`.)
+- rotate_bytes: the archive is split into shards `{name}.{i:05d}{ext}`
+    (e.g. `archive.00000.jsonl.gz` for `archive.jsonl.gz`), and a new shard is
+    started once a shard reaches `rotate_bytes`. A shard always ends at a line
+    break, so the shards can be inferenced in parallel. A later run appends to
+    the last shard.
+"""
+import glob
+import gzip
+import json as json_package
+import os
+import queue
+import re
+import threading
+import typing
+
+__all__ = ['ArchiveWriter', 'COMPRESSIONS', 'archive_paths']
+
+COMPRESSIONS = ('gzip', 'zstd')
+_END = object()
+
+
+def _shard_name(path: str) -> typing.Tuple[str, str]:
+    directory, base = os.path.split(path)
+    name, dot, ext = base.partition('.')
+    return os.path.join(directory, name), dot + ext
+
+
+def archive_paths(path: str, rotated: bool = False) -> typing.List[str]:
+    """
+    The files of an archive (its shards in order if `rotated`).
+    """
+    if not rotated:
+        return [path] if os.path.exists(path) else []
+    name, ext = _shard_name(path)
+    pattern = re.compile(re.escape(name) + r'\.(\d+)' + re.escape(ext) + '$')
+    shards = []
+    for shard_path in glob.glob(glob.escape(name) + '.*' + glob.escape(ext)):
+        match = pattern.match(shard_path)
+        if match is not None:
+            shards.append((int(match.group(1)), shard_path))
+    return [shard_path for _, shard_path in sorted(shards)]
+
+
+class ArchiveWriter:
+    """
+    Args:
+        - path: path to the archive jsonl file
+        - compression: None, 'gzip' or 'zstd'
+        - rotate_bytes: max size of a shard of the archive (not rotated if not provided)
+        - buffer_bytes: size of the chunks written
+        - queue_size: max number of jsons waiting to be written
+    """
+
+    def __init__(self, path: str, compression: typing.Optional[str] = None,
+                 rotate_bytes: typing.Optional[int] = None,
+                 buffer_bytes: int = 1 << 20, queue_size: int = 10000):
+        assert compression is None or compression in COMPRESSIONS, \
+            f'compression should be one of {COMPRESSIONS}'
+        assert rotate_bytes is None or rotate_bytes > 0
+        self._path = path
+        self._compress = self._build_compressor(compression)
+        self._rotate_bytes = rotate_bytes
+        self._buffer_bytes = buffer_bytes
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._error: typing.Optional[BaseException] = None
+        self._closed = False
+        self.written = 0
+        self._file = self._open_last()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _build_compressor(compression) -> typing.Callable[[bytes], bytes]:
+        if compression == 'gzip':
+            return lambda chunk: gzip.compress(chunk, compresslevel=6)
+        if compression == 'zstd':
+            import zstandard
+            return zstandard.ZstdCompressor().compress
+        return lambda chunk: chunk
+
+    @property
+    def paths(self) -> typing.List[str]:
+        return archive_paths(self._path, rotated=self._rotate_bytes is not None)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def _shard_path(self, i: int) -> str:
+        name, ext = _shard_name(self._path)
+        return f'{name}.{i:05d}{ext}'
+
+    def _open_last(self) -> typing.BinaryIO:
+        if self._rotate_bytes is None:
+            return open(self._path, 'ab')
+        paths = self.paths
+        self._shard = len(paths) - 1 if paths else 0
+        if paths and os.path.getsize(paths[-1]) >= self._rotate_bytes:
+            self._shard += 1
+        return open(self._shard_path(self._shard), 'ab')
+
+    def write(self, json: dict):
+        """
+        Enqueue a json to be archived (blocks if the queue is full).
+        """
+        assert not self._closed, 'the archive writer is closed'
+        if self._error is not None:
+            raise self._error
+        self._queue.put(json)
+
+    def _run(self):
+        buffer: typing.List[str] = []
+        size = 0
+        try:
+            while True:
+                json = self._queue.get()
+                if json is _END:
+                    break
+                if isinstance(json, threading.Event):
+                    # a flush
+                    self._write_chunk(buffer)
+                    buffer = []
+                    size = 0
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    json.set()
+                    continue
+                line = json_package.dumps(json)
+                buffer.append(line)
+                size += len(line) + 1
+                if size >= self._buffer_bytes:
+                    self._write_chunk(buffer)
+                    buffer = []
+                    size = 0
+            self._write_chunk(buffer)
+        except BaseException as e:
+            self._error = e
+            # NOTE: unblock the producer (and the flushes)
+            while True:
+                item = self._queue.get()
+                if item is _END:
+                    break
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _write_chunk(self, lines: typing.List[str]):
+        if not lines:
+            return
+        lines.append('')
+        self._file.write(self._compress('\n'.join(lines).encode()))
+        self.written += len(lines) - 1
+        if self._rotate_bytes is not None and self._file.tell() >= self._rotate_bytes:
+            self._file.close()
+            self._shard += 1
+            self._file = open(self._shard_path(self._shard), 'ab')
+
+    def flush(self):
+        """
+        Write the jsons enqueued so far (flushed and fsync-ed).
+        """
+        assert not self._closed, 'the archive writer is closed'
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        """
+        Write the jsons enqueued and close the archive (flushed and fsync-ed).
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_END)
+        self._thread.join()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        if self._error is not None:
+            raise self._error
+
+    def exit_gracefully(self, *args):
+        self.close()
+        print('archive closed gracefully')
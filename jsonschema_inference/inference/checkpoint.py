@@ -0,0 +1,173 @@
+"""
+Crash-safe checkpoints
+
+- Snapshots are written atomically: into a temporary file of the same
+    directory, flushed and fsync-ed, then renamed over the old snapshot.
+    A crash leaves either the old or the new snapshot, never a torn one.
+- Between two snapshots, the changes are appended to a log of
+    length-prefixed, checksummed records. The log is split into segments
+    numbered by a sequence number, and each snapshot records the sequence
+    number of the last segment it includes, so replaying the segments
+    after a snapshot is idempotent. A record torn by a crash fails its
+    checksum and ends the replay of its segment.
+"""
+import glob
+import os
+import struct
+import tempfile
+import typing
+import zlib
+
+__all__ = ['atomic_write', 'write_snapshot', 'read_snapshot', 'DeltaLog']
+
+SNAPSHOT_MAGIC = b'JSCK'
+_SEQ = struct.Struct('<Q')
+_RECORD_HEADER = struct.Struct('<II')  # length, crc32
+
+
+def _fsync_directory(directory: str):
+    # NOTE: makes the rename durable (not supported on every platform)
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: str, data: bytes):
+    """
+    Replace the file at `path` with `data` atomically.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    _fsync_directory(directory)
+
+
+def write_snapshot(path: str, seq: int, payload: bytes):
+    """
+    Atomically save a snapshot including the log segments up to `seq`.
+    """
+    atomic_write(path, SNAPSHOT_MAGIC + _SEQ.pack(seq) + payload)
+
+
+def read_snapshot(path: str) -> typing.Tuple[int, bytes]:
+    """
+    Load the (seq, payload) of a snapshot.
+    (The dumps of the previous versions are loaded as snapshots of seq 0.)
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data.startswith(SNAPSHOT_MAGIC):
+        start = len(SNAPSHOT_MAGIC)
+        seq, = _SEQ.unpack_from(data, start)
+        return seq, data[start + _SEQ.size:]
+    return 0, data
+
+
+class DeltaLog:
+    """
+    An append-only log, split into the segment files `{path}.{seq}`.
+
+    Args:
+        - path: the path prefix of the segment files
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._file: typing.Optional[typing.BinaryIO] = None
+        self.seq = 0
+
+    def segments(self) -> typing.List[int]:
+        """
+        Sequence numbers of the existing segments (in order).
+        """
+        prefix = self._path + '.'
+        seqs = []
+        for path in glob.glob(glob.escape(self._path) + '.*'):
+            suffix = path[len(prefix):]
+            if suffix.isdigit():
+                seqs.append(int(suffix))
+        return sorted(seqs)
+
+    def segment_path(self, seq: int) -> str:
+        return f'{self._path}.{seq}'
+
+    def open(self, seq: int):
+        """
+        Start appending to the segment `seq`.
+        """
+        self.close()
+        self._file = open(self.segment_path(seq), 'ab')
+        self.seq = seq
+
+    def append(self, payload: bytes):
+        assert self._file is not None, 'no segment opened'
+        self._file.write(_RECORD_HEADER.pack(len(payload), zlib.crc32(payload)))
+        self._file.write(payload)
+
+    def sync(self):
+        """
+        Make the appended records durable.
+        """
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    @property
+    def closed(self) -> bool:
+        return self._file is None
+
+    @property
+    def size(self) -> int:
+        """
+        Size (in bytes) of the segment being appended.
+        """
+        return 0 if self._file is None else self._file.tell()
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def read(self, seq: int) -> typing.Iterator[bytes]:
+        """
+        Yield the payloads of the (intact) records of a segment.
+        """
+        with open(self.segment_path(seq), 'rb') as f:
+            data = f.read()
+        position = 0
+        while position + _RECORD_HEADER.size <= len(data):
+            length, crc = _RECORD_HEADER.unpack_from(data, position)
+            start = position + _RECORD_HEADER.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                # NOTE: torn by a crash
+                break
+            yield payload
+            position = start + length
+
+    def remove(self, upto: int):
+        """
+        Delete the segments up to `upto` (included),
+        once a snapshot includes them.
+        """
+        for seq in self.segments():
+            if seq <= upto:
+                os.unlink(self.segment_path(seq))
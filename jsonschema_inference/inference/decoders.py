@@ -0,0 +1,85 @@
+"""
+Json decoder backends
+
+The decoders take `bytes` (or `str`) as input and produce the python
+objects of the json. The faster third-party backends are optional:
+if the selected one is not installed, the stdlib `json` is used instead.
+
+NOTE:
+- orjson and ujson reject integers larger than 64 bits,
+  and orjson rejects `NaN` and `Infinity`.
+"""
+import functools
+import logging
+import typing
+from ..config import config
+
+__all__ = ['DECODERS', 'available_decoders', 'get_decoder']
+
+Decoder = typing.Callable[[typing.Union[bytes, str]], typing.Any]
+
+
+def _json() -> Decoder:
+    import json
+    return json.loads
+
+
+def _orjson() -> Decoder:
+    import orjson
+    return orjson.loads
+
+
+def _ujson() -> Decoder:
+    import ujson
+    return ujson.loads
+
+
+def _simdjson() -> Decoder:
+    import simdjson
+    return simdjson.loads
+
+
+# NOTE: ordered from the fastest to the slowest (used by `auto`)
+DECODERS: typing.Dict[str, typing.Callable[[], Decoder]] = {
+    'orjson': _orjson,
+    'simdjson': _simdjson,
+    'ujson': _ujson,
+    'json': _json
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _load(name: str) -> typing.Optional[Decoder]:
+    try:
+        return DECODERS[name]()
+    except ImportError:
+        return None
+
+
+def available_decoders() -> typing.List[str]:
+    """
+    Names of the decoder backends installed.
+    """
+    return [name for name in DECODERS if _load(name) is not None]
+
+
+def get_decoder(name: typing.Optional[str] = None) -> Decoder:
+    """
+    Get the `loads` function of a decoder backend.
+
+    Args:
+        - name: 'auto', 'json', 'orjson', 'ujson' or 'simdjson'.
+            (`config.decoder` is used if not provided)
+            With 'auto', the fastest backend installed is selected.
+    """
+    if name is None:
+        name = config.decoder
+    if name == 'auto':
+        name = available_decoders()[0]
+    assert name in DECODERS, f'decoder should be `auto` or one of {list(DECODERS)}'
+    decoder = _load(name)
+    if decoder is None:
+        logging.warning(f'{name} is not installed, use json instead')
+        decoder = _load('json')
+    assert decoder is not None
+    return decoder
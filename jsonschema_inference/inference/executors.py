@@ -0,0 +1,94 @@
+"""
+Executor backends of the inference stage
+
+Each backend is a pool with the `apply_async` method of
+`multiprocessing.pool.Pool` (see `pipeline.bounded_imap_unordered`),
+used as a context manager:
+
+- thread: `multiprocessing.pool.ThreadPool`.
+    The json batches and the json schemas are passed by reference (no pickling),
+    but the inference holds the GIL, so it runs on one core at a time.
+- process: `multiprocessing.Pool` with the `forkserver` start method
+    (`spawn` where forkserver is not available, or a given `start_method`).
+    The json batches are pickled to the workers and the json schemas are
+    pickled back, in the binary format of `schema.serialization`, where the
+    schema nodes are interned again on unpickling.
+    The workers are started with the `config` of the calling process (see `init_worker`).
+    (`fork` is faster to start, but unsafe with the threads of the download stage.)
+- inline: the batches are inferenced in the calling thread when submitted.
+    No pickling and no startup cost, which suits small jobs and debugging.
+- ray: `ray.util.multiprocessing.Pool` (requires the `ray` extra).
+    The json batches and the json schemas are pickled (with cloudpickle,
+    the schemas in the binary format) through the ray object store. The workers are started with the `config`
+    of the calling process, as with the process backend.
+"""
+import multiprocessing
+import typing
+from multiprocessing.pool import ThreadPool
+from ..config import config
+
+__all__ = ['EXECUTORS', 'get_executor', 'InlinePool', 'init_worker']
+
+EXECUTORS = ('thread', 'process', 'inline', 'ray')
+
+
+def init_worker(config_state: dict):
+    """
+    Initializer of a worker process: install the config of
+    the parent process (`config.state()`), as the workers
+    started by forkserver or spawn do not inherit it.
+    """
+    config.init(**config_state)
+
+
+class InlinePool:
+    """
+    A pool running each function call in the calling thread.
+    """
+
+    def __init__(self, processes=None):
+        pass
+
+    def apply_async(self, func: typing.Callable, args=(), kwds=None,
+                    callback=None, error_callback=None):
+        try:
+            result = func(*args, **(kwds or dict()))
+        except Exception as e:
+            if error_callback is None:
+                raise
+            error_callback(e)
+        else:
+            if callback is not None:
+                callback(result)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+def get_executor(name: str, processes: int, start_method: typing.Optional[str] = None):
+    """
+    Build the pool of an executor backend.
+
+    Args:
+        - name: 'thread', 'process', 'inline' or 'ray'
+        - processes: number of workers
+        - start_method: start method of the `process` backend
+            ('fork', 'forkserver' or 'spawn'. forkserver, if available, by default)
+    """
+    assert name in EXECUTORS, f'executor should be one of {EXECUTORS}'
+    if name == 'thread':
+        return ThreadPool(processes=processes)
+    elif name == 'process':
+        if start_method is None:
+            methods = multiprocessing.get_all_start_methods()
+            start_method = 'forkserver' if 'forkserver' in methods else 'spawn'
+        return multiprocessing.get_context(start_method).Pool(
+            processes=processes, initializer=init_worker, initargs=(config.state(),))
+    elif name == 'inline':
+        return InlinePool()
+    else:
+        from ray.util.multiprocessing import Pool
+        return Pool(processes=processes, initializer=init_worker, initargs=(config.state(),))
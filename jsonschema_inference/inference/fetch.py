@@ -0,0 +1,425 @@
+"""
+Asynchronous json downloader
+
+The jsons are downloaded by a single asyncio event loop (in a background thread)
+instead of a pool of OS threads:
+
+- HTTP/1.1 keep-alive connections are pooled and reused per host,
+- the number of connections per host and of requests in flight are bounded,
+- a request times out after `timeout` seconds (not counting the wait for
+    a connection to its host), and failed requests (connection errors,
+    timeouts, 429 and 5xx responses) are retried with exponential backoff,
+- redirects (3xx with a Location) are followed, up to `max_redirects` hops,
+- an url answered with another error status (e.g. 404) is skipped: it is
+    logged and counted in `errors` (by status), and the download goes on,
+- the (url, index) tuples are read from a separate thread, so reading them
+    (e.g. an index store lookup) does not block the downloads in flight.
+
+The HTTP client is a minimal one built on `asyncio.open_connection`,
+so no extra dependency is required.
+"""
+import asyncio
+import collections
+import logging
+import queue
+import ssl
+import threading
+import time
+import typing
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+from .decoders import get_decoder
+from .http_cache import FittedJson, ResponseCache
+if typing.TYPE_CHECKING:
+    from .metrics import Metrics
+    from .rate_limit import RateController
+
+__all__ = ['AsyncFetcher', 'HTTPError']
+
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+REDIRECT_STATUSES = frozenset([301, 302, 303, 307, 308])
+
+
+class HTTPError(Exception):
+    def __init__(self, url: str, status: int):
+        super().__init__(f'HTTP {status} from {url}')
+        self.url = url
+        self.status = status
+
+
+class Response(typing.NamedTuple):
+    status: int
+    headers: typing.Dict[str, str]
+    body: bytes
+    # seconds from sending the request (on a connection) to the end of the response
+    seconds: float = 0.
+
+
+class ConnectionPool:
+    """
+    Pool of the keep-alive connections of each (scheme, host, port).
+
+    Args:
+        - limit_per_host: max number of connections opened to a host at a time
+        - user_agent: the User-Agent header of the requests
+    """
+
+    def __init__(self, limit_per_host: int = 10,
+                 user_agent: str = 'jsonschema-inference'):
+        self._limit_per_host = limit_per_host
+        self._user_agent = user_agent
+        self._idle: typing.Dict[tuple, list] = dict()
+        self._semaphores: typing.Dict[tuple, asyncio.Semaphore] = dict()
+        self._ssl_context: typing.Optional[ssl.SSLContext] = None
+        self.opened = 0
+
+    async def get(self, url: str,
+                  headers: typing.Optional[typing.Dict[str, str]] = None,
+                  timeout: typing.Optional[float] = None) -> Response:
+        """
+        Request an url on a connection to its host, timing out after `timeout`
+        seconds once a connection is available (`limit_per_host`).
+        """
+        split = urlsplit(url)
+        assert split.scheme in ('http', 'https'), f'unsupported url: {url}'
+        port = split.port or (443 if split.scheme == 'https' else 80)
+        host = split.hostname or ''
+        key = (split.scheme, host, port)
+        path = split.path or '/'
+        if split.query:
+            path += '?' + split.query
+        host_header = host if split.port is None else f'{host}:{port}'
+        lines = [f'GET {path} HTTP/1.1', f'Host: {host_header}',
+                 f'User-Agent: {self._user_agent}', 'Accept-Encoding: gzip, deflate',
+                 'Connection: keep-alive']
+        for name, value in (headers or dict()).items():
+            lines.append(f'{name}: {value}')
+        request = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+        if key not in self._semaphores:
+            self._semaphores[key] = asyncio.Semaphore(self._limit_per_host)
+        async with self._semaphores[key]:
+            start = time.monotonic()
+            response = await asyncio.wait_for(self._get(key, request), timeout)
+            return response._replace(seconds=time.monotonic() - start)
+
+    async def _get(self, key: tuple, request: bytes) -> Response:
+        idle = self._idle.setdefault(key, [])
+        while idle:
+            connection = idle.pop()
+            try:
+                return await self._request(key, connection, request)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # NOTE: the server may have closed the idle connection
+                continue
+        connection = await self._connect(key)
+        return await self._request(key, connection, request)
+
+    async def _connect(self, key: tuple):
+        scheme, host, port = key
+        ssl_context = None
+        if scheme == 'https':
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            ssl_context = self._ssl_context
+        connection = await asyncio.open_connection(host, port, ssl=ssl_context)
+        self.opened += 1
+        return connection
+
+    async def _request(self, key: tuple, connection, request: bytes) -> Response:
+        reader, writer = connection
+        try:
+            writer.write(request)
+            await writer.drain()
+            response, keep_alive = await _read_response(reader)
+        except BaseException:
+            writer.close()
+            raise
+        if keep_alive:
+            self._idle[key].append(connection)
+        else:
+            writer.close()
+        return response
+
+    def close(self):
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+
+async def _read_response(reader: asyncio.StreamReader) -> typing.Tuple[Response, bool]:
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError('connection closed by the server')
+    version, status, *_ = status_line.decode('latin-1').split(None, 2)
+    headers = dict()
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.1':
+        keep_alive = connection != 'close'
+    else:
+        keep_alive = connection == 'keep-alive'
+    if int(status) in (204, 304) or 100 <= int(status) < 200:
+        body = b''
+    elif headers.get('transfer-encoding', '').lower() == 'chunked':
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                # skip the trailers
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+        body = b''.join(chunks)
+    elif 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    else:
+        body = await reader.read()
+        keep_alive = False
+    encoding = headers.get('content-encoding', '').lower()
+    if encoding == 'gzip':
+        body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        body = zlib.decompress(body)
+    return Response(int(status), headers, body), keep_alive
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_DONE = object()
+
+
+class AsyncFetcher:
+    """
+    Download the jsons of urls with asyncio.
+
+    Args:
+        - max_in_flight: max number of requests in flight (over all hosts)
+        - limit_per_host: max number of connections opened to a host at a time
+        - timeout: seconds before a request (connecting and reading) times out
+        - retries: number of retries of a failed request
+        - backoff: seconds before the first retry (doubled at each retry)
+        - max_redirects: max number of redirects followed from an url
+        - decoder: the json decoder backend (`config.decoder` if not provided)
+        - rate_controller: a `RateController` adapting the requests in flight
+            to each host (and holding them after a Retry-After)
+    """
+
+    def __init__(self, max_in_flight: int = 100, limit_per_host: int = 10,
+                 timeout: float = 30., retries: int = 3, backoff: float = 0.5,
+                 max_redirects: int = 10, decoder: typing.Optional[str] = None,
+                 rate_controller: typing.Optional['RateController'] = None):
+        assert max_in_flight > 0 and limit_per_host > 0
+        self._max_in_flight = max_in_flight
+        self._limit_per_host = limit_per_host
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff = backoff
+        self._max_redirects = max_redirects
+        self._decoder = decoder
+        self._rate_controller = rate_controller
+        self.connections_opened = 0
+        # numbers of the urls skipped by their error status
+        self.errors: collections.Counter = collections.Counter()
+
+    async def fetch(self, pool: ConnectionPool, url: str) -> bytes:
+        """
+        Download the content of an url (with retries).
+        """
+        return (await self.fetch_response(pool, url)).body
+
+    async def fetch_response(self, pool: ConnectionPool, url: str,
+                             headers: typing.Optional[typing.Dict[str, str]] = None) -> Response:
+        """
+        Request an url (with retries), following the redirects.
+        A response with an error status raises an `HTTPError`
+        (a 2xx or 304 response is returned).
+        """
+        for _ in range(self._max_redirects + 1):
+            response = await self._request(pool, url, headers)
+            if response.status in REDIRECT_STATUSES and 'location' in response.headers:
+                url = urljoin(url, response.headers['location'])
+                continue
+            if not (200 <= response.status < 300 or response.status == 304):
+                raise HTTPError(url, response.status)
+            return response
+        raise HTTPError(url, response.status)
+
+    async def _request(self, pool: ConnectionPool, url: str,
+                       headers: typing.Optional[typing.Dict[str, str]] = None) -> Response:
+        """
+        Request an url once (with retries).
+        """
+        controller = self._rate_controller
+        for attempt in range(self._retries + 1):
+            if controller is not None:
+                await controller.acquire_async(url)
+            start = time.monotonic()
+            status = None
+            retry_after = None
+            try:
+                response = await pool.get(url, headers, self._timeout)
+                # NOTE: the latency excludes the wait for a connection to the host
+                start = time.monotonic() - response.seconds
+                status = response.status
+                if response.status not in RETRY_STATUSES:
+                    return response
+                retry_after = response.headers.get('retry-after')
+                error: Exception = HTTPError(url, response.status)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                error = e
+            finally:
+                if controller is not None:
+                    controller.release(url, status, time.monotonic() - start, retry_after)
+            if attempt < self._retries:
+                logging.warning(f'retry {url} ({error!r})')
+                if controller is not None:
+                    controller.record_retry(url)
+                await asyncio.sleep(self._backoff * 2 ** attempt)
+        raise error
+
+    async def _fetch_cached(self, pool: ConnectionPool, url: str,
+                            cache: ResponseCache, decoder):
+        """
+        The async version of `http_cache.fetch_cached`.
+        """
+        response = await self.fetch_response(pool, url, cache.validators(url))
+        if response.status == 304:
+            cached = cache.hit(url)
+            if cached is not None:
+                return cached
+            response = await self.fetch_response(pool, url)
+        # NOTE: the json is decoded and fitted (to be cached) without blocking the event loop
+        loop = asyncio.get_event_loop()
+        json = await loop.run_in_executor(None, decoder, response.body)
+        if response.status == 200:
+            schema = await loop.run_in_executor(
+                None, cache.store, url, response.headers, response.body, json)
+            if schema is not None:
+                return FittedJson(json, schema)
+        return json
+
+    def fetch_all(self, url_index_pipe: typing.Iterable[typing.Tuple[str, typing.Any]],
+                  cache: typing.Optional[ResponseCache] = None,
+                  metrics: typing.Optional['Metrics'] = None
+                  ) -> typing.Iterator[typing.Tuple[typing.Any, typing.Any]]:
+        """
+        Download and decode the jsons of the (url, index) tuples,
+        yielding the (json, index) tuples in the order of completion.
+        With a `cache`, the requests are conditional, and the json of
+        an url not modified is the `CachedSchema` of its cached body.
+        With `metrics`, the download (io) and decoding times, the downloaded bytes
+        and the number of downloads in flight (`fetch_queue`) are recorded.
+
+        At most `max_in_flight` downloads run or wait to be consumed at a time,
+        so a slow consumer slows down the downloading.
+        """
+        results: queue.Queue = queue.Queue(maxsize=self._max_in_flight)
+        stopped = threading.Event()
+
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        thread = threading.Thread(
+            target=lambda: asyncio.run(self._run(url_index_pipe, put, stopped, cache, metrics)),
+            daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = results.get()
+                if item is _DONE:
+                    break
+                elif isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        finally:
+            stopped.set()
+            thread.join()
+
+    async def _run(self, url_index_pipe, put, stopped: threading.Event,
+                   cache: typing.Optional[ResponseCache] = None,
+                   metrics: typing.Optional['Metrics'] = None):
+        loop = asyncio.get_event_loop()
+        decoder = get_decoder(self._decoder)
+        if metrics is not None:
+            decoder = metrics.timed(decoder, 'decode')
+            in_flight_gauge = metrics.gauge('fetch_queue')
+        pool = ConnectionPool(limit_per_host=self._limit_per_host)
+        in_flight = asyncio.Semaphore(self._max_in_flight)
+        tasks: typing.Set[asyncio.Future] = set()
+
+        async def download(url, index):
+            try:
+                if metrics is not None:
+                    in_flight_gauge.set(len(tasks))
+                if cache is None:
+                    start = time.perf_counter()
+                    body = await self.fetch(pool, url)
+                    if metrics is not None:
+                        metrics.add_time('io', time.perf_counter() - start)
+                        metrics.add('json', items=0, nbytes=len(body))
+                    # NOTE: the body is decoded in the default executor, not to block the event loop
+                    item = (await loop.run_in_executor(None, decoder, body), index)
+                else:
+                    item = (await self._fetch_cached(pool, url, cache, decoder), index)
+            except HTTPError as e:
+                if e.status in RETRY_STATUSES:
+                    item = _Failure(e)
+                else:
+                    # NOTE: the url is skipped (and not recorded as processed)
+                    logging.warning(f'skip {url} ({e})')
+                    self.errors[e.status] += 1
+                    if metrics is not None:
+                        metrics.add('fetch_error')
+                    item = None
+            except Exception as e:
+                item = _Failure(e)
+            try:
+                if item is not None:
+                    await loop.run_in_executor(None, put, item)
+            finally:
+                in_flight.release()
+        # NOTE: the tuples are read from a thread of their own, not to block the event loop
+        feeder = ThreadPoolExecutor(max_workers=1)
+        try:
+            iterator = iter(url_index_pipe)
+            while True:
+                await in_flight.acquire()
+                if stopped.is_set():
+                    break
+                url_index: typing.Any = await loop.run_in_executor(feeder, next, iterator, _DONE)
+                if url_index is _DONE:
+                    in_flight.release()
+                    break
+                url, index = url_index
+                task = asyncio.ensure_future(download(url, index))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if stopped.is_set():
+                for pending in list(tasks):
+                    pending.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except Exception as e:
+            await loop.run_in_executor(None, put, _Failure(e))
+        finally:
+            feeder.shutdown(wait=False)
+            pool.close()
+            self.connections_opened += pool.opened
+            await loop.run_in_executor(None, put, _DONE)
@@ -0,0 +1,261 @@
+"""
+An on-disk cache of the HTTP responses of the jsons
+
+The responses are cached by url, so that a later crawl (e.g. refreshing
+the schema of an API) only downloads the jsons changed since:
+
+- The ETag / Last-Modified validators of a response are kept, and the next
+    request of the url is conditional (If-None-Match / If-Modified-Since).
+- The bodies are stored content-addressed (by sha256, shared by the urls of
+    the same content), along with the json schema fitted from the body (and
+    the fingerprint of the config it was fitted under). A 304 response reuses
+    that schema, without decoding or fitting the json again (unless the config
+    has changed since). The downloaded jsons are passed on along with their
+    schema (`FittedJson`), so they are not fitted again either.
+- The least recently used bodies are evicted once they exceed `max_bytes`.
+
+The urls, validators and schemas are kept in an SQLite file of the cache
+directory, and the bodies in files named by their digest.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import typing
+from ..config import config
+from ..schema import serialization
+from ..schema.objs import JsonSchema
+
+__all__ = ['ResponseCache', 'CachedSchema', 'FittedJson', 'CacheStats', 'fetch_cached']
+
+
+class CachedSchema(typing.NamedTuple):
+    """
+    The json schema of a cached body, in place of its json
+    (a 304 response). `valid` tells whether the json was valid.
+    """
+    schema: JsonSchema
+    valid: bool
+    body_path: str
+
+    def load(self):
+        """
+        Decode the json of the cached body.
+        """
+        from .decoders import get_decoder
+        with open(self.body_path, 'rb') as f:
+            return get_decoder()(f.read())
+
+
+class FittedJson(typing.NamedTuple):
+    """
+    A downloaded json, along with the json schema fitted from it (to be cached).
+    """
+    json: typing.Any
+    schema: JsonSchema
+
+
+class CacheStats(typing.NamedTuple):
+    requests: int
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.requests if self.requests else 0.
+
+
+class ResponseCache:
+    """
+    Args:
+        - directory: the directory of the cache
+        - max_bytes: max total size of the cached bodies
+    The cache is shared by the downloading threads.
+    """
+
+    def __init__(self, directory: str = 'http_cache', max_bytes: int = 1 << 30):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        os.makedirs(os.path.join(directory, 'bodies'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            os.path.join(directory, 'cache.sqlite'), check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        # NOTE: a cache lost by a crash is only downloaded again
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, digest TEXT)')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS bodies ('
+            'digest TEXT PRIMARY KEY, size INTEGER, schema BLOB, valid INTEGER, used REAL, '
+            'config TEXT)')
+        columns = [row[1] for row in self._connection.execute('PRAGMA table_info(bodies)')]
+        if 'config' not in columns:
+            # NOTE: the schemas cached before the fingerprints are fitted again
+            self._connection.execute('ALTER TABLE bodies ADD COLUMN config TEXT')
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS responses_digest ON responses (digest)')
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS bodies_used ON bodies (used)')
+        self._connection.commit()
+        self._size = self._connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM bodies').fetchone()[0]
+        self._requests = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _body_path(self, digest: str) -> str:
+        return os.path.join(self._directory, 'bodies', digest[:2], digest)
+
+    def validators(self, url: str) -> typing.Dict[str, str]:
+        """
+        The headers making the request of an url conditional.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT etag, last_modified FROM responses WHERE url = ?', (url,)).fetchone()
+        headers = dict()
+        if row is not None:
+            etag, last_modified = row
+            if etag is not None:
+                headers['If-None-Match'] = etag
+            if last_modified is not None:
+                headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def hit(self, url: str) -> typing.Optional[CachedSchema]:
+        """
+        The cached schema of an url (after a 304 response. None if evicted
+        since the request, or if fitted under another config).
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT bodies.digest, schema, valid, config FROM responses JOIN bodies '
+                'ON responses.digest = bodies.digest WHERE url = ?', (url,)).fetchone()
+            if row is None or row[3] != config.fingerprint():
+                return None
+            self._requests += 1
+            digest, schema, valid, _ = row
+            self._connection.execute(
+                'UPDATE bodies SET used = ? WHERE digest = ?', (time.time(), digest))
+            self._connection.commit()
+            self._hits += 1
+        return CachedSchema(serialization.loads(schema), bool(valid), self._body_path(digest))
+
+    def store(self, url: str, headers: typing.Mapping[str, str], body: bytes,
+              json) -> typing.Optional[JsonSchema]:
+        """
+        Cache the body of a (200) response and the json schema of its json.
+        (Only the responses with validators are cached.)
+
+        Returns:
+            - the json schema fitted (None if not cached)
+        """
+        from ..schema.fitter import fit
+        headers = {name.lower(): value for name, value in headers.items()}
+        etag = headers.get('etag')
+        last_modified = headers.get('last-modified')
+        schema = None if etag is None and last_modified is None else fit(json)
+        fingerprint = config.fingerprint()
+        with self._lock:
+            self._requests += 1
+            self._misses += 1
+            if schema is None:
+                return None
+            digest = hashlib.sha256(body).hexdigest()
+            path = self._body_path(digest)
+            exists = self._connection.execute(
+                'SELECT config FROM bodies WHERE digest = ?', (digest,)).fetchone()
+            if exists is None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(body)
+                os.replace(path + '.tmp', path)
+                self._connection.execute(
+                    'INSERT INTO bodies VALUES (?, ?, ?, 1, ?, ?)',
+                    (digest, len(body), serialization.dumps(schema), time.time(), fingerprint))
+                self._size += len(body)
+            elif exists[0] != fingerprint:
+                self._connection.execute(
+                    'UPDATE bodies SET schema = ?, config = ? WHERE digest = ?',
+                    (serialization.dumps(schema), fingerprint, digest))
+            self._connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                (url, etag, last_modified, digest))
+            self._evict()
+            self._connection.commit()
+        return schema
+
+    def invalidate(self, url: str):
+        """
+        Record that the json of an url is not valid (see `APIInferenceEngine.is_valid_json`).
+        """
+        with self._lock:
+            self._connection.execute(
+                'UPDATE bodies SET valid = 0 WHERE digest = '
+                '(SELECT digest FROM responses WHERE url = ?)', (url,))
+            self._connection.commit()
+
+    def _evict(self):
+        while self._size > self._max_bytes:
+            row = self._connection.execute(
+                'SELECT digest, size FROM bodies ORDER BY used LIMIT 1').fetchone()
+            if row is None:
+                break
+            digest, size = row
+            self._connection.execute('DELETE FROM bodies WHERE digest = ?', (digest,))
+            self._connection.execute('DELETE FROM responses WHERE digest = ?', (digest,))
+            try:
+                os.remove(self._body_path(digest))
+            except FileNotFoundError:
+                pass
+            self._size -= size
+            self._evictions += 1
+
+    def stats(self) -> CacheStats:
+        """
+        Statistics of the responses since the cache was opened:
+            - requests: number of responses (to the requests of the cache)
+            - hits: number of 304 responses answered from the cache
+            - misses: number of responses downloaded
+            - evictions: number of bodies evicted
+            - size: total size of the cached bodies
+        """
+        with self._lock:
+            return CacheStats(self._requests, self._hits, self._misses,
+                              self._evictions, self._size)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def fetch_cached(cache: ResponseCache, url: str,
+                 get: typing.Callable[[str, typing.Dict[str, str]],
+                                      typing.Tuple[int, typing.Mapping[str, str], bytes]],
+                 decoder: typing.Callable[[bytes], typing.Any]):
+    """
+    Download the json of an url with a conditional request
+    (`get(url, headers)` returns the status, headers and body of the response).
+
+    Returns:
+        - the `CachedSchema` of the url if not modified, otherwise the json
+            (as a `FittedJson` if cached).
+    """
+    status, headers, body = get(url, cache.validators(url))
+    if status == 304:
+        cached = cache.hit(url)
+        if cached is not None:
+            return cached
+        status, headers, body = get(url, dict())
+    json = decoder(body)
+    if status == 200:
+        schema = cache.store(url, headers, body, json)
+        if schema is not None:
+            return FittedJson(json, schema)
+    return json
@@ -0,0 +1,135 @@
+"""
+Incremental inference of append-only jsonl files
+
+The schema inferenced from a jsonl file is saved in a state file along
+with the byte offset up to which the file was processed and checksums of
+the processed prefix. A later run checks the prefix, inferences only the
+lines appended after the offset, and merges them into the saved schema.
+If the prefix has changed (or the file has shrunk), the file is inferenced
+from scratch.
+
+The state file is one line of json (the offset, the checksums and the
+number of jsons inferenced so far) followed by the schema in the format
+of `schema.serialization`, and it is replaced atomically.
+
+The prefix is checked either by:
+    - full (default): the crc32 of the whole prefix (read through, at disk speed).
+    - sample: the crc32 of `SAMPLE_COUNT` blocks spread over the prefix
+        (including its last block), read with seeks only.
+        WARNING: an edit of the prefix between the blocks which keeps its
+        length (e.g. a value overwritten in place) is NOT detected, and the
+        saved schema is silently kept. Only use it for files which are
+        strictly appended to.
+"""
+import json
+import mmap
+import os
+import typing
+import zlib
+from ..schema import serialization
+from ..schema.objs import JsonSchema
+from .checkpoint import atomic_write
+
+__all__ = ['IncrementalState', 'load_state', 'save_state', 'complete_end',
+           'prefix_samples', 'prefix_unchanged', 'crc32_of_range', 'VERIFICATIONS']
+
+VERSION = 1
+VERIFICATIONS = ('sample', 'full')
+SAMPLE_COUNT = 64
+SAMPLE_BLOCK = 4096
+
+
+class IncrementalState(typing.NamedTuple):
+    offset: int
+    crc32: int
+    samples: typing.List[typing.Tuple[int, int]]
+    documents: int
+    schema: JsonSchema
+
+
+def load_state(path: str) -> typing.Optional[IncrementalState]:
+    """
+    Load the state file (None if there is none, or it cannot be read,
+    e.g. it is truncated or of an older version, so the file is inferenced from scratch).
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        data = f.read()
+    header_end = data.find(b'\n')
+    try:
+        header = json.loads(data[:header_end])
+        if not isinstance(header, dict) or header.get('version') != VERSION:
+            return None
+        # NOTE: the schemas of an older serialization version raise ValueError
+        schema = serialization.loads(data[header_end + 1:])
+        return IncrementalState(
+            header['offset'], header['crc32'], [tuple(sample) for sample in header['samples']],
+            header['documents'], schema)
+    except (ValueError, KeyError, TypeError, IndexError):
+        return None
+
+
+def save_state(path: str, state: IncrementalState):
+    header = json.dumps({
+        'version': VERSION, 'offset': state.offset, 'crc32': state.crc32,
+        'samples': state.samples, 'documents': state.documents})
+    atomic_write(path, header.encode() + b'\n' + serialization.dumps(state.schema))
+
+
+def complete_end(path: str) -> int:
+    """
+    The end of the last complete line of a file
+    (a line being appended is left for the next run).
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return 0
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm.rfind(b'\n') + 1
+
+
+def crc32_of_range(path: str, start: int, end: int, value: int = 0,
+                   chunk_size: int = 1 << 24) -> int:
+    """
+    The crc32 of the bytes [start, end) of a file, continuing from `value`.
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            value = zlib.crc32(chunk, value)
+            remaining -= len(chunk)
+    return value
+
+
+def prefix_samples(path: str, offset: int) -> typing.List[typing.Tuple[int, int]]:
+    """
+    The (position, crc32) of `SAMPLE_COUNT` blocks spread over the prefix [0, offset).
+    """
+    if offset == 0:
+        return []
+    positions = sorted({min(offset * i // SAMPLE_COUNT, max(offset - SAMPLE_BLOCK, 0))
+                        for i in range(SAMPLE_COUNT + 1)})
+    samples = []
+    with open(path, 'rb') as f:
+        for position in positions:
+            f.seek(position)
+            samples.append((position, zlib.crc32(f.read(min(SAMPLE_BLOCK, offset - position)))))
+    return samples
+
+
+def prefix_unchanged(path: str, state: IncrementalState, verify: str = 'full') -> bool:
+    """
+    Whether the prefix of the file processed in `state` is unchanged.
+    """
+    assert verify in VERIFICATIONS, f'verify should be one of {VERIFICATIONS}'
+    if os.path.getsize(path) < state.offset:
+        return False
+    if verify == 'full':
+        return crc32_of_range(path, 0, state.offset) == state.crc32
+    return prefix_samples(path, state.offset) == state.samples
@@ -0,0 +1,153 @@
+"""
+An exact, disk-backed store of the processed indices
+
+An alternative to `api.IndexCuckooFilter`: instead of the pending
+indices held in memory in a cuckoo filter (where a false positive
+skips or downloads an index again), the processed indices are recorded
+exactly in an SQLite file (a B-tree keyed by the index).
+
+- Nothing has to be built from `index_generator()` beforehand.
+- The memory does not grow with the number of indices
+    (only the page cache of SQLite and the writes not flushed yet).
+- The indices of `index_generator()` are filtered in batches,
+    with one query per batch.
+- The writes are batched, and committed at the checkpoints of the `SchemaReducer`.
+"""
+import itertools
+import os
+import sqlite3
+import threading
+import typing
+
+__all__ = ['SQLiteIndexStore']
+
+# NOTE: below the default max number of host parameters of the old versions of SQLite
+_QUERY_SIZE = 999
+
+
+class SQLiteIndexStore:
+    """
+    Record the processed indices in an SQLite file.
+
+    It has the interface of `api.IndexCuckooFilter`, where an index is
+    `remove`d from the pending ones when it is processed.
+
+    Args:
+        - dump_file_path: the path of the SQLite file
+        - write_batch_size: number of processed indices buffered before written
+        - filter_batch_size: number of indices looked up by a query in `filter`
+    """
+
+    def __init__(self, dump_file_path='index.sqlite', write_batch_size: int = 10000,
+                 filter_batch_size: int = 10000):
+        self._dump_file_path = dump_file_path
+        self._write_batch_size = write_batch_size
+        self._filter_batch_size = filter_batch_size
+        existed = os.path.exists(dump_file_path)
+        # NOTE: `filter` may be consumed by another thread (e.g. of `AsyncFetcher`)
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(
+            dump_file_path, isolation_level='DEFERRED', check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        # NOTE: the commits are made durable, as the log segments of
+        # the `SchemaReducer` are deleted after the commits
+        self._connection.execute('PRAGMA synchronous=FULL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS processed (key TEXT PRIMARY KEY) WITHOUT ROWID')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)')
+        self._connection.commit()
+        self._pending: typing.Set[str] = set()
+        row = self._connection.execute(
+            "SELECT value FROM meta WHERE name = 'seq'").fetchone()
+        self.seq = 0 if row is None else row[0]
+        if existed:
+            print(f'{self._dump_file_path} Loaded')
+
+    @property
+    def dump_file_path(self) -> str:
+        return self._dump_file_path
+
+    def remove(self, index: str):
+        """
+        Record the index as processed.
+        """
+        self._pending.add(index)
+        if len(self._pending) >= self._write_batch_size:
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            if self._pending:
+                self._connection.executemany(
+                    'INSERT OR IGNORE INTO processed VALUES (?)',
+                    ((index,) for index in self._pending))
+                self._pending.clear()
+
+    def contains(self, index: str) -> bool:
+        """
+        Whether the index is not processed yet.
+        """
+        if index in self._pending:
+            return False
+        with self._lock:
+            return self._connection.execute(
+                'SELECT 1 FROM processed WHERE key = ?', (index,)).fetchone() is None
+
+    def _processed(self, indices: typing.List[str]) -> typing.Set[str]:
+        result: typing.Set[str] = set()
+        for start in range(0, len(indices), _QUERY_SIZE):
+            chunk = indices[start:start + _QUERY_SIZE]
+            with self._lock:
+                result.update(row[0] for row in self._connection.execute(
+                    'SELECT key FROM processed WHERE key IN ({})'.format(','.join('?' * len(chunk))),
+                    chunk))
+        return result
+
+    def filter(self, index_gen: typing.Iterable[str]) -> typing.Iterator[str]:
+        """
+        Yield the indices not processed yet (in order).
+        """
+        index_gen = iter(index_gen)
+        while True:
+            batch = list(itertools.islice(index_gen, self._filter_batch_size))
+            if not batch:
+                return
+            processed = self._processed(batch)
+            for index in batch:
+                if index not in processed and index not in self._pending:
+                    yield index
+
+    def checkpoint(self):
+        """
+        Commit the processed indices.
+        """
+        with self._lock:
+            self._flush()
+            self._connection.commit()
+
+    def compact(self, seq: int, removed_since: typing.Callable[[int], typing.Iterable[str]]):
+        # NOTE: the indices of the log segments up to `seq` are already committed
+        # by `checkpoint` (INSERT OR IGNORE makes replaying them harmless),
+        # so only `seq` is updated, on the next `save`.
+        pass
+
+    def save(self):
+        with self._lock:
+            self._flush()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('seq', ?)", (self.seq,))
+            self._connection.commit()
+        print(f'{self._dump_file_path} Saved')
+
+    def exit_gracefully(self, *args):
+        self.save()
+        print('[SQLiteIndexStore] exit gracefully')
+
+    def close(self):
+        self.save()
+        self._connection.close()
+
+    def __len__(self):
+        self._flush()
+        return self._connection.execute('SELECT COUNT(*) FROM processed').fetchone()[0]
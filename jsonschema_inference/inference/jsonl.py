@@ -1,46 +1,235 @@
 import abc
 import os
-import subprocess
+import typing
+from concurrent.futures import ProcessPoolExecutor
 from threading import Thread
 import signal
-from . import remote
+from ..config import config
 from ..schema.inference.reduce import reduce_schema
+from .executors import init_worker
+from .metrics import Metrics
+from .reader import split_byte_ranges
+from .incremental import (
+    IncrementalState, load_state, save_state, complete_end,
+    crc32_of_range, prefix_samples, prefix_unchanged, VERIFICATIONS)
 
 
 __all__ = ['JsonlInferenceEngine']
 
+ENGINES = ('native', 'pypy', 'python')
+# jsonl: one json per line, array: a top-level json array, stream: concatenated json values
+INPUT_FORMATS = ('jsonl', 'array', 'stream')
+# reservoir: a uniform sample of the lines (read through), offset: lines at random offsets (seeked)
+SAMPLINGS = ('reservoir', 'offset')
 
-def get_schema_remotely(jsonl_path, verbose=True, position=0, batch_size=1000):
-    import json
+
+def get_schema_remotely(jsonl_path, verbose=True, position=0, batch_size=1000,
+                        decoder=None, converge_after=None, return_count=False, metrics=None):
+    return get_schema_of_range(
+        jsonl_path, verbose=verbose, position=position, batch_size=batch_size,
+        decoder=decoder, converge_after=converge_after, return_count=return_count,
+        metrics=metrics)
+
+
+def get_schema_of_range(jsonl_path, start=0, end=None, verbose=True,
+                        position=0, batch_size=1000, decoder=None,
+                        converge_after=None, return_count=False, metrics=None,
+                        return_metrics=False):
+    """
+    Infer the json schema of the lines starting within
+    the byte range [start, end) of a jsonl file.
+    (`start` should be the beginning of a line.)
+
+    `decoder` is the name of the json decoder backend
+    (`config.decoder` if not provided).
+    The inference stops early once the schema converges
+    if `converge_after` is provided (see `InferenceEngine`), and
+    the number of jsons inferenced is also returned if `return_count`.
+    The lines read, and the time spent reading (io), decoding, fitting and
+    reducing them are recorded in `metrics` if provided, and the raw
+    metrics (`Metrics.state`, e.g. of a worker process) are also returned
+    (last) if `return_metrics`.
+    """
+    import os
+    import tqdm
+    from jsonschema_inference.schema import InferenceEngine
+    from jsonschema_inference.inference.reader import iter_lines
+    from jsonschema_inference.inference.decoders import get_decoder
+    from jsonschema_inference.inference.metrics import Metrics
+    progress = None
+    if verbose:
+        if end is None:
+            end = os.path.getsize(jsonl_path)
+        desc = jsonl_path if start == 0 else f'{jsonl_path}[{start}:{end}]'
+        progress = tqdm.tqdm(
+            total=end - start, desc=desc, position=position,
+            unit='B', unit_scale=True)
+    if metrics is None and return_metrics:
+        metrics = Metrics()
+    try:
+        lines = iter_lines(jsonl_path, start, end, progress=progress)
+        decode = get_decoder(decoder)
+        if metrics is not None:
+            lines = metrics.count(lines, 'lines', size=len, activity='io')
+            decode = metrics.timed(decode, 'decode')
+        engine = InferenceEngine(batch_size=batch_size, converge_after=converge_after,
+                                 metrics=metrics)
+        schema = engine.get_schema_iteratively(map(decode, lines))
+    finally:
+        if progress is not None:
+            progress.close()
+    result = (schema,)
+    if return_count:
+        result += (engine.documents_seen,)
+    if return_metrics:
+        result += (metrics.state(),)
+    return result if len(result) > 1 else schema
+
+
+def get_schema_of_sample(jsonl_path, sampling='offset', sample_size=10000, seed=None,
+                         batch_size=1000, decoder=None, converge_after=None, metrics=None):
+    """
+    Infer the json schema of a sample of the lines of a jsonl file.
+
+    Args:
+        - sampling:
+            - reservoir: a uniform sample of the lines (the file is read
+                through, but only the sampled lines are decoded).
+            - offset: the lines at random offsets of `sample_size` strata of the file
+                (see `reader.sample_lines`), read with seeks only.
+        - sample_size: number of lines sampled
+        - seed: the random seed of the sampling
+        - converge_after: see `InferenceEngine`
+        - metrics: the `Metrics` recording the fitting and reducing time
+    Returns:
+        - the json schema
+        - the number of jsons inferenced
+    """
+    import random
+    from jsonschema_inference.schema import InferenceEngine
+    from jsonschema_inference.schema.inference.sampling import reservoir_sample
+    from jsonschema_inference.inference.reader import iter_lines, sample_lines
+    from jsonschema_inference.inference.decoders import get_decoder
+    assert sampling in SAMPLINGS, f'sampling should be one of {SAMPLINGS}'
+    rng = random.Random(seed)
+    if sampling == 'offset':
+        lines: typing.Iterable[bytes] = sample_lines(jsonl_path, sample_size, rng)
+    else:
+        lines = reservoir_sample(iter_lines(jsonl_path), sample_size, rng)
+    engine = InferenceEngine(batch_size=batch_size, converge_after=converge_after,
+                             metrics=metrics)
+    schema = engine.get_schema_iteratively(map(get_decoder(decoder), lines))
+    return schema, engine.documents_seen
+
+
+def get_schema_of_values(json_path, start=0, end=None, array=False,
+                         aligned=True, verbose=True, position=0, batch_size=1000):
+    """
+    Infer the json schema of the json values (or the elements of
+    the top-level array if `array`) beginning within
+    the byte range [start, end) of a json file. (See `reader.ValueReader`)
+
+    Returns:
+        - the json schema
+        - the byte where the first value begins (None if no value is found)
+        - the byte where reading stops
+    """
+    import os
     import tqdm
     from jsonschema_inference.schema import InferenceEngine
-    total = sum(1 for _ in open(jsonl_path, 'r'))
-    with open(jsonl_path, 'r') as f:
-        json_pipe = map(json.loads, f)
-        if verbose:
-            json_pipe = tqdm.tqdm(
-                json_pipe, total=total, desc=jsonl_path, position=position)
+    from jsonschema_inference.inference.reader import ValueReader
+    progress = None
+    if verbose:
+        if end is None:
+            end = os.path.getsize(json_path)
+        desc = json_path if start == 0 else f'{json_path}[{start}:{end}]'
+        progress = tqdm.tqdm(
+            total=max(end - start, 0), desc=desc, position=position,
+            unit='B', unit_scale=True)
+    reader = ValueReader(json_path, start, end, array=array, aligned=aligned,
+                         progress=progress)
+    try:
         schema = InferenceEngine(
-            batch_size=batch_size).get_schema_iteratively(json_pipe)
-    return schema
+            batch_size=batch_size).get_schema_iteratively(reader)
+    except ValueError:
+        # NOTE: the guessed beginning of a value may be wrong
+        if aligned:
+            raise
+        return reduce_schema([]), None, None
+    finally:
+        if progress is not None:
+            progress.close()
+    return schema, reader.begin, reader.stop
 
 
 class JsonlInferenceEngine:
     """
     Args:
         - inference_worker_cnt: number of processes inferencing the json schema
-        - tmp_dir: the path to store the splitted jsonl files.
+        - tmp_dir: (deprecated) the jsonl file is no longer splitted into temporary files.
+        - engine: how the jsonl file is inferenced in parallel
+            - native: worker processes (`concurrent.futures`) fit the byte ranges of the jsonl file.
+            - pypy / python: `execnet` gateways fit the byte ranges of the jsonl file
+                (the pypy engine requires pypy3 installed).
+        - decoder: the json decoder backend (`config.decoder` if not provided. See `inference.decoders`)
+        - input_format: the format of the file
+            - jsonl: one json per line.
+            - array: a (huge) top-level json array, whose elements are inferenced as the jsons.
+            - stream: concatenated json values (not necessarily separated by line breaks).
+            The array and stream formats are read with the native engine and
+            decoded by the stdlib json.
+        - sampling: only inference a sample of `sample_size` lines, in this process
+            ('reservoir' or 'offset', see `get_schema_of_sample`. The jsonl format only)
+        - sample_size: number of lines sampled
+        - seed: the random seed of the sampling
+        - converge_after: stop once the schema has not changed for this number of batches
+            in a row (each worker stops on its own byte range. See `InferenceEngine`)
+        - state_path: inference the jsonl file incrementally: the schema is saved in this
+            state file with the byte offset processed, and a later run only inferences
+            the lines appended since then (see `inference.incremental`. The jsonl format only)
+        - verify_prefix: how a later run checks that the processed prefix is unchanged
+            ('full' or 'sample'); the file is inferenced from scratch if it has changed.
+            NOTE: 'sample' only reads blocks of the prefix, so it misses the edits
+            between them which keep the length of the file (see `inference.incremental`).
+        - metrics: the `Metrics` of the runs (with a json report, snapshots or a
+            Prometheus endpoint if configured. See `inference.metrics`). The lines
+            and the io / decode / fit / reduce times are recorded with the jsonl format,
+            except by the pypy / python engines.
+    After `get_schema`, `documents_seen` is the number of jsons inferenced
+    (None with the pypy / python engines), and `rebuilt` tells
+    whether an incremental run has inferenced the file from scratch.
     Methods to be overide:
         - jsonl_path: path to the jsonl file.
     """
 
-    def __init__(self, inference_worker_cnt=8, tmp_dir='/tmp'):
+    def __init__(self, inference_worker_cnt=8, tmp_dir='/tmp', engine='native',
+                 decoder=None, input_format='jsonl', sampling=None, sample_size=10000,
+                 seed=None, converge_after=None, state_path=None, verify_prefix='full',
+                 metrics=None):
         self._inference_worker_cnt = inference_worker_cnt
+        self._decoder = config.decoder if decoder is None else decoder
         self._tmp_dir = tmp_dir
-        # NOTE: Whether the engine is pypy or python depends on how the code is
-        # executed
-        self._engine = 'pypy'  # or python
-        if inference_worker_cnt > 1:
+        assert engine in ENGINES, f'engine should be one of {ENGINES}'
+        self._engine = engine
+        assert input_format in INPUT_FORMATS, f'input_format should be one of {INPUT_FORMATS}'
+        assert input_format == 'jsonl' or engine == 'native', \
+            f'{input_format} input_format requires the native engine'
+        self._input_format = input_format
+        assert sampling is None or sampling in SAMPLINGS, f'sampling should be one of {SAMPLINGS}'
+        assert sampling is None or input_format == 'jsonl', 'sampling requires the jsonl input_format'
+        self._sampling = sampling
+        self._sample_size = sample_size
+        self._seed = seed
+        self._converge_after = converge_after
+        assert state_path is None or (input_format == 'jsonl' and sampling is None and converge_after is None), \
+            'state_path requires the jsonl input_format, without sampling or converge_after'
+        assert verify_prefix in VERIFICATIONS, f'verify_prefix should be one of {VERIFICATIONS}'
+        self._state_path = state_path
+        self._verify_prefix = verify_prefix
+        self.documents_seen: typing.Optional[int] = None
+        self.rebuilt: typing.Optional[bool] = None
+        self.metrics = Metrics() if metrics is None else metrics
+        if inference_worker_cnt > 1 and engine != 'native':
             signal.signal(signal.SIGTERM, self._graceful_exit)
             signal.signal(signal.SIGINT, self._graceful_exit)
 
@@ -49,36 +238,143 @@ class JsonlInferenceEngine:
         raise NotImplementedError
 
     def get_schema(self, verbose=True):
-        if self._inference_worker_cnt == 1:
-            result = get_schema_remotely(self.jsonl_path, verbose=verbose)
+        self.documents_seen = None
+        self.metrics.start(workers=self._inference_worker_cnt)
+        try:
+            if self._input_format != 'jsonl':
+                return self._get_schema_of_values(verbose=verbose)
+            if self._state_path is not None:
+                result = self._get_schema_incrementally(verbose=verbose)
+            elif self._sampling is not None:
+                result, self.documents_seen = get_schema_of_sample(
+                    self.jsonl_path, sampling=self._sampling, sample_size=self._sample_size,
+                    seed=self._seed, decoder=self._decoder, converge_after=self._converge_after,
+                    metrics=self.metrics)
+            elif self._inference_worker_cnt == 1:
+                result, self.documents_seen = get_schema_remotely(
+                    self.jsonl_path, verbose=verbose, decoder=self._decoder,
+                    converge_after=self._converge_after, return_count=True,
+                    metrics=self.metrics)
+            else:
+                result = self.get_schema_parallel(verbose=verbose)
+            return result
+        finally:
+            self.metrics.stop()
+
+    def get_schema_parallel(self, verbose=True, start=0, end=None):
+        if self._engine == 'native':
+            return self._get_schema_natively(verbose=verbose, start=start, end=end)
+        else:
+            return self._get_schema_remotely(verbose=verbose, start=start, end=end)
+
+    def _get_schema_incrementally(self, verbose=True):
+        """
+        Inference the lines appended after the offset saved in the state file,
+        merge their schema into the saved one, and save the new offset.
+        (Only the complete lines are inferenced: a line being appended is left for the next run.)
+        """
+        end = complete_end(self.jsonl_path)
+        state = load_state(self._state_path)
+        self.rebuilt = state is None or not prefix_unchanged(
+            self.jsonl_path, state, verify=self._verify_prefix)
+        if self.rebuilt:
+            start, schema, crc, documents = 0, reduce_schema([]), 0, 0
+        else:
+            start, schema, crc, documents = state.offset, state.schema, state.crc32, state.documents
+        if end > start:
+            if self._inference_worker_cnt == 1:
+                tail, self.documents_seen = get_schema_of_range(
+                    self.jsonl_path, start, end, verbose=verbose,
+                    decoder=self._decoder, return_count=True, metrics=self.metrics)
+            else:
+                tail = self.get_schema_parallel(verbose=verbose, start=start, end=end)
+            schema |= tail
+            crc = crc32_of_range(self.jsonl_path, start, end, value=crc)
         else:
-            result = self.get_schema_parallel(verbose=verbose)
-        return result
+            self.documents_seen = 0
+        if self.documents_seen is not None:
+            documents += self.documents_seen
+        save_state(self._state_path, IncrementalState(
+            end, crc, prefix_samples(self.jsonl_path, end), documents, schema))
+        return schema
+
+    def _get_schema_natively(self, verbose=True, start=0, end=None):
+        byte_ranges = split_byte_ranges(
+            self.jsonl_path, self._inference_worker_cnt, start=start, end=end)
+        if not byte_ranges:
+            return reduce_schema([])
+        with ProcessPoolExecutor(max_workers=len(byte_ranges),
+                                 initializer=init_worker, initargs=(config.state(),)) as executor:
+            futures = [
+                executor.submit(
+                    get_schema_of_range, self.jsonl_path, start, end,
+                    verbose=verbose, position=i, decoder=self._decoder,
+                    converge_after=self._converge_after, return_count=True,
+                    return_metrics=True)
+                for i, (start, end) in enumerate(byte_ranges)]
+            results = [future.result() for future in futures]
+            for _, _, state in results:
+                self.metrics.merge(state)
+            self.documents_seen = sum(count for _, count, _ in results)
+            with self.metrics.timer('reduce'):
+                return reduce_schema(schema for schema, _, _ in results)
 
-    def get_schema_parallel(self, verbose=True):
-        self._split_jsonl(self._inference_worker_cnt)
+    def _get_schema_of_values(self, verbose=True):
+        """
+        The values of an array / stream file cannot be aligned to line breaks,
+        so the file is splitted into byte ranges of equal size and
+        each worker guesses where the first value of its range begins.
+        A guess is confirmed if it is where the worker of the previous
+        range stops, otherwise the range is inferenced again from there.
+        """
+        array = self._input_format == 'array'
+        size = os.path.getsize(self.jsonl_path)
+        split_count = max(min(self._inference_worker_cnt, size), 1)
+        offsets = [size * i // split_count for i in range(split_count + 1)]
+        byte_ranges = list(zip(offsets[:-1], offsets[1:]))
+        with ProcessPoolExecutor(max_workers=split_count,
+                                 initializer=init_worker, initargs=(config.state(),)) as executor:
+            futures = [
+                executor.submit(
+                    get_schema_of_values, self.jsonl_path, start, end,
+                    array=array, aligned=i == 0, verbose=verbose, position=i)
+                for i, (start, end) in enumerate(byte_ranges)]
+            schemas = []
+            stop = 0
+            for i, ((start, end), future) in enumerate(zip(byte_ranges, futures)):
+                schema, begin, range_stop = future.result()
+                if i > 0 and begin != stop:
+                    if stop >= end:
+                        # the range is within the last value of the previous range
+                        continue
+                    schema, begin, range_stop = get_schema_of_values(
+                        self.jsonl_path, stop, end, array=array,
+                        verbose=verbose, position=i)
+                schemas.append(schema)
+                stop = range_stop
+            return reduce_schema(schemas)
+
+    def _get_schema_remotely(self, verbose=True, start=0, end=None):
+        from . import remote
+        byte_ranges = split_byte_ranges(
+            self.jsonl_path, self._inference_worker_cnt, start=start, end=end)
         schemas = []
         self._remote_gateways = []
 
-        def layered_get_schema(i, filename):
+        def layered_get_schema(i, start, end):
             if self._engine == 'pypy':
-                gw, decorated_get_schema = remote.pypy(get_schema_remotely)
+                gw, decorated_get_schema = remote.pypy(get_schema_of_range)
             else:
-                gw, decorated_get_schema = remote.python(get_schema_remotely)
+                gw, decorated_get_schema = remote.python(get_schema_of_range)
             self._remote_gateways.append(gw)
             schema = decorated_get_schema(
-                filename, verbose=verbose, position=i)
+                self.jsonl_path, start, end, verbose=verbose, position=i,
+                decoder=self._decoder, converge_after=self._converge_after)
             schemas.append(schema)
         try:
-            split_file_paths = os.listdir(self._split_path)
-            split_file_pipe = map(
-                lambda file: os.path.join(
-                    self._split_path,
-                    file),
-                split_file_paths)
             # construct the threads
-            self.threads = [Thread(target=layered_get_schema, args=(i, filename))
-                            for i, filename in enumerate(split_file_pipe)]
+            self.threads = [Thread(target=layered_get_schema, args=(i, start, end))
+                            for i, (start, end) in enumerate(byte_ranges)]
             # start the threads
             for thread in self.threads:
                 thread.daemon = False
@@ -98,7 +394,6 @@ class JsonlInferenceEngine:
 
     def _exit(self):
         self.__stop_gateways()
-        self.__remove_split_files()
         print('exit')
 
     def _graceful_exit(self, signal=None, frame=None):
@@ -113,22 +408,3 @@ class JsonlInferenceEngine:
             except BaseException:
                 pass
         print('remote gateways stopped')
-
-    def __remove_split_files(self):
-        if os.path.exists(self._split_path):
-            subprocess.run(['rm', '-r', self._split_path])
-            print('split files removed')
-
-    def _split_jsonl(self, split_count):
-        out = subprocess.check_output(['wc', '-l', self.jsonl_path])
-        total = int(out.decode("utf-8").split(self.jsonl_path)[0])
-        if not os.path.exists(self._split_path):
-            os.mkdir(self._split_path)
-        json_cnt_per_file = int(total / split_count)
-        subprocess.run(['split', '-l', str(json_cnt_per_file),
-                       self.jsonl_path, self._split_path + '/'])
-        return json_cnt_per_file
-
-    @property
-    def _split_path(self):
-        return os.path.join(self._tmp_dir, 'split')
@@ -0,0 +1,345 @@
+"""
+Metrics of the inference pipelines
+
+`Metrics` records, while a pipeline runs:
+
+- the items (and bytes) passed through each stage (`count`),
+- the time spent in each activity, e.g. I/O, decoding, fitting, reducing
+    (`timer`, `timed`, `consume`). The times of the worker processes
+    are merged into the metrics of the run (`state` / `merge`),
+- the depth of the queues between the stages (`gauge`),
+- the utilization of the inference workers (the fitting time over
+    the elapsed time of the workers) and the peak RSS (of the process
+    and of its worker processes, as reported by the workers themselves,
+    since `RUSAGE_CHILDREN` misses the processes which are not children
+    of this one, e.g. those started by a forkserver).
+
+`report` summarizes them as a json-serializable dict (saved to `report_path`
+when the run ends). Snapshots of the report can be appended to `snapshot_path`
+every `interval` seconds, and served in the Prometheus text format on
+`http://127.0.0.1:{port}/metrics`.
+
+The items counted by `count` are accumulated locally and added to
+the metrics every `_FLUSH_EVERY` items, so the overhead per item is
+small (two clock reads if timed).
+"""
+import collections
+import contextlib
+import json
+import resource
+import sys
+import threading
+import time
+import typing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+__all__ = ['Metrics', 'Gauge']
+
+_FLUSH_EVERY = 1000
+_PREFIX = 'jsonschema_inference'
+
+
+class Gauge:
+    """
+    The current and the peak value of a quantity (e.g. a queue depth).
+    """
+
+    def __init__(self):
+        self.value = 0
+        self.peak = 0
+
+    def set(self, value: int):
+        self.value = value
+        if value > self.peak:
+            self.peak = value
+
+
+def _peak_rss(who: int = resource.RUSAGE_SELF) -> int:
+    # NOTE: ru_maxrss is in KiB on Linux, in bytes on macOS
+    unit = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(who).ru_maxrss * unit
+
+
+class Metrics:
+    """
+    Args:
+        - report_path: path to save the json report to when the run ends
+        - snapshot_path: path to append the snapshots of the report to (as json lines)
+        - interval: seconds between the snapshots
+        - port: port of the Prometheus text endpoint on localhost (not served if not provided)
+    """
+
+    def __init__(self, report_path: typing.Optional[str] = None,
+                 snapshot_path: typing.Optional[str] = None, interval: float = 10.,
+                 port: typing.Optional[int] = None):
+        self._report_path = report_path
+        self._snapshot_path = snapshot_path
+        self._interval = interval
+        self._port = port
+        self._lock = threading.Lock()
+        self.counter: collections.Counter = collections.Counter()
+        self.bytes: collections.Counter = collections.Counter()
+        self.seconds: typing.DefaultDict[str, float] = collections.defaultdict(float)
+        self.gauges: typing.Dict[str, Gauge] = dict()
+        self.workers = 1
+        self._worker_rss = 0
+        self._started = time.monotonic()
+        self._stopped: typing.Optional[float] = None
+        self._stop_event = threading.Event()
+        self._reporter: typing.Optional[threading.Thread] = None
+        self._server: typing.Optional[ThreadingHTTPServer] = None
+
+    def start(self, workers: int = 1):
+        """
+        Reset the metrics for a run with `workers` inference workers,
+        and start the snapshots / the endpoint.
+        """
+        with self._lock:
+            self.counter.clear()
+            self.bytes.clear()
+            self.seconds.clear()
+            self.gauges.clear()
+            self._worker_rss = 0
+        self.workers = workers
+        self._started = time.monotonic()
+        self._stopped = None
+        self._stop_event.clear()
+        if self._snapshot_path is not None:
+            self._reporter = threading.Thread(target=self._snapshot_periodically, daemon=True)
+            self._reporter.start()
+        if self._port is not None and self._server is None:
+            self._server = ThreadingHTTPServer(('127.0.0.1', self._port), _handler(self))
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        """
+        End the run: stop the snapshots / the endpoint and save the report.
+        """
+        self._stopped = time.monotonic()
+        self._stop_event.set()
+        if self._reporter is not None:
+            self._reporter.join()
+            self._reporter = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._report_path is not None:
+            with open(self._report_path, 'w') as f:
+                json.dump(self.report(), f, indent=2)
+
+    @property
+    def port(self) -> typing.Optional[int]:
+        return None if self._server is None else self._server.server_address[1]
+
+    def add(self, stage: str, items: int = 1, nbytes: int = 0):
+        with self._lock:
+            self.counter[stage] += items
+            if nbytes:
+                self.bytes[stage] += nbytes
+
+    def add_time(self, activity: str, seconds: float):
+        with self._lock:
+            self.seconds[activity] += seconds
+
+    def gauge(self, name: str) -> Gauge:
+        with self._lock:
+            if name not in self.gauges:
+                self.gauges[name] = Gauge()
+            return self.gauges[name]
+
+    @contextlib.contextmanager
+    def timer(self, activity: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(activity, time.perf_counter() - start)
+
+    def count(self, iterable: typing.Iterable, stage: str,
+              size: typing.Optional[typing.Callable[[typing.Any], int]] = None,
+              activity: typing.Optional[str] = None) -> typing.Iterator:
+        """
+        Count the items (and their bytes if `size` is provided) passing through as `stage`
+        (and the time spent producing them as `activity` if provided).
+        """
+        items = nbytes = 0
+        seconds = 0.
+        iterator = iter(iterable)
+        try:
+            while True:
+                if activity is not None:
+                    start = time.perf_counter()
+                    item = next(iterator, _END)
+                    seconds += time.perf_counter() - start
+                else:
+                    item = next(iterator, _END)
+                if item is _END:
+                    return
+                items += 1
+                if size is not None:
+                    nbytes += size(item)
+                if items == _FLUSH_EVERY:
+                    self._flush(stage, items, nbytes, activity, seconds)
+                    items = nbytes = 0
+                    seconds = 0.
+                yield item
+        finally:
+            self._flush(stage, items, nbytes, activity, seconds)
+
+    def _flush(self, stage, items, nbytes, activity, seconds):
+        with self._lock:
+            self.counter[stage] += items
+            if nbytes:
+                self.bytes[stage] += nbytes
+            if activity is not None:
+                self.seconds[activity] += seconds
+
+    def timed(self, func: typing.Callable, activity: str) -> typing.Callable:
+        """
+        Wrap a function, recording the time of its calls as `activity`.
+        """
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add_time(activity, time.perf_counter() - start)
+        return wrapper
+
+    def consume(self, consumer: typing.Callable[[typing.Iterator], typing.Any],
+                iterable: typing.Iterable, activity: str):
+        """
+        Call `consumer(items)` on the items of `iterable`, recording the time spent
+        by the consumer (excluding the time spent producing the items) as `activity`.
+        """
+        produced = [0.]
+
+        def produce():
+            iterator = iter(iterable)
+            while True:
+                start = time.perf_counter()
+                item = next(iterator, _END)
+                produced[0] += time.perf_counter() - start
+                if item is _END:
+                    return
+                yield item
+        start = time.perf_counter()
+        try:
+            return consumer(produce())
+        finally:
+            self.add_time(activity, time.perf_counter() - start - produced[0])
+
+    def state(self) -> dict:
+        """
+        The raw metrics of a worker process (see `merge`).
+        """
+        with self._lock:
+            return {'counter': dict(self.counter), 'bytes': dict(self.bytes),
+                    'seconds': dict(self.seconds), 'peak_rss': _peak_rss()}
+
+    def merge(self, state: dict):
+        """
+        Add the raw metrics of a worker process (and keep the largest peak RSS).
+        """
+        with self._lock:
+            self._worker_rss = max(self._worker_rss, state.get('peak_rss', 0))
+            self.counter.update(state['counter'])
+            self.bytes.update(state['bytes'])
+            for activity, seconds in state['seconds'].items():
+                self.seconds[activity] += seconds
+
+    def report(self) -> dict:
+        """
+        Summary of the metrics:
+            - elapsed: seconds since the start of the run
+            - stages: items, items_per_second, bytes and bytes_per_second of each stage
+            - seconds: the time spent in each activity (summed over the threads / workers)
+            - queues: the current and the peak depth of each queue
+            - workers / utilization: number of inference workers, and the
+                fitting time over their elapsed time
+            - peak_rss: the peak RSS (bytes) of the process and of its largest worker process
+        """
+        end = time.monotonic() if self._stopped is None else self._stopped
+        elapsed = max(end - self._started, 1e-9)
+        rss = _peak_rss()
+        children_rss = _peak_rss(resource.RUSAGE_CHILDREN)
+        with self._lock:
+            stages = {
+                stage: {'items': items, 'items_per_second': items / elapsed,
+                        'bytes': self.bytes[stage],
+                        'bytes_per_second': self.bytes[stage] / elapsed}
+                for stage, items in self.counter.items()}
+            return {
+                'elapsed': elapsed,
+                'stages': stages,
+                'seconds': dict(self.seconds),
+                'queues': {name: {'depth': gauge.value, 'peak': gauge.peak}
+                           for name, gauge in self.gauges.items()},
+                'workers': self.workers,
+                'utilization': self.seconds['fit'] / (elapsed * self.workers),
+                'peak_rss': {'process': rss, 'workers': max(self._worker_rss, children_rss)},
+            }
+
+    def prometheus(self) -> str:
+        """
+        The report in the Prometheus text format.
+        """
+        report = self.report()
+        lines = []
+
+        def metric(name, kind, samples):
+            lines.append(f'# TYPE {_PREFIX}_{name} {kind}')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f'{_PREFIX}_{name}{{{label_text}}} {value}' if label_text
+                             else f'{_PREFIX}_{name} {value}')
+        metric('elapsed_seconds', 'gauge', [({}, report['elapsed'])])
+        metric('items_total', 'counter', [
+            ({'stage': stage}, values['items']) for stage, values in report['stages'].items()])
+        metric('bytes_total', 'counter', [
+            ({'stage': stage}, values['bytes']) for stage, values in report['stages'].items()])
+        metric('seconds_total', 'counter', [
+            ({'activity': activity}, seconds) for activity, seconds in report['seconds'].items()])
+        metric('queue_depth', 'gauge', [
+            ({'queue': name}, values['depth']) for name, values in report['queues'].items()])
+        metric('worker_utilization', 'gauge', [({}, report['utilization'])])
+        metric('peak_rss_bytes', 'gauge', [
+            ({'process': process}, rss) for process, rss in report['peak_rss'].items()])
+        return '\n'.join(lines) + '\n'
+
+    def _snapshot_periodically(self):
+        while not self._stop_event.wait(self._interval):
+            self.snapshot()
+
+    def snapshot(self):
+        """
+        Append the report to `snapshot_path` (as a json line).
+        """
+        report = self.report()
+        report['time'] = time.time()
+        with open(self._snapshot_path, 'a') as f:
+            f.write(json.dumps(report) + '\n')
+
+
+_END = object()
+
+
+def _handler(metrics: Metrics):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = metrics.prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+    return MetricsHandler
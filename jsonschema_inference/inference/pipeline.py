@@ -0,0 +1,71 @@
+"""
+Building blocks of the streaming inference pipelines
+
+The stages of a pipeline are chained lazily as generators, so
+nothing is pulled from a stage before the next stage asks for it.
+The stages running on a pool keep at most `max_pending` items in flight,
+so the memory stays flat no matter how many items flow through the pipeline.
+"""
+import collections
+import queue
+import typing
+
+__all__ = ['bounded_imap_unordered', 'count']
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def bounded_imap_unordered(pool, func: typing.Callable, iterable: typing.Iterable,
+                           max_pending: int, gauge=None) -> typing.Iterator:
+    """
+    Like `pool.imap_unordered(func, iterable)`, but at most `max_pending`
+    items are taken from `iterable` and not yet yielded at a time.
+    (`imap_unordered` takes the items as fast as it can,
+    and its results pile up if they are consumed slowly.)
+
+    Args:
+        - pool: a pool with the `apply_async(func, args, callback=..., error_callback=...)`
+            method of `multiprocessing.pool.Pool`.
+        - func: the function applied to each item
+        - iterable: the items
+        - max_pending: max number of items being processed or waiting to be yielded
+        - gauge: a `metrics.Gauge` set to the number of these items
+    """
+    assert max_pending > 0
+    done: queue.Queue = queue.Queue()
+    items = iter(iterable)
+    exhausted = False
+    pending = 0
+    while True:
+        while not exhausted and pending < max_pending:
+            try:
+                item = next(items)
+            except StopIteration:
+                exhausted = True
+                break
+            pool.apply_async(
+                func, (item,), callback=done.put,
+                error_callback=lambda e: done.put(_Failure(e)))
+            pending += 1
+        if gauge is not None:
+            gauge.set(pending)
+        if pending == 0:
+            return
+        result = done.get()
+        pending -= 1
+        if isinstance(result, _Failure):
+            raise result.error
+        yield result
+
+
+def count(iterable: typing.Iterable, counter: collections.Counter,
+          name: str) -> typing.Iterator:
+    """
+    Count the items passing through as `counter[name]`.
+    """
+    for item in iterable:
+        counter[name] += 1
+        yield item
@@ -0,0 +1,251 @@
+"""
+Per-host adaptive concurrency control of the downloads
+
+`RateController` bounds the requests in flight to each host by a
+window adjusted with AIMD (additive increase, multiplicative decrease):
+
+- a successful response widens the window by 1 / window
+    (about one more request in flight per round trip),
+- a throttled response (429, 5xx), a failed request, or a latency above
+    `latency_tolerance` times the lowest latency seen shrinks the window
+    by `decrease` (at most once per round trip),
+- a `Retry-After` header holds the requests to the host until then,
+- and a token bucket optionally caps the requests per second of a host.
+
+So the number of requests in flight follows what a host serves without
+throttling. The requests, throttled responses, retries, latency and the
+window of each host are reported by `metrics`.
+"""
+import asyncio
+import collections
+import email.utils
+import threading
+import time
+import typing
+from urllib.parse import urlsplit
+from .fetch import HTTPError, RETRY_STATUSES
+
+__all__ = ['RateController', 'HostMetrics']
+
+# NOTE: how often a request waiting for a slot of the window checks again (async)
+_POLL_SECONDS = 0.01
+_LATENCY_SMOOTHING = 0.2
+
+
+class HostMetrics(typing.NamedTuple):
+    requests: int
+    throttled: int
+    errors: int
+    retries: int
+    window: float
+    in_flight: int
+    latency: float
+    requests_per_second: float
+
+
+class _Host:
+    def __init__(self, window: float, burst: float):
+        self.window = window
+        self.in_flight = 0
+        self.tokens = burst
+        self.refilled = time.monotonic()
+        self.blocked_until = 0.
+        self.latency = 0.
+        self.min_latency = float('inf')
+        self.last_decrease = 0.
+        self.started = time.monotonic()
+        self.counter: collections.Counter = collections.Counter()
+
+
+class RateController:
+    """
+    Args:
+        - initial_window: number of requests in flight to a new host
+        - min_window / max_window: bounds of the window
+        - decrease: factor shrinking the window
+        - rate: max requests per second of a host (not limited if not provided)
+        - burst: number of requests a host can take at once within `rate` (rate if not provided)
+        - latency_tolerance: the window shrinks if the latency (smoothed) exceeds
+            this multiple of the lowest latency seen (not checked if not provided)
+        - retries: number of retries of a throttled or failed request (`request`)
+        - backoff: seconds before the first retry (doubled at each retry)
+    It is shared by the downloading threads (or used by `AsyncFetcher`).
+    """
+
+    def __init__(self, initial_window: float = 8, min_window: float = 1, max_window: float = 256,
+                 decrease: float = 0.5, rate: typing.Optional[float] = None,
+                 burst: typing.Optional[float] = None,
+                 latency_tolerance: typing.Optional[float] = None,
+                 retries: int = 3, backoff: float = 0.5):
+        assert 1 <= min_window <= initial_window <= max_window
+        assert 0 < decrease < 1
+        assert rate is None or rate > 0
+        self._initial_window = initial_window
+        self._min_window = min_window
+        self._max_window = max_window
+        self._decrease = decrease
+        self._rate = rate
+        self._burst = burst or rate or 1.
+        self._latency_tolerance = latency_tolerance
+        self._retries = retries
+        self._backoff = backoff
+        self._hosts: typing.Dict[str, _Host] = dict()
+        self._condition = threading.Condition()
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        return urlsplit(url).netloc
+
+    def _host(self, url: str) -> _Host:
+        key = self.host_of(url)
+        if key not in self._hosts:
+            self._hosts[key] = _Host(self._initial_window, self._burst)
+        return self._hosts[key]
+
+    def _try_acquire(self, url: str) -> float:
+        """
+        Take a slot of the window of the host of an url,
+        or return the seconds to wait before trying again.
+        """
+        host = self._host(url)
+        now = time.monotonic()
+        if now < host.blocked_until:
+            return host.blocked_until - now
+        if host.in_flight >= max(int(host.window), 1):
+            return _POLL_SECONDS
+        if self._rate is not None:
+            host.tokens = min(self._burst, host.tokens + (now - host.refilled) * self._rate)
+            host.refilled = now
+            if host.tokens < 1:
+                return (1 - host.tokens) / self._rate
+            host.tokens -= 1
+        host.in_flight += 1
+        host.counter['requests'] += 1
+        return 0.
+
+    def acquire(self, url: str):
+        """
+        Wait for a slot of the window of the host of an url.
+        """
+        with self._condition:
+            while True:
+                wait = self._try_acquire(url)
+                if wait == 0:
+                    return
+                self._condition.wait(wait)
+
+    async def acquire_async(self, url: str):
+        while True:
+            with self._condition:
+                wait = self._try_acquire(url)
+            if wait == 0:
+                return
+            await asyncio.sleep(wait)
+
+    def release(self, url: str, status: typing.Optional[int], latency: float,
+                retry_after: typing.Optional[str] = None):
+        """
+        Free the slot of a request, and adjust the window of its host
+        by its response (`status` is None if the request failed).
+        """
+        with self._condition:
+            host = self._host(url)
+            host.in_flight -= 1
+            now = time.monotonic()
+            if status is None or status in RETRY_STATUSES:
+                host.counter['errors' if status is None else 'throttled'] += 1
+                self._decrease_window(host, now)
+                delay = parse_retry_after(retry_after)
+                if delay is not None:
+                    host.blocked_until = max(host.blocked_until, now + delay)
+            else:
+                host.latency = latency if host.counter['responses'] == 0 else (
+                    _LATENCY_SMOOTHING * latency + (1 - _LATENCY_SMOOTHING) * host.latency)
+                host.min_latency = min(host.min_latency, latency)
+                host.counter['responses'] += 1
+                if (self._latency_tolerance is not None and
+                        host.latency > self._latency_tolerance * host.min_latency):
+                    self._decrease_window(host, now)
+                else:
+                    host.window = min(self._max_window, host.window + 1 / host.window)
+            self._condition.notify_all()
+
+    def _decrease_window(self, host: _Host, now: float):
+        # NOTE: the responses of the requests sent before a decrease do not decrease it again
+        if now - host.last_decrease > host.latency:
+            host.window = max(self._min_window, host.window * self._decrease)
+            host.last_decrease = now
+
+    def record_retry(self, url: str):
+        with self._condition:
+            self._host(url).counter['retries'] += 1
+
+    def retry_delay(self, attempt: int) -> float:
+        return self._backoff * 2 ** attempt
+
+    def request(self, url: str, headers: typing.Dict[str, str],
+                get: typing.Callable[[str, typing.Dict[str, str]],
+                                     typing.Tuple[int, typing.Mapping[str, str], bytes]]
+                ) -> typing.Tuple[int, typing.Mapping[str, str], bytes]:
+        """
+        Request an url within the window of its host, with retries
+        (`get(url, headers)` returns the status, headers and body of the response).
+        """
+        for attempt in range(self._retries + 1):
+            self.acquire(url)
+            start = time.monotonic()
+            status = None
+            retry_after = None
+            try:
+                response = get(url, headers)
+                status = response[0]
+                if status not in RETRY_STATUSES:
+                    return response
+                retry_after = response[1].get('Retry-After')
+                error: Exception = HTTPError(url, status)
+            except OSError as e:
+                error = e
+            finally:
+                self.release(url, status, time.monotonic() - start, retry_after)
+            if attempt < self._retries:
+                self.record_retry(url)
+                time.sleep(self.retry_delay(attempt))
+        raise error
+
+    def metrics(self) -> typing.Dict[str, HostMetrics]:
+        """
+        The metrics of each host:
+            - requests: number of requests sent
+            - throttled: number of throttled responses (429, 5xx)
+            - errors: number of failed requests (connection errors, timeouts)
+            - retries: number of requests retried
+            - window: the current max number of requests in flight
+            - in_flight: number of requests in flight
+            - latency: the latency of the responses (smoothed) in seconds
+            - requests_per_second: the requests sent per second since the first one
+        """
+        with self._condition:
+            now = time.monotonic()
+            return {
+                key: HostMetrics(
+                    host.counter['requests'], host.counter['throttled'],
+                    host.counter['errors'], host.counter['retries'], host.window,
+                    host.in_flight, host.latency,
+                    host.counter['requests'] / max(now - host.started, 1e-9))
+                for key, host in self._hosts.items()}
+
+
+def parse_retry_after(value: typing.Optional[str]) -> typing.Optional[float]:
+    """
+    The seconds to wait of a Retry-After header (in seconds or an HTTP date).
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(date.timestamp() - time.time(), 0.)
@@ -0,0 +1,349 @@
+"""
+Memory-mapped jsonl reader
+
+The jsonl file is scanned once: lines are yielded as bytes
+straight from the memory-mapped file (the json decoders take bytes
+as input) and the progress is reported as the byte position,
+so no line counting pass is needed.
+
+`sample_lines` samples the lines of a file by seeking to random offsets,
+without reading the file through.
+
+`ValueReader` reads the files of concatenated json values
+(not necessarily one per line) or of a single huge json array,
+one value at a time with a bounded buffer.
+"""
+import codecs
+import json
+import mmap
+import os
+import random
+import re
+import typing
+
+__all__ = ['iter_lines', 'sample_lines', 'split_byte_ranges', 'ValueReader']
+
+
+def iter_lines(path: str, start: int = 0, end: typing.Optional[int] = None,
+               progress=None, progress_step: int = 1 << 20) -> typing.Iterator[bytes]:
+    """
+    Yield the non-empty lines starting within the byte range [start, end) of a file.
+
+    Args:
+        - path: path to the (jsonl) file
+        - start: the beginning byte of the range (should be the beginning of a line)
+        - end: the ending byte of the range (the end of the file if not provided)
+        - progress: a tqdm-like object whose `update` takes the number of bytes read
+        - progress_step: number of bytes read between two progress updates
+    """
+    size = os.path.getsize(path)
+    if end is None or end > size:
+        end = size
+    if start >= end:
+        return
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            mm.seek(start)
+            readline = mm.readline
+            position = start
+            reported = start
+            while position < end:
+                line = readline()
+                position += len(line)
+                if not line.isspace():
+                    yield line
+                if progress is not None and position - reported >= progress_step:
+                    progress.update(min(position, end) - reported)
+                    reported = position
+            if progress is not None and end > reported:
+                progress.update(end - reported)
+
+
+def sample_lines(path: str, sample_size: int, rng: typing.Optional[random.Random] = None,
+                 start: int = 0, end: typing.Optional[int] = None) -> typing.Iterator[bytes]:
+    """
+    Sample (at most) `sample_size` lines of a file, stratified by offset:
+    the byte range [start, end) is split into `sample_size` strata of equal size,
+    and the first line beginning at or after a random offset of each stratum is read.
+    Only `sample_size` seeks are done, no matter how large the file is.
+
+    NOTE: a line is picked with a probability proportional to the length of
+    the previous line, and the lines spanning several strata are read once.
+    """
+    assert sample_size > 0
+    rng = rng or random.Random()
+    size = os.path.getsize(path)
+    if end is None or end > size:
+        end = size
+    if start >= end:
+        return
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            last = -1
+            for i in range(sample_size):
+                low = start + (end - start) * i // sample_size
+                high = start + (end - start) * (i + 1) // sample_size
+                if high <= low:
+                    continue
+                offset = rng.randrange(low, high)
+                if offset == start:
+                    line_start = start
+                else:
+                    line_break = mm.find(b'\n', offset - 1, end)
+                    if line_break < 0:
+                        break
+                    line_start = line_break + 1
+                if line_start >= end or line_start <= last:
+                    continue
+                last = line_start
+                mm.seek(line_start)
+                line = mm.readline()
+                if not line.isspace():
+                    yield line
+
+
+def split_byte_ranges(
+        path: str, split_count: int, start: int = 0,
+        end: typing.Optional[int] = None) -> typing.List[typing.Tuple[int, int]]:
+    """
+    Split a (jsonl) file, or its byte range [start, end), into (at most)
+    `split_count` byte ranges of similar sizes, aligned to the beginning of lines.
+    (Only a line break near each evenly spaced offset is searched,
+    no matter how large the file is. `start` should be the beginning of a line.)
+    """
+    if end is None:
+        end = os.path.getsize(path)
+    size = end - start
+    if size <= 0:
+        return []
+    offsets = [start]
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for i in range(1, split_count):
+                target = start + size * i // split_count
+                if target <= offsets[-1]:
+                    continue
+                # the first line beginning at or after the target
+                line_break = mm.find(b'\n', target - 1, end)
+                if line_break < 0 or line_break + 1 >= end:
+                    break
+                offsets.append(line_break + 1)
+    offsets.append(end)
+    return list(zip(offsets[:-1], offsets[1:]))
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_BYTES_WHITESPACE = re.compile(rb'[ \t\n\r]*')
+# NOTE: likely beginnings of a container value in the middle of a file
+_ARRAY_BOUNDARY = re.compile(rb'[}\]][ \t\n\r]*,[ \t\n\r]*([{\[])')
+_STREAM_BOUNDARY = re.compile(rb'[}\]][ \t\n\r]*([{\[])')
+# and of a value of any type (for the files of scalars): the beginning
+# of a value right after the end of another one (`}`, `]`, `"`, a digit, or
+# the last letter of true, false or null). In a stream, two scalars are
+# separated by whitespace (so that a value is never guessed in a number).
+_SCALAR_ARRAY_BOUNDARY = re.compile(rb'[}\]"0-9el][ \t\n\r]*,[ \t\n\r]*([-0-9"tfn{\[])')
+_SCALAR_STREAM_BOUNDARY = re.compile(rb'(?:[}\]][ \t\n\r]*|["0-9el][ \t\n\r]+)([-0-9"tfn{\[])')
+_LOOKBEHIND = 64
+# the characters which may continue a number
+_NUMBER_TAIL = re.compile(r'[0-9.eE+\-]*')
+
+
+def _match_end(pattern, text, position=0) -> int:
+    # NOTE: the patterns always match (possibly empty)
+    return pattern.match(text, position).end()
+
+
+class ValueReader:
+    """
+    Iterate over the (decoded) json values of a file of concatenated
+    json values, or over the elements of a file of a top-level json array,
+    which begin within the byte range [start, end).
+
+    Only a chunk of the file (plus the value being decoded)
+    is held in memory at a time.
+
+    Args:
+        - path: path to the json file
+        - start: the beginning byte of the range
+        - end: the ending byte of the range (the end of the file if not provided)
+        - array: read the elements of a top-level array instead of concatenated values
+        - aligned: whether `start` is the beginning of the file or of a value.
+            Otherwise, reading begins at the first likely beginning of
+            a value at or after `start` (which should be verified against `stop`
+            of the reader of the previous range, see `JsonlInferenceEngine`).
+        - progress: a tqdm-like object whose `update` takes the number of bytes read
+        - progress_step: number of bytes read between two progress updates
+        - chunk_size: number of bytes decoded at a time
+    Attributes (available after the iteration):
+        - begin: the byte where the first value begins (None if no value is found)
+        - stop: the byte where reading stops (the beginning of
+            the first value not read, or the end of the file)
+    """
+
+    def __init__(self, path: str, start: int = 0, end: typing.Optional[int] = None,
+                 array: bool = False, aligned: bool = True, progress=None,
+                 progress_step: int = 1 << 20, chunk_size: int = 1 << 20):
+        self._path = path
+        self._size = os.path.getsize(path)
+        self._start = start
+        self._end = self._size if end is None or end > self._size else end
+        self._array = array
+        self._aligned = aligned
+        self._progress = progress
+        self._progress_step = progress_step
+        self._chunk_size = chunk_size
+        self.begin: typing.Optional[int] = None
+        self.stop: int = start
+
+    def __iter__(self) -> typing.Iterator[typing.Any]:
+        if self._start >= self._end:
+            return
+        with open(self._path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if self._aligned:
+                    yield from self._read(mm, self._start)
+                else:
+                    position = self._guess(mm)
+                    if position is not None:
+                        yield from self._read(mm, position)
+
+    def _guess(self, mm: mmap.mmap) -> typing.Optional[int]:
+        """
+        Find the first likely beginning of a value within the range:
+        a candidate is skipped if a value cannot be decoded from it
+        (within a chunk), or if it is followed by what cannot follow
+        a value of the array / stream (e.g. the `:` after a key of an object).
+        Only the containers are candidates, unless the first value of the
+        file is a scalar.
+        """
+        first = _match_end(_BYTES_WHITESPACE, mm)
+        if self._array and mm[first:first + 1] == b'[':
+            first = _match_end(_BYTES_WHITESPACE, mm, first + 1)
+        if mm[first:first + 1] in (b'{', b'['):
+            boundary = self._array and _ARRAY_BOUNDARY or _STREAM_BOUNDARY
+        else:
+            boundary = self._array and _SCALAR_ARRAY_BOUNDARY or _SCALAR_STREAM_BOUNDARY
+        raw_decode = json.JSONDecoder().raw_decode
+        # NOTE: the end of the previous value (of a value beginning right at
+        # `start`) is searched for a little before the range
+        position = max(self._start - _LOOKBEHIND, 0)
+        while True:
+            match = boundary.search(mm, position, self._end)
+            if match is None:
+                return None
+            position = match.start(1)
+            if position < self._start:
+                position += 1
+                continue
+            window = mm[position:position + self._chunk_size].decode(
+                'utf-8', errors='replace')
+            try:
+                _, end = raw_decode(window)
+            except json.JSONDecodeError as e:
+                # NOTE: the value may just be longer than the window
+                if e.pos < len(window) - 1:
+                    position += 1
+                    continue
+            else:
+                end = _match_end(_WHITESPACE, window, end)
+                follower = window[end:end + 1]
+                if (self._array and follower not in ('', ',', ']') or
+                        not self._array and follower in (':', ',', ']', '}')):
+                    position += 1
+                    continue
+            return position
+
+    def _read(self, mm: mmap.mmap, position: int) -> typing.Iterator[typing.Any]:
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        raw_decode = json.JSONDecoder().raw_decode
+        # the decoded text of the bytes [position, read_position) of the file
+        text = ''
+        is_ascii = True
+        index = 0  # the character of the text at the byte `position`
+        read_position = position
+        reported = position
+        expect_value = self._array
+
+        def fill(min_size=0):
+            # drop the text before `index` and decode one more chunk
+            nonlocal text, is_ascii, index, read_position
+            size = max(self._chunk_size, min_size)
+            chunk = mm[read_position:read_position + size]
+            read_position += len(chunk)
+            text = text[index:] + decoder.decode(chunk, final=not chunk)
+            is_ascii = text.isascii()
+            index = 0
+            return bool(chunk)
+
+        def advance(new_index):
+            # move `index` (and the byte `position`) to `new_index`
+            nonlocal index, position, reported
+            if is_ascii:
+                position += new_index - index
+            else:
+                position += len(text[index:new_index].encode('utf-8'))
+            index = new_index
+            if self._progress is not None and position - reported >= self._progress_step:
+                self._progress.update(min(position, self._end) - reported)
+                reported = position
+
+        def skip_whitespace():
+            # return the next non-whitespace character ('' at the end of the file)
+            while True:
+                advance(_WHITESPACE.match(text, index).end())
+                if index < len(text):
+                    return text[index]
+                if not fill():
+                    return ''
+
+        try:
+            if self._array and self._aligned and position == 0:
+                if skip_whitespace() != '[':
+                    raise json.JSONDecodeError('Expecting a json array', text, index)
+                advance(index + 1)
+                if skip_whitespace() == ']':
+                    position = self._size
+                    return
+            while True:
+                char = skip_whitespace()
+                if not char:
+                    if expect_value:
+                        raise json.JSONDecodeError('Expecting value', text, index)
+                    position = self._size
+                    return
+                if self._array and not expect_value:
+                    if char == ']':
+                        position = self._size
+                        return
+                    if char != ',':
+                        raise json.JSONDecodeError("Expecting ',' delimiter", text, index)
+                    advance(index + 1)
+                    expect_value = True
+                    continue
+                if position >= self._end:
+                    return
+                while True:
+                    try:
+                        value, value_end = raw_decode(text, index)
+                    except json.JSONDecodeError:
+                        # the value may continue in the next chunk
+                        if fill(len(text)):
+                            continue
+                        raise
+                    # NOTE: a number reaching the end of the text may be incomplete
+                    # (as well as a number followed by a partial fraction or exponent, e.g. `12.`)
+                    if (value_end == len(text) or
+                            type(value) in (int, float) and
+                            _match_end(_NUMBER_TAIL, text, value_end) == len(text)) and \
+                            fill(len(text)):
+                        continue
+                    break
+                if self.begin is None:
+                    self.begin = position
+                advance(value_end)
+                expect_value = False
+                yield value
+        finally:
+            self.stop = position
+            if self._progress is not None and self._end > reported:
+                self._progress.update(self._end - reported)
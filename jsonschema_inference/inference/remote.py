@@ -1,16 +1,16 @@
 import execnet
 import inspect
 from functools import wraps
-exec('from ..schema.objs import *')
-exec('from collections import Counter')
+from ..schema.serialization import loads
 
 
 def build_remote(gw, function, engine='pypy'):
     func_name = function.__name__
     consumer_str = f"""
 {inspect.getsource(function)}
+from jsonschema_inference.schema.serialization import dumps
 args, kwargs = channel.receive()
-channel.send(repr({func_name}(*args, **kwargs)))
+channel.send(dumps({func_name}(*args, **kwargs)))
 """
     consumer_str = consumer_str.replace(f'@{engine}', '')
     channel = gw.remote_exec(consumer_str)
@@ -21,7 +21,7 @@ def wrap(func, channel):
     @wraps(func)
     def wrapped_func(*args, **kwargs):
         channel.send((args, kwargs))
-        return eval(channel.receive())
+        return loads(channel.receive())
     return wrapped_func
 
 
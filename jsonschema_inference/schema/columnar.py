@@ -0,0 +1,115 @@
+"""
+Columnar fitting of batches of regular records
+
+A batch of records with the same keys is fitted column by column:
+the values of each key are gathered across the batch at once
+(`operator.itemgetter` and `zip`), and the value types of a column of
+scalars are collected in a single pass (`map(type, column)`), without
+building a schema object per value. Only the columns of records or
+arrays are fitted recursively, as sub-batches.
+
+The schema is the same as `shape.fit_batch`, since the merge of records
+with the same keys is field-wise, and the union of the scalar types of a
+field only depends on the order of their first occurrences (kept by
+`dict.fromkeys`). Where the merge depends on more than that (records with
+different keys giving DynamicRecords, fields mixing scalars and containers,
+records unified into UniformRecords), the batch is irregular and
+`fit_columnar` gives None, so that the batch is fitted document by document.
+"""
+import itertools
+import operator
+import typing
+from ..config import config
+from .fitter import fit_scalar_types, sample_array, hold_sampling_stats, add_sampling_stats
+from .objs import JsonSchema, Unknown, Array, Record
+
+__all__ = ['fit_columnar']
+
+
+class _Irregular(Exception):
+    pass
+
+
+def fit_columnar(json_batch: typing.List[typing.Any]) -> typing.Optional[JsonSchema]:
+    """
+    Fit a batch of records with the same keys column by column.
+    (Batches of arrays or scalars are fitted alike.)
+    Returns None if the batch is empty or irregular.
+    """
+    if not json_batch:
+        return None
+    # NOTE: the arrays sampled are only counted if the batch is regular
+    # (otherwise they are counted as the batch is fitted document by document)
+    with hold_sampling_stats() as held:
+        try:
+            schema = _fit_column(json_batch)
+        except _Irregular:
+            return None
+    add_sampling_stats(held)
+    return schema
+
+
+def _fit_column(values: typing.Sequence[typing.Any],
+                types: typing.Optional[typing.Dict[type, None]] = None) -> JsonSchema:
+    """
+    Fit the values of a column (or the elements of arrays) at once.
+    (`types` are the types of the values in the order of their first occurrences.)
+    """
+    if types is None:
+        types = dict.fromkeys(map(type, values))
+    if dict in types:
+        if len(types) > 1:
+            raise _Irregular
+        return _fit_records(values)
+    elif list in types:
+        if len(types) > 1:
+            raise _Irregular
+        return Array(_fit_arrays(values))
+    return fit_scalar_types(types)
+
+
+def _fit_arrays(arrays: typing.Sequence[list]) -> JsonSchema:
+    """
+    Fit the merged content of a column of arrays.
+
+    NOTE: the content of each array is merged first, then the contents are
+    merged, which may differ from merging all the elements in a row
+    (e.g., `int | Optional(str)` is not `int | str | None`).
+    """
+    if config.array_sample_size:
+        arrays = list(map(sample_array, arrays))
+    element_types = dict.fromkeys(map(type, itertools.chain.from_iterable(arrays)))
+    result: JsonSchema = Unknown()
+    if dict in element_types or list in element_types:
+        for array in arrays:
+            if array:
+                result |= _fit_column(array)
+    else:
+        # arrays of scalars: only the distinct sequences of first occurrences matter
+        for types in dict.fromkeys(tuple(dict.fromkeys(map(type, array))) for array in arrays):
+            result |= fit_scalar_types(types)
+    return result
+
+
+def _fit_records(records: typing.Sequence[dict]) -> JsonSchema:
+    first_keys = records[0].keys()
+    for record in records:
+        if record.keys() != first_keys:
+            raise _Irregular
+    if not first_keys:
+        return Record({})
+    keys = list(first_keys)
+    columns: typing.List[typing.Sequence]
+    if len(keys) == 1:
+        columns = [list(map(operator.itemgetter(keys[0]), records))]
+    else:
+        columns = list(zip(*map(operator.itemgetter(*keys), records)))
+    column_types = [dict.fromkeys(map(type, column)) for column in columns]
+    if config.unify_records:
+        # NOTE: these records would be unified into UniformRecords one by one
+        # (checked before fitting the columns, so no nested column is fitted in vain)
+        if all(dict in types for types in column_types) or \
+                all(list in types for types in column_types):
+            raise _Irregular
+    return Record({key: _fit_column(column, types)
+                   for key, column, types in zip(keys, columns, column_types)})
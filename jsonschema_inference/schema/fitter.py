@@ -1,7 +1,16 @@
+import contextlib
+import threading
+import typing
+from collections import namedtuple
 from ..config import config
-from .objs import Record, Array, Atomic
+from .objs import JsonSchema, Record, Array, Atomic, Unknown
 from .inference.reduce import reduce_schema
 
+SamplingStats = namedtuple('SamplingStats', ['arrays', 'elements', 'sampled'])
+
+_NONE_TYPE = type(None)
+_CONTAINERS = (dict, list)
+
 
 def fit(data):
     if isinstance(data, dict):
@@ -14,7 +23,7 @@ def fit(data):
         if config.unify_records:
             schema = try_unify_dict(schema)
     elif isinstance(data, list):
-        schema = Array(reduce_schema([fit(e) for e in data]))
+        schema = Array(fit_elements(data))
     elif data is None:
         schema = Atomic(None)
     else:
@@ -22,7 +31,124 @@ def fit(data):
     return schema
 
 
+def fit_elements(data: list) -> JsonSchema:
+    """
+    Fit the merged schema of the elements of an array.
+
+    The types of the elements are collected in one pass, and an array of
+    scalars is fitted from its distinct types (in the order of their first
+    occurrences, as merging the same scalar type again changes nothing),
+    without a schema object per element. Only the arrays containing
+    records or arrays are fitted element by element.
+    """
+    data = sample_array(data)
+    types = dict.fromkeys(map(type, data))
+    if any(issubclass(element_type, _CONTAINERS) for element_type in types):
+        return reduce_schema(fit(e) for e in data)
+    return fit_scalar_types(types)
+
+
+def fit_scalar_types(types: typing.Iterable[type]) -> JsonSchema:
+    """
+    Merge the schemas of scalars of `types` (in order).
+    """
+    result: JsonSchema = Unknown()
+    for value_type in types:
+        result |= Atomic(None if value_type is _NONE_TYPE else value_type)
+    return result
+
+
+class _SamplingCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def add(self, elements: int, sampled: int, arrays: int = 1):
+        held = getattr(self._local, 'held', None)
+        if held is not None:
+            held[0] += arrays
+            held[1] += elements
+            held[2] += sampled
+            return
+        with self._lock:
+            self._arrays += arrays
+            self._elements += elements
+            self._sampled += sampled
+
+    def reset(self):
+        with self._lock:
+            self._arrays = 0
+            self._elements = 0
+            self._sampled = 0
+
+    def stats(self) -> SamplingStats:
+        return SamplingStats(self._arrays, self._elements, self._sampled)
+
+    @contextlib.contextmanager
+    def hold(self):
+        previous = getattr(self._local, 'held', None)
+        held = self._local.held = [0, 0, 0]
+        try:
+            yield held
+        finally:
+            self._local.held = previous
+
+
+_sampling_counter = _SamplingCounter()
+
+
+def sample_array(data: list) -> list:
+    """
+    Sample the elements of an array longer than `config.array_sample_size`
+    (evenly spaced, from the first one), counting it in `sampling_stats`.
+    """
+    sample_size = config.array_sample_size
+    if not sample_size or len(data) <= sample_size:
+        return data
+    sample = data[::-(-len(data) // sample_size)]
+    _sampling_counter.add(len(data), len(sample))
+    return sample
+
+
+def sampling_stats() -> SamplingStats:
+    """
+    Statistics of the arrays sampled (in this process) since the last reset:
+        - arrays: number of arrays sampled
+        - elements: number of elements of these arrays
+        - sampled: number of elements fitted
+    """
+    return _sampling_counter.stats()
+
+
+def reset_sampling_stats():
+    _sampling_counter.reset()
+
+
+def hold_sampling_stats():
+    """
+    Hold the arrays sampled within the context (in this thread) instead of
+    counting them in `sampling_stats`. The context gives the held
+    [arrays, elements, sampled], counted by `add_sampling_stats` if kept.
+    (e.g. a document is counted once, by its fingerprint, not again when fitted.)
+    """
+    return _sampling_counter.hold()
+
+
+def add_sampling_stats(held: typing.Sequence[int]):
+    arrays, elements, sampled = held
+    if arrays:
+        _sampling_counter.add(elements, sampled, arrays=arrays)
+
+
 def try_unify_dict(dict_schema):
+    values = dict_schema._content.values()
+    if not values:
+        return dict_schema
+    # only Records or Arrays can be unified into a Record or an Array
+    if not (all(isinstance(v, Record) for v in values) or
+            all(isinstance(v, Array) for v in values)):
+        return dict_schema
     uni_dict = dict_schema.to_uniform_dict()
     if isinstance(uni_dict._content, Record) or isinstance(
             uni_dict._content, Array):
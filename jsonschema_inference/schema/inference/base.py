@@ -1,31 +1,119 @@
 """
 A basic json schema inference engine
 """
+import functools
+import random
 import typing
-from ..fitter import fit
-from ..objs import JsonSchema
+from ...config import config
+from ..columnar import fit_columnar
+from ..objs import JsonSchema, Unknown
+from ..profiling import profile_merges
+from ..shape import fit_batch
 from .reduce import reduce_schema
+from .sampling import reservoir_sample, signature
 
 
 __all__ = ['InferenceEngine']
 
 
 class InferenceEngine:
-    def __init__(self, batch_size=100):
+    """
+    Args:
+        - batch_size: number of jsons inferenced as a batch.
+        - reduce_strategy: strategy reducing the schemas of the batches
+            ('fold', 'tree' or 'dedupe'. See `reduce_schema`)
+        - converge_after: stop once the reduced schema has not changed
+            (apart from the DynamicRecord key counters) for this number of batches in a row
+            (the schemas of the batches are folded. Never stop early if not provided)
+        - sample_size: only inference a uniform sample of this number of jsons
+            (reservoir sampling. All the jsons if not provided)
+        - seed: the random seed of the sampling
+        - metrics: an `inference.metrics.Metrics` recording the jsons inferenced
+            and the time spent fitting and reducing them (`fit` and `reduce`)
+
+    After `get_schema_iteratively`, `documents_seen` is the number of jsons
+    inferenced and `converged` tells whether it stopped early.
+    With `config.profile` on, `profile` is the report of the merges of the run
+    (see `schema.profiling.MergeProfile.report`).
+    """
+
+    def __init__(self, batch_size=100, reduce_strategy='fold', converge_after=None,
+                 sample_size=None, seed=None, metrics=None):
         self._batch_size = batch_size
+        self._reduce_strategy = reduce_strategy
+        assert converge_after is None or converge_after > 0
+        self._converge_after = converge_after
+        assert sample_size is None or sample_size > 0
+        self._sample_size = sample_size
+        self._seed = seed
+        self._metrics = metrics
+        self.documents_seen = 0
+        self.converged = False
+        self.profile: typing.Optional[dict] = None
 
     def get_schema_iteratively(self, json_pipe: typing.Iterable[typing.Any]):
+        if not config.profile:
+            return self._get_schema_iteratively(json_pipe)
+        with profile_merges(config.profile_slowest, config.profile_dump) as profile:
+            try:
+                return self._get_schema_iteratively(json_pipe)
+            finally:
+                self.profile = profile.report()
+
+    def _get_schema_iteratively(self, json_pipe: typing.Iterable[typing.Any]):
+        self.documents_seen = 0
+        self.converged = False
+        if self._sample_size is not None:
+            json_pipe = reservoir_sample(
+                json_pipe, self._sample_size, random.Random(self._seed))
         batch_pipe = InferenceEngine._batchwise_generator(
             json_pipe, batch_size=self._batch_size)
-        schema_pipe = map(
-            lambda batch: InferenceEngine.get_schema(batch),
-            batch_pipe)
-        return reduce_schema(schema_pipe)
+        schema_pipe = map(self._get_schema_counted, batch_pipe)
+        if self._converge_after is not None:
+            reduce = self._reduce_until_converged
+        else:
+            reduce = functools.partial(reduce_schema, strategy=self._reduce_strategy)
+        if self._metrics is not None:
+            return self._metrics.consume(reduce, schema_pipe, 'reduce')
+        return reduce(schema_pipe)
+
+    def _get_schema_counted(self, json_batch: typing.List[typing.Any]) -> JsonSchema:
+        self.documents_seen += len(json_batch)
+        if self._metrics is not None:
+            self._metrics.add('jsons', len(json_batch))
+            with self._metrics.timer('fit'):
+                return InferenceEngine.get_schema(json_batch)
+        return InferenceEngine.get_schema(json_batch)
+
+    def _reduce_until_converged(self, schema_pipe: typing.Iterable[JsonSchema]) -> JsonSchema:
+        result: JsonSchema = Unknown()
+        last_signature = signature(result)
+        unchanged = 0
+        for schema in schema_pipe:
+            result = result.merge_into(schema)
+            current_signature = signature(result)
+            if current_signature == last_signature:
+                unchanged += 1
+                if unchanged >= self._converge_after:
+                    self.converged = True
+                    break
+            else:
+                unchanged = 0
+                last_signature = current_signature
+        return result
 
     @staticmethod
     def get_schema(json_batch: typing.List[typing.Any]) -> JsonSchema:
-        return reduce_schema(
-            map(fit, json_batch))
+        """
+        Infer the json schema of a batch of jsons.
+        (A batch of regular records is fitted column by column (see `schema.columnar`),
+        otherwise each distinct json shape in the batch is fitted only once.)
+        """
+        if config.columnar:
+            schema = fit_columnar(json_batch)
+            if schema is not None:
+                return schema
+        return fit_batch(json_batch)
 
     @staticmethod
     def _batchwise_generator(gen, batch_size=100):
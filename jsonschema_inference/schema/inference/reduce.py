@@ -1,12 +1,98 @@
 import typing
-from functools import reduce
 from ..objs.basic import JsonSchema
 from ..objs.basic import Unknown
 
 
-def reduce_schema(json_schemas: typing.Iterable[JsonSchema]) -> JsonSchema:
-    if json_schemas:
-        result = reduce(lambda a, b: a | b, json_schemas)
+__all__ = ['reduce_schema', 'merge_repeatedly', 'STRATEGIES']
+
+STRATEGIES = ('fold', 'tree', 'dedupe')
+
+
+def reduce_schema(json_schemas: typing.Iterable[JsonSchema],
+                  strategy: str = 'fold') -> JsonSchema:
+    """
+    Reduce json schemas into one union json schema.
+
+    Args:
+        - json_schemas: an iterable (list or generator) of json schemas
+        - strategy:
+            - fold: stream the schemas into an accumulator with `merge_into` (left fold),
+                updated in place (see `objs.accumulator`).
+            - tree: merge the schemas pairwise as a balanced tree, keeping
+                at most log2(n) partial schemas in memory.
+            - dedupe: count the equal schemas first and merge each distinct
+                schema once with its multiplicity.
+    NOTE: the merge is sensitive to the order of the schemas
+    (e.g., DynamicRecord key counts), so the strategies may give slightly
+    different results on heterogeneous schemas.
+    """
+    assert strategy in STRATEGIES, f'strategy should be one of {STRATEGIES}'
+    if strategy == 'tree':
+        return _tree_reduce(json_schemas)
+    elif strategy == 'dedupe':
+        return _dedupe_reduce(json_schemas)
     else:
-        result = Unknown()
+        return _fold_reduce(json_schemas)
+
+
+def _fold_reduce(json_schemas: typing.Iterable[JsonSchema]) -> JsonSchema:
+    # NOTE: imported here, as the records import this module
+    from ..objs.accumulator import Accumulator
+    accumulator = Accumulator()
+    for schema in json_schemas:
+        accumulator.merge(schema)
+    return accumulator.schema()
+
+
+def _tree_reduce(json_schemas: typing.Iterable[JsonSchema]) -> JsonSchema:
+    # stack of (level, schema) where a schema of level k is
+    # merged from 2**k input schemas.
+    stack: typing.List[typing.Tuple[int, JsonSchema]] = []
+    for schema in json_schemas:
+        level = 0
+        while stack and stack[-1][0] == level:
+            _, left = stack.pop()
+            schema = left.merge_into(schema)
+            level += 1
+        stack.append((level, schema))
+    result: JsonSchema = Unknown()
+    for _, schema in reversed(stack):
+        result = schema.merge_into(result)
     return result
+
+
+def _dedupe_reduce(json_schemas: typing.Iterable[JsonSchema]) -> JsonSchema:
+    from ..objs.accumulator import Accumulator
+    # NOTE: schemas are interned, so equal schemas are counted together.
+    counts: typing.Dict[JsonSchema, int] = dict()
+    for schema in json_schemas:
+        counts[schema] = counts.get(schema, 0) + 1
+    accumulator = Accumulator()
+    for schema, count in counts.items():
+        accumulator.merge(schema, count)
+    return accumulator.schema()
+
+
+def merge_repeatedly(acc: JsonSchema, schema: JsonSchema,
+                     times: int) -> JsonSchema:
+    """
+    Merge `schema` into `acc` for `times` times in a row.
+
+    Apart from the DynamicRecord key counters, which grow
+    linearly, merging the same schema again changes nothing after
+    the first merge. Hence, only two merges are done and the
+    counters are extrapolated.
+    """
+    if times < 1:
+        return acc
+    first = acc.merge_into(schema)
+    if times == 1:
+        return first
+    second = first.merge_into(schema)
+    try:
+        return first._extrapolate(second, times - 1)
+    except ValueError:
+        result = second
+        for _ in range(times - 2):
+            result = result.merge_into(schema)
+        return result
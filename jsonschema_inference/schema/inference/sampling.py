@@ -0,0 +1,66 @@
+"""
+Sampling and convergence of the inference
+
+- `reservoir_sample`: a uniform sample of a stream of unknown length,
+    in a single pass (Algorithm L: the skipped items are consumed in bulk).
+- `signature`: a hash of the structure of a json schema, ignoring the
+    DynamicRecord key counters (which change with every merge), so that
+    the schema reduced so far can be checked for convergence in O(1)
+    per batch (the signatures of the interned sub-schemas are memoized).
+"""
+import collections
+import itertools
+import math
+import random
+import typing
+import weakref
+from ..objs import JsonSchema, Record, Union, Array, UniformRecord
+
+__all__ = ['reservoir_sample', 'signature']
+
+
+def reservoir_sample(iterable: typing.Iterable, sample_size: int,
+                     rng: typing.Optional[random.Random] = None) -> list:
+    """
+    Sample `sample_size` items of `iterable` uniformly (all of them if fewer).
+    """
+    assert sample_size > 0
+    rng = rng or random.Random()
+    items = iter(iterable)
+    reservoir = list(itertools.islice(items, sample_size))
+    if len(reservoir) < sample_size:
+        return reservoir
+    # NOTE: 1 - random() is in (0, 1], so that its log is defined
+    w = math.exp(math.log(1. - rng.random()) / sample_size)
+    while True:
+        skip = math.floor(math.log(1. - rng.random()) / math.log(1. - w)) if w < 1. else 0
+        collections.deque(itertools.islice(items, skip), maxlen=0)
+        item = next(items, _END)
+        if item is _END:
+            return reservoir
+        reservoir[rng.randrange(sample_size)] = item
+        w *= math.exp(math.log(1. - rng.random()) / sample_size)
+
+
+_END = object()
+_signatures: 'weakref.WeakKeyDictionary[JsonSchema, int]' = weakref.WeakKeyDictionary()
+
+
+def signature(schema: JsonSchema) -> int:
+    """
+    Hash the structure of a json schema (without the DynamicRecord key counters).
+    """
+    result = _signatures.get(schema)
+    if result is None:
+        cls = type(schema)
+        if isinstance(schema, Record):
+            result = hash((cls, frozenset(
+                (key, signature(value)) for key, value in schema._content.items())))
+        elif isinstance(schema, Union):
+            result = hash((cls, frozenset(map(signature, schema._content))))
+        elif isinstance(schema, (Array, UniformRecord)):
+            result = hash((cls, signature(schema._content)))
+        else:
+            result = hash((cls, schema._content))
+        _signatures[schema] = result
+    return result
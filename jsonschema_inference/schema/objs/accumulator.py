@@ -0,0 +1,232 @@
+"""
+Mutable Accumulator of Json Schema Merges
+
+As json schemas are immutable and interned, `acc = acc.merge_into(schema)`
+builds and interns a new accumulator on every merge: the fields (and the
+key counter) of each record merged into are copied, and hashed again
+for the intern key. When a fold keeps merging documents of new keys into a
+DynamicRecord, each merge costs as much as the whole accumulator.
+
+`Accumulator` keeps the records (and the arrays, uniform records and optionals
+around them) merged into as mutable nodes, updated in place, and interns
+them once, when the schema is read with `schema()`. The result is the
+same as that of the fold with `merge_into`.
+"""
+import typing
+from collections import Counter
+from ...config import config
+from ..inference.reduce import merge_repeatedly
+from .basic import JsonSchema, Optional, Unknown
+from .records import Record, DynamicRecord, UniformRecord
+from .array import Array
+
+__all__ = ['Accumulator']
+
+
+class _RecordNode:
+    """
+    Mutable Record (`key_counter` is None) or DynamicRecord.
+    (`origin` is the interned schema of the node, None once changed.)
+    """
+    __slots__ = ('content', 'key_counter', 'origin')
+
+    def __init__(self, content: dict, key_counter: typing.Optional[Counter],
+                 origin: typing.Optional[JsonSchema]):
+        self.content = content
+        self.key_counter = key_counter
+        self.origin = origin
+
+
+class _WrapperNode:
+    """
+    Mutable Array, UniformRecord or Optional of `content`.
+    """
+    __slots__ = ('cls', 'content', 'origin')
+
+    def __init__(self, cls: type, content, origin: typing.Optional[JsonSchema]):
+        self.cls = cls
+        self.content = content
+        self.origin = origin
+
+
+_Node = typing.Union[JsonSchema, _RecordNode, _WrapperNode]
+
+
+def _thaw(schema: JsonSchema) -> _Node:
+    """
+    A mutable node of `schema` (its sub-schemas are thawed when merged into).
+    """
+    cls = type(schema)
+    if cls is Record:
+        return _RecordNode(dict(schema._content), None, schema)
+    elif cls is DynamicRecord:
+        return _RecordNode(dict(schema._content),
+                           Counter(typing.cast(DynamicRecord, schema)._key_counter), schema)
+    elif cls is Optional:
+        return _WrapperNode(Optional, typing.cast(Optional, schema)._the_content, schema)
+    elif cls is Array or cls is UniformRecord:
+        return _WrapperNode(cls, schema._content, schema)
+    else:
+        return schema
+
+
+def _freeze(node: _Node) -> JsonSchema:
+    """
+    The interned schema of `node`.
+    (The node should not be used after, as the schema may share its key counter.)
+    """
+    if isinstance(node, JsonSchema):
+        return node
+    elif node.origin is not None:
+        return node.origin
+    elif isinstance(node, _RecordNode):
+        content = {key: _freeze(value) for key, value in node.content.items()}
+        if node.key_counter is None:
+            return Record(content)
+        else:
+            return DynamicRecord(content, node.key_counter)
+    else:
+        return node.cls(_freeze(node.content))
+
+
+def _equals(node: _Node, schema: JsonSchema) -> bool:
+    """
+    Whether `node` would be frozen into `schema`.
+    """
+    if isinstance(node, JsonSchema):
+        return node is schema
+    elif node.origin is not None:
+        return node.origin is schema
+    elif isinstance(node, _RecordNode):
+        if node.key_counter is None:
+            if type(schema) is not Record:
+                return False
+        elif type(schema) is not DynamicRecord or \
+                node.key_counter != typing.cast(DynamicRecord, schema)._key_counter:
+            return False
+        return node.content.keys() == schema._content.keys() and all(
+            _equals(value, schema._content[key]) for key, value in node.content.items())
+    elif type(schema) is not node.cls:
+        return False
+    elif node.cls is Optional:
+        return _equals(node.content, typing.cast(Optional, schema)._the_content)
+    else:
+        return _equals(node.content, schema._content)
+
+
+def _merge(node: _Node, schema: JsonSchema) -> typing.Tuple[_Node, bool]:
+    """
+    Merge `schema` into `node`, in place where possible, and return the
+    merged node (as `_freeze(node) | schema` would be) and whether it changed.
+
+    The nodes left unchanged are returned frozen, so that merging
+    them with their own schema again costs nothing (as with `merge_into`).
+    """
+    if isinstance(node, JsonSchema):
+        if (node is schema and node._idempotent) or isinstance(schema, Unknown):
+            return node, False
+        thawed = _thaw(node)
+        if isinstance(thawed, JsonSchema):
+            result = node | schema
+            return result, result is not node
+        return _merge_node(thawed, schema)
+    elif (node.origin is schema and schema._idempotent) or isinstance(schema, Unknown):
+        return _freeze(node), False
+    else:
+        return _merge_node(node, schema)
+
+
+def _merge_node(node: typing.Union[_RecordNode, _WrapperNode],
+                schema: JsonSchema) -> typing.Tuple[_Node, bool]:
+    changed = None
+    if isinstance(node, _RecordNode):
+        if node.key_counter is None:
+            if type(schema) is Record:
+                if node.content.keys() == schema._content.keys():
+                    changed = _merge_fields(node, schema)
+                elif config.equivalence_mode == 'kind':
+                    node.key_counter = Counter(node.content.keys())
+                    node.key_counter.update(schema._content.keys())
+                    _merge_fields(node, schema)
+                    changed = True
+        elif isinstance(schema, DynamicRecord):
+            changed = _merge_fields(node, schema) or bool(schema._key_counter)
+            node.key_counter.update(schema._key_counter)
+        elif isinstance(schema, Record):
+            changed = _merge_fields(node, schema) or bool(schema._content)
+            node.key_counter.update(schema._content.keys())
+    elif node.cls is Optional:
+        if schema._content is None or _equals(node, schema) or _equals(node.content, schema):
+            changed = False
+        elif isinstance(schema, Optional):
+            node.content, changed = _merge(node.content, schema._the_content)
+        else:
+            node.content, changed = _merge(node.content, schema)
+    elif isinstance(schema, node.cls):
+        node.content, changed = _merge(node.content, schema._content)
+    if changed is None:
+        # NOTE: the merges changing the kind of the schema are left to the schemas
+        frozen = _freeze(node)
+        result = frozen | schema
+        return result, result is not frozen
+    elif changed:
+        node.origin = None
+        return node, True
+    else:
+        return _freeze(node), False
+
+
+def _merge_fields(node: _RecordNode, schema: Record) -> bool:
+    content = node.content
+    changed = False
+    for key, value in schema._content.items():
+        if key in content:
+            content[key], field_changed = _merge(content[key], value)
+            changed = changed or field_changed
+        else:
+            content[key] = value
+            changed = True
+    return changed
+
+
+class Accumulator:
+    """
+    Accumulator of json schemas merged in a row (a left fold of `merge_into`),
+    updated in place.
+
+    e.g.,
+    ```
+    accumulator = Accumulator()
+    for schema in schemas:
+        accumulator.merge(schema)
+    result = accumulator.schema()
+    ```
+    """
+    __slots__ = ('_node',)
+
+    # NOTE: merging the same schema again is cheap in place, so only
+    # longer runs are extrapolated (see `merge_repeatedly`).
+    EXTRAPOLATE_AFTER = 4
+    # NOTE: off while the merges are profiled, so that they go
+    # through the (instrumented) `__or__` methods (see `profiling`).
+    in_place = True
+
+    def __init__(self, schema: JsonSchema = Unknown()):
+        self._node: _Node = schema
+
+    def merge(self, schema: JsonSchema, times: int = 1):
+        """
+        Merge `schema` into the accumulator `times` times.
+        """
+        if times > Accumulator.EXTRAPOLATE_AFTER or not Accumulator.in_place:
+            self._node = merge_repeatedly(self.schema(), schema, times)
+        else:
+            for _ in range(times):
+                self._node, _ = _merge(self._node, schema)
+
+    def schema(self) -> JsonSchema:
+        """
+        The json schema merged so far.
+        """
+        self._node = _freeze(self._node)
+        return self._node
@@ -3,7 +3,6 @@ Array Json Schema Objects
 
 e.g., [1,2,3,'apple']
 """
-import copy
 from .basic import JsonSchema
 __all__ = [
     'Array'
@@ -11,6 +10,8 @@ __all__ = [
 
 
 class Array(JsonSchema):
+    __slots__ = ()
+
     def __init__(self, content: JsonSchema):
         super().__init__(content)
 
@@ -18,13 +19,16 @@ class Array(JsonSchema):
         assert isinstance(
             self._content, JsonSchema), 'Array content should be JsonSchema'
 
+    def _is_idempotent(self):
+        return self._content._idempotent
+
     def __repr__(self):
         return f'Array({self._content})'
 
     def __or__(self, e):
-        if isinstance(e, Array):
-            new = copy.deepcopy(e)
-            old = copy.deepcopy(self)
-            return Array(old._content | new._content)
+        if self is e and self._idempotent:
+            return self
+        elif isinstance(e, Array):
+            return Array(self._content | e._content)
         else:
             return self._base_or(e)
@@ -1,9 +1,17 @@
 """
 Basic Json Schema Objects
+
+NOTE:
+
+Json schemas are immutable and interned: constructing a schema
+structurally equal to an existing one returns the existing object.
+Hence, equality and hashing are those of the object identity,
+both O(1) no matter how large the schema is.
 """
 import abc
-import copy
+import threading
 import typing
+import weakref
 __all__ = [
     'Atomic',
     'Union',
@@ -12,51 +20,132 @@ __all__ = [
 ]
 
 
-class JsonSchema:
+_table: typing.Dict[typing.Hashable, weakref.KeyedRef] = dict()
+_lock = threading.RLock()
+
+
+def _remove(ref: weakref.KeyedRef):
+    with _lock:
+        if _table.get(ref.key) is ref:
+            del _table[ref.key]
+
+
+class _InternedSchema(type):
+    """
+    Metaclass interning json schemas by their `_intern_key`.
+    (The interned schemas are weakly referenced, so unused ones are dropped.)
+    """
+
+    def __call__(cls, *args):
+        key = cls._intern_key(*args)
+        ref = _table.get(key)
+        if ref is not None:
+            schema = ref()
+            if schema is not None:
+                return schema
+        with _lock:
+            ref = _table.get(key)
+            schema = ref() if ref is not None else None
+            if schema is None:
+                schema = type.__call__(cls, *args)
+                _table[key] = weakref.KeyedRef(schema, _remove, key)
+        return schema
+
+
+class JsonSchema(metaclass=_InternedSchema):
+    __slots__ = ('_content', '_idempotent', '__weakref__')
+
     def __init__(self, content=None):
         self._content = content
         self.check_content()
+        self._idempotent = self._is_idempotent()
+
+    @classmethod
+    def _intern_key(cls, *args) -> typing.Hashable:
+        return (cls,) + args
+
+    def _args(self) -> tuple:
+        """
+        The arguments constructing this schema.
+        """
+        return (self._content,)
 
     @abc.abstractmethod
     def check_content(self):
         raise NotImplementedError
 
-    def __eq__(self, e):
-        if isinstance(self, type(e)):
-            return self._content == e._content
-        else:
-            return False
+    def _is_idempotent(self) -> bool:
+        """
+        Whether merging this schema with itself gives itself.
+        (False when a DynamicRecord key counter would be increased.)
+        """
+        return True
+
+    def __reduce__(self):
+        # NOTE: pickled as a whole in the compact binary format (e.g. the schemas
+        # sent back by the workers), unless it has atoms the format does not support.
+        from ..serialization import dumps, loads
+        try:
+            return (loads, (dumps(self),))
+        except ValueError:
+            return (type(self), self._args())
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def __or__(self, e):
         return self._base_or(e)
 
+    def merge_into(self, e):
+        """
+        Merge `e` into this schema and return the merged schema.
+
+        As schemas are immutable, neither operand is copied or changed:
+        the result reuses the sub-schemas of both operands (and is this
+        schema itself when `e` adds nothing to it). `a |= b` is the
+        same as `a = a.merge_into(b)`.
+        (To merge many schemas in a row, `objs.accumulator.Accumulator`
+        merges them in place, and interns the result once.)
+        """
+        return self | e
+
+    def _extrapolate(self, second: 'JsonSchema', n: int) -> 'JsonSchema':
+        """
+        Given this schema, an accumulator merged with a schema once,
+        and `second`, the accumulator merged with it twice, build the
+        accumulator merged with it `n + 1` times.
+        (Only DynamicRecord key counters keep growing after the first merge.)
+
+        Raise ValueError if `second` is not a linear growth of this schema.
+        """
+        if self is second:
+            return self
+        elif type(self) is not type(second) or self._idempotent:
+            raise ValueError(f'{second} is not a repeated merge of {self}')
+        else:
+            return type(self)(self._content._extrapolate(second._content, n))
+
     def _base_or(self, e):
-        old = copy.deepcopy(self)
-        new = copy.deepcopy(e)
-        if old == new or isinstance(e, Unknown):
-            return old
+        if self is e or isinstance(e, Unknown):
+            return self
         else:
-            if old._content is None:
-                if new._content is None:
-                    return old
+            if self._content is None:
+                if e._content is None:
+                    return self
                 else:
-                    if isinstance(new, Optional):
-                        return new
+                    if isinstance(e, Optional):
+                        return e
                     else:
-                        return Optional(new)
-            elif new._content is None:
-                return Optional(old)
-            elif isinstance(new, Union):
-                new |= old
-                return new
+                        return Optional(e)
+            elif e._content is None:
+                return Optional(self)
+            elif isinstance(e, Union):
+                return e | self
             else:
-                return Union({old, new})
-
-    def _base_hash(self):
-        return hash(self._content)
-
-    def __hash__(self):
-        return self._base_hash()
+                return Union({self, e})
 
 
 class Atomic(JsonSchema):
@@ -64,6 +153,7 @@ class Atomic(JsonSchema):
     simple json units, such as `int`, `float`, `null`,
         `str`, etc.
     """
+    __slots__ = ()
 
     def __init__(self, content: typing.Union[type, None]):
         super().__init__(content)
@@ -80,6 +170,11 @@ class Atomic(JsonSchema):
 
 
 class Unknown(JsonSchema):
+    __slots__ = ()
+
+    def _args(self):
+        return ()
+
     def check_content(self):
         pass
 
@@ -91,57 +186,84 @@ class Unknown(JsonSchema):
 
 
 class Union(JsonSchema):
+    __slots__ = ()
 
-    def __init__(self, content: typing.Set[JsonSchema]):
-        super().__init__(content)
+    def __init__(self, content: typing.AbstractSet[JsonSchema]):
+        super().__init__(frozenset(content))
+
+    @classmethod
+    def _intern_key(cls, content):
+        return (cls, frozenset(content))
+
+    def _args(self):
+        return (set(self._content),)
 
     def check_content(self):
-        assert isinstance(self._content, set), 'Union content should be set'
+        assert isinstance(
+            self._content, frozenset), 'Union content should be set'
         for e in self._content:
             assert isinstance(
                 e, JsonSchema), 'Union content elements should be JsonSchema'
 
     def __repr__(self):
-        content_str = ', '.join(map(str, list(self._content)))
+        content_str = ', '.join(map(str, sorted(self._content, key=_order)))
         content_str = '{' + content_str + '}'
         return f'Union({content_str})'
 
     def __or__(self, e):
-        new = copy.deepcopy(e)
-        if isinstance(new, Union):
-            new_set = copy.deepcopy(self._content)
-            for element in new._content:
-                new_set |= element
-            return Union(new_set)
+        if self is e or isinstance(e, Unknown):
+            return self
+        elif isinstance(e, Union):
+            return Union(self._content | e._content)
         else:
-            new_set = copy.deepcopy(self._content)
-            new_set.add(new)
-            return Union(new_set)
-
-    def __hash__(self):
-        return hash(tuple(self._content))
+            return Union(self._content | {e})
 
 
 class Optional(Union):
+    __slots__ = ('_the_content',)
+
     def __init__(self, content: JsonSchema):
         self._the_content = content
         super().__init__({Atomic(None), content})
 
+    @classmethod
+    def _intern_key(cls, content):
+        return (cls, content)
+
+    def _args(self):
+        return (self._the_content,)
+
     def __repr__(self):
         return f'Optional({self._the_content})'
 
+    def _extrapolate(self, second, n):
+        if self is second:
+            return self
+        elif isinstance(second, Optional):
+            return Optional(
+                self._the_content._extrapolate(second._the_content, n))
+        else:
+            raise ValueError(f'{second} is not a repeated merge of {self}')
+
     def __or__(self, e: JsonSchema):
-        old = copy.deepcopy(self)
-        new = copy.deepcopy(e)
-        if new._content is None or old == new or old._the_content == new:
-            return old
+        if e._content is None or self is e or self._the_content is e:
+            return self
         else:
-            # add element in new to the orignal element in OptionalUnion
-            if isinstance(new, Union):
-                if isinstance(new, Optional):
-                    result = Optional(old._the_content | new._the_content)
-                else:
-                    result = Optional(old._the_content | new)
+            # add element in e to the orignal element in OptionalUnion
+            if isinstance(e, Optional):
+                return Optional(self._the_content | e._the_content)
             else:
-                result = Optional(old._the_content | new)
-            return result
+                return Optional(self._the_content | e)
+
+
+_ATOMIC_ORDER = [None, bool, int, float, str]
+
+
+def _order(schema: JsonSchema):
+    """
+    Sorting key showing the members of a Union in a stable order.
+    """
+    if isinstance(schema, Atomic) and schema._content in _ATOMIC_ORDER:
+        return (0, _ATOMIC_ORDER.index(schema._content), '')
+    else:
+        return (1, 0, repr(schema))
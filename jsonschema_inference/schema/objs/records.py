@@ -6,8 +6,8 @@ TODO:
 - [X] Enable representing the __init__ of DynamicDict (same as other schema types)
 """
 from __future__ import annotations
-import copy
 from collections import Counter
+from types import MappingProxyType
 from ...config import config
 from ..inference.reduce import reduce_schema
 from .basic import JsonSchema
@@ -20,45 +20,66 @@ __all__ = [
 
 
 class Record(JsonSchema):
+    __slots__ = ()
+
     def __init__(self, content: dict):
-        super().__init__(content)
+        # NOTE: the fields are read-only, as the schema is shared once interned
+        super().__init__(MappingProxyType(content))
+
+    @classmethod
+    def _intern_key(cls, content):
+        return (cls, frozenset(content.items()))
+
+    def _args(self):
+        return (dict(self._content),)
 
     def check_content(self):
-        assert isinstance(self._content, dict), 'Record content should be dict'
+        assert isinstance(self._content, MappingProxyType), 'Record content should be dict'
         for key in self._content:
             assert isinstance(key, str), 'Record content key should be str'
             assert isinstance(
                 self._content[key], JsonSchema), 'Record content value should be JsonSchema'
 
-    def __repr__(self):
-        return f'Record({self._content})'
+    def _is_idempotent(self):
+        return all(v._idempotent for v in self._content.values())
 
-    def __hash__(self):
-        return hash(tuple(sorted(self._content.items())))
+    def __repr__(self):
+        return f'Record({dict(self._content)})'
 
     def __or__(self, e):
-        if isinstance(e, DynamicRecord):
+        if self is e and self._idempotent:
+            return self
+        elif isinstance(e, DynamicRecord):
             return e | self
         elif isinstance(e, Record):
-            old = copy.deepcopy(self)
-            new = copy.deepcopy(e)
-            if old._content.keys() == new._content.keys():
-                old = Record.merge_label_equal_fields(old, new)
-                return old
+            if self._content.keys() == e._content.keys():
+                return Record.merge_label_equal_fields(self, e)
             else:
                 if config.equivalence_mode == 'kind':
                     return DynamicRecord.merge_records_as_dynamic_record(
-                        old, new)
+                        self, e)
                 elif config.equivalence_mode == 'label':
                     return self._base_or(e)
         else:
             return self._base_or(e)
 
+    def _extrapolate(self, second, n):
+        if self is second:
+            return self
+        elif type(self) is not type(second) or self._content.keys() != second._content.keys():
+            raise ValueError(f'{second} is not a repeated merge of {self}')
+        else:
+            return Record({key: value._extrapolate(second._content[key], n)
+                           for key, value in self._content.items()})
+
     @staticmethod
     def merge_label_equal_fields(old: Record, new: Record):
-        for key in old._content:
-            old._content[key] |= new._content[key]
-        return old
+        result_dict = {key: old._content[key] | new._content[key]
+                       for key in old._content}
+        if all(result_dict[key] is old._content[key] for key in result_dict):
+            return old
+        else:
+            return Record(result_dict)
 
     def to_uniform_dict(self):
         schemas = [v for v in self._content.values()]
@@ -71,42 +92,58 @@ class DynamicRecord(Record):
     Dictionary where keys are not strict
     (some keys can be optional)
     """
+    __slots__ = ('_key_counter',)
 
-    def __init__(self, content: dict, key_counter):
+    def __init__(self, content: dict, key_counter: Counter):
+        self._key_counter = MappingProxyType(key_counter)
         super().__init__(content)
-        self._key_counter = key_counter
 
-    def __repr__(self):
-        return f'DynamicRecord({self._content}, {self._key_counter})'
+    @classmethod
+    def _intern_key(cls, content, key_counter):
+        return (cls, frozenset(content.items()),
+                frozenset(key_counter.items()))
+
+    def _args(self):
+        return (dict(self._content), Counter(self._key_counter))
 
-    def __hash__(self):
-        return hash(tuple(sorted(self._content.items()))) + \
-            hash(tuple(sorted(self._key_counter.items())))
+    def _is_idempotent(self):
+        return False
+
+    def __repr__(self):
+        return f'DynamicRecord({dict(self._content)}, {Counter(self._key_counter)})'
+
+    def _extrapolate(self, second, n):
+        if not isinstance(second, DynamicRecord) or self._content.keys() != second._content.keys():
+            raise ValueError(f'{second} is not a repeated merge of {self}')
+        content = {key: value._extrapolate(second._content[key], n)
+                   for key, value in self._content.items()}
+        key_counter = Counter({
+            key: count + n * (second._key_counter[key] - count)
+            for key, count in self._key_counter.items()})
+        return DynamicRecord(content, key_counter)
 
     def __or__(self, e):
         if isinstance(e, DynamicRecord):
-            old = copy.deepcopy(self)
-            new = copy.deepcopy(e)
-            return DynamicRecord.merge_dynamic_records(old, new)
+            return DynamicRecord.merge_dynamic_records(self, e)
         elif isinstance(e, Record):
-            old = copy.deepcopy(self)
-            new = copy.deepcopy(e)
-            return DynamicRecord.merge_dynamic_n_normal_records(old, new)
+            return DynamicRecord.merge_dynamic_n_normal_records(self, e)
         else:
             return self._base_or(e)
 
     @staticmethod
     def merge_dynamic_n_normal_records(old: DynamicRecord, new: Record):
         result_dict = DynamicRecord.__merge_common_fields(old, new)
+        key_counter = Counter(old._key_counter)
         for key in new._content.keys():
-            old._key_counter[key] += 1
-        return DynamicRecord(result_dict, old._key_counter)
+            key_counter[key] += 1
+        return DynamicRecord(result_dict, key_counter)
 
     @staticmethod
     def merge_dynamic_records(old: DynamicRecord, new: DynamicRecord):
         result_dict = DynamicRecord.__merge_common_fields(old, new)
-        return DynamicRecord(
-            result_dict, old._key_counter + new._key_counter)
+        key_counter = Counter(old._key_counter)
+        key_counter.update(new._key_counter)
+        return DynamicRecord(result_dict, key_counter)
 
     @staticmethod
     def merge_records_as_dynamic_record(old: Record, new: Record):
@@ -120,16 +157,11 @@ class DynamicRecord(Record):
 
     @staticmethod
     def __merge_common_fields(old: Record, new: Record):
-        result_dict = {}
-        old_keys = list(old._content.keys())
-        new_keys = list(new._content.keys())
-        all_keys = set(old_keys + new_keys)
-        for key in all_keys:
-            if key in old._content and key in new._content:
-                result_dict[key] = old._content[key] | new._content[key]
-            elif key in old._content:
-                result_dict[key] = old._content[key]
-            elif key in new._content:
+        result_dict = dict(old._content)
+        for key in new._content:
+            if key in result_dict:
+                result_dict[key] = result_dict[key] | new._content[key]
+            else:
                 result_dict[key] = new._content[key]
         return result_dict
 
@@ -139,6 +171,7 @@ class UniformRecord(JsonSchema):
     Dictionary where value elements
     are united into a JsonSchema.
     """
+    __slots__ = ()
 
     def __init__(self, content: JsonSchema):
         super().__init__(content)
@@ -147,13 +180,16 @@ class UniformRecord(JsonSchema):
         assert isinstance(
             self._content, JsonSchema), f'UniformRecord content should be JsonSchema, but it is {self._content}'
 
+    def _is_idempotent(self):
+        return self._content._idempotent
+
     def __repr__(self):
         return f'UniformRecord({self._content})'
 
     def __or__(self, e):
-        if isinstance(e, UniformRecord):
-            new = copy.deepcopy(e)
-            old = copy.deepcopy(self)
-            return UniformRecord(old._content | new._content)
+        if self is e and self._idempotent:
+            return self
+        elif isinstance(e, UniformRecord):
+            return UniformRecord(self._content | e._content)
         else:
             return self._base_or(e)
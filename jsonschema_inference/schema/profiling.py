@@ -0,0 +1,232 @@
+"""
+Profiling of the merges of json schemas
+
+While profiling (`profile_merges`, or the runs of `InferenceEngine`
+with `config.profile` on), the `__or__` methods of the schema classes
+are replaced by instrumented ones, which record:
+
+- the number and the time of the merges by (left type, right type),
+    both inclusive and exclusive of the nested merges (`self_seconds`),
+- the entries of the containers built for the merged schemas (`copied_entries`.
+    The schemas are immutable, so the operands are never deep-copied, but the
+    fields of a Record, the members of a Union and the key counter of a
+    DynamicRecord are copied into the new merged schema),
+- the sizes of the Unions and of the DynamicRecord key counters built,
+- the slowest merges with the path of the merged schemas (e.g. `$.info.tags[]`).
+
+The accumulators of `reduce_schema` and `fit_batch` (see `objs.accumulator`)
+merge with `__or__` as well while profiling, instead of in place.
+The original methods are restored afterwards, so nothing is
+recorded, and nothing is slowed down, when profiling is off.
+A cProfile / pstats dump of the profiled code is also saved if
+`dump_path` is provided.
+
+The contexts may be nested, or opened by several threads at once: the
+methods stay instrumented (and the accumulators merge with `__or__`, in
+every thread) until the last context is closed. A profile only records the
+merges of the thread which opened it (those of a nested context are also
+recorded by the enclosing ones), and only one cProfile runs in a thread
+(the `dump_path` of a context nested in a dumping one is ignored).
+"""
+import contextlib
+import cProfile
+import heapq
+import itertools
+import logging
+import threading
+import time
+import typing
+from collections import defaultdict
+from types import MappingProxyType
+from .objs import JsonSchema, Unknown, Union, Optional, Record, DynamicRecord, UniformRecord, Array
+from .objs.accumulator import Accumulator
+
+__all__ = ['profile_merges', 'MergeProfile']
+
+_CLASSES = [JsonSchema, Unknown, Union, Optional, Record, DynamicRecord, UniformRecord, Array]
+_local = threading.local()
+_lock = threading.Lock()
+# the number of the open contexts (the methods are instrumented while positive)
+_depth = 0
+_originals: typing.Dict[type, typing.Callable] = dict()
+
+
+class MergeProfile:
+    """
+    The records of the merges (see `report`).
+
+    Args:
+        - slowest: number of the slowest merges kept
+    """
+
+    def __init__(self, slowest: int = 10):
+        self._slowest_count = slowest
+        self._lock = threading.Lock()
+        # (left, right) -> [count, seconds, self_seconds]
+        self._pairs: typing.DefaultDict[typing.Tuple[str, str], typing.List[float]] = \
+            defaultdict(lambda: [0, 0., 0.])
+        self._seconds = 0.
+        self._copied_entries = 0
+        self._union_sizes: typing.List[int] = []
+        self._unions_grown = 0
+        self._counter_sizes: typing.List[int] = []
+        self._slowest: typing.List[tuple] = []
+        self._tie = itertools.count()
+
+    def _record(self, left: JsonSchema, right: JsonSchema, result: JsonSchema,
+                seconds: float, self_seconds: float, stack: list, frame: list):
+        pair = (type(left).__name__, type(right).__name__)
+        with self._lock:
+            stats = self._pairs[pair]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] += self_seconds
+            if not stack:
+                self._seconds += seconds
+            if result is not left and result is not right:
+                content = result._content
+                if isinstance(content, (MappingProxyType, frozenset)):
+                    self._copied_entries += len(content)
+                if type(result) is Union:
+                    self._union_sizes.append(len(content))
+                    if len(content) > (len(left._content) if type(left) is Union else 1):
+                        self._unions_grown += 1
+                elif isinstance(result, DynamicRecord):
+                    self._copied_entries += len(result._key_counter)
+                    self._counter_sizes.append(len(result._key_counter))
+            if self._slowest_count and (len(self._slowest) < self._slowest_count or
+                                        seconds > self._slowest[0][0]):
+                item = (seconds, next(self._tie), _path(stack + [frame]), pair)
+                if len(self._slowest) < self._slowest_count:
+                    heapq.heappush(self._slowest, item)
+                else:
+                    heapq.heapreplace(self._slowest, item)
+
+    def report(self) -> dict:
+        """
+        - merges: number of merges (nested ones included)
+        - seconds: time of the merges (outermost ones)
+        - pairs: count, seconds and self_seconds of the merges by (left, right) type,
+            by self_seconds descending
+        - copied_entries: number of entries of the containers built for the merged schemas
+        - unions: number (created), max and mean size of the Unions built, and
+            number of the merges growing a Union (grown)
+        - dynamic_records: number (created), max and mean size of the key counters built
+        - slowest: the slowest merges (seconds, path, left, right)
+        """
+        with self._lock:
+            pairs = sorted(self._pairs.items(), key=lambda item: -item[1][2])
+            return {
+                'merges': sum(stats[0] for _, stats in pairs),
+                'seconds': self._seconds,
+                'pairs': [{'left': left, 'right': right, 'count': count,
+                           'seconds': seconds, 'self_seconds': self_seconds}
+                          for (left, right), (count, seconds, self_seconds) in pairs],
+                'copied_entries': self._copied_entries,
+                'unions': _sizes(self._union_sizes, grown=self._unions_grown),
+                'dynamic_records': _sizes(self._counter_sizes),
+                'slowest': [{'seconds': seconds, 'path': path, 'left': left, 'right': right}
+                            for seconds, _, path, (left, right) in sorted(self._slowest, reverse=True)],
+            }
+
+
+def _sizes(sizes: typing.List[int], **extra) -> dict:
+    return dict(created=len(sizes), max_size=max(sizes, default=0),
+                mean_size=sum(sizes) / len(sizes) if sizes else 0., **extra)
+
+
+def _path(stack: list) -> str:
+    """
+    The path of the merge nested in the merges of `stack` (outermost first).
+    """
+    segments = ['$']
+    for (parent, parent_right, _), (left, right, _) in zip(stack, stack[1:]):
+        if isinstance(parent, Record) and isinstance(parent_right, Record):
+            segments.append(_field(parent, parent_right, left, right))
+        elif isinstance(parent, Array):
+            segments.append('[]')
+        elif isinstance(parent, UniformRecord):
+            segments.append('.*')
+    return ''.join(segments)
+
+
+def _field(parent: Record, parent_right: Record, left: JsonSchema, right: JsonSchema) -> str:
+    # NOTE: the fields may be merged in either order (e.g. DynamicRecord | Record)
+    for key, value in parent._content.items():
+        other = parent_right._content.get(key)
+        if (value is left and other is right) or (value is right and other is left):
+            return f'.{key}'
+    return '.?'
+
+
+def _instrument(original: typing.Callable) -> typing.Callable:
+    def __or__(self, e):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        frame = [self, e, 0.]
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            result = original(self, e)
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+        if stack:
+            stack[-1][2] += seconds
+        # NOTE: the profiles of this thread
+        for profile in getattr(_local, 'profiles', ()):
+            profile._record(self, e, result, seconds, seconds - frame[2], stack, frame)
+        return result
+    __or__.__wrapped__ = original  # type: ignore
+    return __or__
+
+
+@contextlib.contextmanager
+def profile_merges(slowest: int = 10, dump_path: typing.Optional[str] = None):
+    """
+    Profile the merges within the context, in this thread (see `MergeProfile.report`),
+    and save a cProfile / pstats dump to `dump_path` if provided.
+
+    Usage:
+        with profile_merges() as profile:
+            ...
+        print(profile.report())
+    """
+    global _depth
+    profile = MergeProfile(slowest=slowest)
+    with _lock:
+        if _depth == 0:
+            for cls in _CLASSES:
+                original = cls.__dict__.get('__or__')
+                if original is not None:
+                    _originals[cls] = original
+                    setattr(cls, '__or__', _instrument(original))
+            Accumulator.in_place = False
+        _depth += 1
+    profiles = getattr(_local, 'profiles', None)
+    if profiles is None:
+        profiles = _local.profiles = []
+    profiles.append(profile)
+    profiler = None
+    if dump_path is not None:
+        if getattr(_local, 'profiler', None) is None:
+            profiler = _local.profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            logging.warning(f'{dump_path} not dumped: the thread is already being cProfiled')
+    try:
+        yield profile
+    finally:
+        if profiler is not None and dump_path is not None:
+            profiler.disable()
+            _local.profiler = None
+            profiler.dump_stats(dump_path)
+        profiles.remove(profile)
+        with _lock:
+            _depth -= 1
+            if _depth == 0:
+                for schema_class, original in _originals.items():
+                    setattr(schema_class, '__or__', original)
+                _originals.clear()
+                Accumulator.in_place = True
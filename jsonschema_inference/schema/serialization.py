@@ -0,0 +1,323 @@
+"""
+Compact binary serialization of json schemas
+
+Layout (version 2):
+
+    b'JSI' | version (1 byte) | flags (1 byte)
+    | string count (varint) | string lengths (ints, unless joined by NUL) | byte size (varint) | utf-8 bytes
+    | node count (varint) | node tags (1 byte per node)
+    | sizes | references | keys | counts (each: length (varint), ints)
+    | atom count (varint) | atom codes (1 byte per Atomic node)
+
+The distinct (interned) nodes are stored only once, in post-order
+(the children before their parents, the root last), as a table of
+one-byte tags. Their payloads are not stored node by node, but in
+columns, one per kind of payload, in the order of the nodes:
+
+- sizes: the field count of each Record / DynamicRecord (then the counter
+    size if the counter keys are not the record keys), the member count of each Union
+- references (to the previous nodes): the field values of each Record /
+    DynamicRecord, the members of each Union, and the content of each
+    Optional / Array / UniformRecord
+- keys (references to the strings): the field keys of each Record /
+    DynamicRecord (then the counter keys, if not the record keys)
+- counts: the counts of each DynamicRecord counter (in the order of the keys)
+- atom codes: None, bool, int, float or str for each Atomic
+
+The keys of the records are stored once in the string table, joined by
+NUL (when no key contains it, see the flags) or sliced by their lengths.
+The keys column is omitted when it would be the string table itself (each
+key once, in order, e.g. a single record).
+The counts of strings, nodes and column entries are unsigned LEB128 varints, while the columns (and
+the string lengths) are packed arrays of the smallest width fitting them:
+a width byte (1, 2, 4 or 8), then the little-endian integers (omitted
+for empty lists). So each column is encoded and decoded at once by
+`array`, and a schema is read with one pass over its node table.
+
+The json schemas are pickled in this format (see `JsonSchema.__reduce__`),
+so it is also the format of the schemas sent back by the process and ray workers.
+"""
+import array
+import itertools
+import sys
+import typing
+from collections import Counter
+from .objs import (
+    JsonSchema, Unknown, Atomic, Union, Optional, Array,
+    Record, DynamicRecord, UniformRecord
+)
+
+__all__ = ['dumps', 'loads', 'MAGIC', 'VERSION']
+
+MAGIC = b'JSI'
+VERSION = 2
+
+_UNKNOWN, _ATOMIC, _UNION, _OPTIONAL, _ARRAY, _RECORD, _DYNAMIC_RECORD, _UNIFORM_RECORD, \
+    _DYNAMIC_RECORD_KEYS = range(9)
+_ATOMS: typing.List[typing.Optional[type]] = [None, bool, int, float, str]
+_ATOM_CODES = {atom: code for code, atom in enumerate(_ATOMS)}
+_ATOMIC_SCHEMAS = [Atomic(atom) for atom in _ATOMS]
+# the array typecodes of unsigned integers of 1, 2, 4 and 8 bytes
+_CODES = {array.array(code).itemsize: code for code in 'BHILQ'}
+_WIDTHS = sorted(_CODES.items())
+_BIG_ENDIAN = sys.byteorder == 'big'
+# flags: the strings are joined by NUL (else sliced by their lengths),
+# and the keys column is the string table itself (so it is omitted)
+_NUL_JOINED, _KEYS_ARE_STRINGS = 1, 2
+
+
+def _varint(out: bytearray, value: int):
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _ints(out: bytearray, values: typing.List[int]):
+    """
+    Append a list of (unsigned) integers as a packed array of
+    the smallest width (1, 2, 4 or 8 bytes) fitting them all.
+    """
+    if not values:
+        return
+    largest = max(values)
+    for width, code in _WIDTHS:
+        if largest < 1 << 8 * width:
+            break
+    out.append(width)
+    if width == 1:
+        out += bytes(values)
+    else:
+        packed = array.array(code, values)
+        if _BIG_ENDIAN:
+            packed.byteswap()
+        out += packed.tobytes()
+
+
+def _read_ints(data: bytes, position: int, n: int) -> typing.Tuple[typing.Sequence[int], int]:
+    """
+    Read a packed array of `n` integers from `data` at `position`.
+    Returns the integers and the position after them.
+    """
+    if n == 0:
+        return (), position
+    width = data[position]
+    position += 1
+    end = position + n * width
+    if width == 1:
+        return data[position:end], end
+    packed = array.array(_CODES[width])
+    packed.frombytes(data[position:end])
+    if _BIG_ENDIAN:
+        packed.byteswap()
+    return packed, end
+
+
+def dumps(schema: JsonSchema) -> bytes:
+    """
+    Serialize a json schema into bytes.
+    """
+    nodes: typing.Dict[JsonSchema, int] = dict()
+    tags = bytearray()
+    sizes: typing.List[int] = []
+    references: typing.List[int] = []
+    keys: typing.List[str] = []
+    counts: typing.List[int] = []
+    atoms = bytearray()
+
+    def visit(schema: JsonSchema):
+        cls = type(schema)
+        if cls is Atomic:
+            code = _ATOM_CODES.get(schema._content)
+            if code is None:
+                raise ValueError(f'Unsupported atomic type: {schema._content}')
+            tag = _ATOMIC
+            atoms.append(code)
+        elif cls is Record or cls is DynamicRecord:
+            content = schema._content
+            values = content.values()
+            # NOTE: a child may have been visited as a child of another one
+            for child in set(values) - nodes.keys() if len(values) > 8 else values:
+                if child not in nodes:
+                    visit(child)
+            sizes.append(len(content))
+            references.extend(map(nodes.__getitem__, values))
+            keys.extend(content)
+            if cls is Record:
+                tag = _RECORD
+            else:
+                counter = typing.cast(DynamicRecord, schema)._key_counter
+                # NOTE: the merges keep the counter keys in the order of the record keys
+                if list(counter) == list(content):
+                    tag = _DYNAMIC_RECORD
+                    counts.extend(counter.values())
+                else:
+                    tag = _DYNAMIC_RECORD_KEYS
+                    sizes.append(len(counter))
+                    keys.extend(counter)
+                    counts.extend(counter.values())
+        elif cls is Array or cls is UniformRecord or cls is Optional:
+            if cls is Optional:
+                child = typing.cast(Optional, schema)._the_content
+            else:
+                child = schema._content
+            if child not in nodes:
+                visit(child)
+            tag = _ARRAY if cls is Array else _UNIFORM_RECORD if cls is UniformRecord else _OPTIONAL
+            references.append(nodes[child])
+        elif cls is Union:
+            members = schema._content
+            for child in members - nodes.keys():
+                if child not in nodes:
+                    visit(child)
+            tag = _UNION
+            sizes.append(len(members))
+            references.extend(map(nodes.__getitem__, members))
+        elif cls is Unknown:
+            tag = _UNKNOWN
+        else:
+            raise ValueError(f'Unsupported json schema: {cls.__name__}')
+        tags.append(tag)
+        nodes[schema] = len(nodes)
+
+    visit(schema)
+    # NOTE: the string table is built at once from the keys of all the records
+    strings: typing.Dict[str, int] = dict.fromkeys(keys, 0)
+    flags = 0
+    text = '\0'.join(strings)
+    if len(strings) == len(keys):
+        flags |= _KEYS_ARE_STRINGS
+    if text.count('\0') == max(len(strings) - 1, 0):
+        flags |= _NUL_JOINED
+    else:
+        text = ''.join(strings)
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    out.append(flags)
+    _varint(out, len(strings))
+    if not flags & _NUL_JOINED:
+        _ints(out, list(map(len, strings)))
+    encoded = text.encode('utf-8', 'surrogatepass')
+    _varint(out, len(encoded))
+    out += encoded
+    _varint(out, len(tags))
+    out += tags
+    if flags & _KEYS_ARE_STRINGS:
+        columns = [sizes, references, [], counts]
+    else:
+        strings.update(zip(strings, itertools.count()))
+        columns = [sizes, references, list(map(strings.__getitem__, keys)), counts]
+    for column in columns:
+        _varint(out, len(column))
+        _ints(out, column)
+    _varint(out, len(atoms))
+    out += atoms
+    return bytes(out)
+
+
+def loads(data: bytes) -> JsonSchema:
+    """
+    Deserialize a json schema from the bytes of `dumps`.
+    """
+    if data[:3] != MAGIC:
+        raise ValueError('Not a serialized json schema')
+    if data[3] != VERSION:
+        raise ValueError(f'Unsupported serialization version: {data[3]}')
+    data = bytes(data)
+    flags = data[4]
+    position = 5
+
+    def varint() -> int:
+        nonlocal position
+        value = 0
+        shift = 0
+        while True:
+            byte = data[position]
+            position += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def ints(n: int) -> typing.Sequence[int]:
+        nonlocal position
+        values, position = _read_ints(data, position, n)
+        return values
+
+    def raw(n: int) -> bytes:
+        nonlocal position
+        position += n
+        return data[position - n:position]
+
+    # the strings are decoded at once, then split (or sliced by their lengths)
+    string_count = varint()
+    if flags & _NUL_JOINED:
+        text = raw(varint()).decode('utf-8', 'surrogatepass')
+        strings = text.split('\0') if string_count else []
+    else:
+        lengths = ints(string_count)
+        text = raw(varint()).decode('utf-8', 'surrogatepass')
+        ends = list(itertools.accumulate(lengths))
+        strings = list(map(text.__getitem__, map(slice, [0] + ends[:-1], ends)))
+    tags = raw(varint())
+    sizes = ints(varint())
+    references = ints(varint())
+    if flags & _KEYS_ARE_STRINGS:
+        ints(varint())
+        keys = strings
+    else:
+        keys = list(map(strings.__getitem__, ints(varint())))
+    counts = ints(varint())
+    atoms = raw(varint())
+    nodes: typing.List[JsonSchema] = []
+    append = nodes.append
+    node = nodes.__getitem__
+    size_index = reference = key = count = atom = 0
+    # NOTE: the records are the most frequent nodes (there are at most 5 distinct atoms)
+    record, dynamic_record, dynamic_record_keys = _RECORD, _DYNAMIC_RECORD, _DYNAMIC_RECORD_KEYS
+    for tag in tags:
+        if tag == record:
+            n = sizes[size_index]
+            size_index += 1
+            end = reference + n
+            append(Record(dict(zip(keys[key:key + n], map(node, references[reference:end])))))
+            key += n
+            reference = end
+        elif tag == dynamic_record or tag == dynamic_record_keys:
+            n = sizes[size_index]
+            size_index += 1
+            content = dict(zip(keys[key:key + n], map(node, references[reference:reference + n])))
+            key += n
+            reference += n
+            counter_keys: typing.Iterable[str] = content
+            if tag == dynamic_record_keys:
+                n = sizes[size_index]
+                size_index += 1
+                counter_keys = keys[key:key + n]
+                key += n
+            counter: Counter = Counter()
+            dict.update(counter, zip(counter_keys, counts[count:count + n]))
+            append(DynamicRecord(content, counter))
+            count += n
+        elif tag == _OPTIONAL:
+            append(Optional(nodes[references[reference]]))
+            reference += 1
+        elif tag == _ARRAY:
+            append(Array(nodes[references[reference]]))
+            reference += 1
+        elif tag == _UNION:
+            n = sizes[size_index]
+            size_index += 1
+            append(Union(set(map(node, references[reference:reference + n]))))
+            reference += n
+        elif tag == _UNIFORM_RECORD:
+            append(UniformRecord(nodes[references[reference]]))
+            reference += 1
+        elif tag == _ATOMIC:
+            append(_ATOMIC_SCHEMAS[atoms[atom]])
+            atom += 1
+        elif tag == _UNKNOWN:
+            append(Unknown())
+        else:
+            raise ValueError(f'Unknown node tag: {tag}')
+    return nodes[-1]
@@ -0,0 +1,149 @@
+"""
+Structural fingerprints of json documents
+
+Documents of the same structure (same keys and value types) get
+the same fingerprint, which allows fitting each distinct shape only once.
+The arrays longer than `config.array_sample_size` are sampled as they are
+fitted (and counted in `fitter.sampling_stats` once per document, here).
+"""
+import itertools
+import threading
+import typing
+from collections import OrderedDict, namedtuple
+from ..config import config
+from .fitter import fit, sample_array, hold_sampling_stats
+from .objs import JsonSchema
+from .objs.accumulator import Accumulator
+
+__all__ = ['fingerprint', 'ShapeCache', 'shape_cache', 'fit_batch']
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+def fingerprint(data) -> typing.Any:
+    """
+    Build a hashable fingerprint of the structure of a json document
+    in a single pass (without allocating any schema object).
+
+    NOTE: consecutive scalars of the same type in a list are collapsed,
+    as fitting them once or many times gives the same schema. Only the
+    sampled elements of a long array are walked (see `fitter.sample_array`).
+    """
+    if isinstance(data, dict):
+        return (dict,) + tuple(
+            [(key, fingerprint(value)) for key, value in data.items()])
+    elif isinstance(data, list):
+        sample_size = config.array_sample_size
+        if sample_size and len(data) > sample_size:
+            data = sample_array(data)
+        types = list(map(type, data))
+        if not any(issubclass(element_type, (dict, list)) for element_type in set(types)):
+            # arrays of scalars: the types are collapsed at once
+            return (list,) + tuple(element_type for element_type, _ in itertools.groupby(types))
+        shape: typing.List[typing.Any] = [list]
+        last = None
+        for element in data:
+            if isinstance(element, (dict, list)):
+                shape.append(fingerprint(element))
+                last = None
+            else:
+                element_type = type(element)
+                if element_type is not last:
+                    shape.append(element_type)
+                    last = element_type
+        return tuple(shape)
+    else:
+        return type(data)
+
+
+class ShapeCache:
+    """
+    A bounded LRU cache mapping document fingerprints
+    to the fitted json schemas.
+
+    Args:
+        - maxsize: max number of cached shapes.
+            (`config.shape_cache_size` is used if not provided, 0 disables caching)
+    """
+
+    def __init__(self, maxsize: typing.Optional[int] = None):
+        self._maxsize = maxsize
+        self._schemas: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def maxsize(self) -> int:
+        if self._maxsize is None:
+            return config.shape_cache_size
+        else:
+            return self._maxsize
+
+    def fit(self, data, shape: typing.Optional[typing.Hashable] = None) -> JsonSchema:
+        """
+        Fit the json schema of `data`, reusing the schema fitted
+        from a previous document of the same shape.
+        """
+        if shape is None:
+            shape = fingerprint(data)
+        # NOTE: the fitted schema also depends on the config
+        key = (shape, config.fingerprint())
+        with self._lock:
+            schema = self._schemas.get(key)
+            if schema is not None:
+                self._schemas.move_to_end(key)
+                self._hits += 1
+                return schema
+            self._misses += 1
+        # NOTE: the sampled arrays were counted by the fingerprint
+        with hold_sampling_stats():
+            schema = fit(data)
+        maxsize = self.maxsize
+        if maxsize > 0:
+            with self._lock:
+                self._schemas[key] = schema
+                while len(self._schemas) > maxsize:
+                    self._schemas.popitem(last=False)
+        return schema
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self._hits, self._misses,
+                         self.maxsize, len(self._schemas))
+
+    def clear(self):
+        with self._lock:
+            self._schemas.clear()
+            self._hits = 0
+            self._misses = 0
+
+
+shape_cache = ShapeCache()
+
+
+def fit_batch(json_batch: typing.Iterable[typing.Any],
+              cache: ShapeCache = shape_cache) -> JsonSchema:
+    """
+    Fit a batch of json documents into one json schema.
+
+    The documents are merged in order, and each run of consecutive
+    documents of the same fingerprint is merged once with its length
+    (the schema of each distinct shape is fitted once, see `ShapeCache`).
+    So the DynamicRecord key counts are the same as merging the
+    documents one after another.
+    """
+    accumulator = Accumulator()
+    run_data = None
+    run_shape: typing.Any = None
+    count = 0
+    for data in json_batch:
+        shape = fingerprint(data)
+        if count and shape == run_shape:
+            count += 1
+            continue
+        if count:
+            accumulator.merge(cache.fit(run_data, run_shape), count)
+        run_data, run_shape, count = data, shape, 1
+    if count:
+        accumulator.merge(cache.fit(run_data, run_shape), count)
+    return accumulator.schema()
@@ -0,0 +1,267 @@
+"""
+Streaming json schema inference
+
+The json schema is built incrementally from ijson-style parsing events
+(`start_map`, `map_key`, `end_map`, `start_array`, `end_array`, `null`,
+`boolean`, `number` and `string`), without decoding the json
+into python objects. Array elements are merged as soon as they are parsed,
+so the memory grows with the schema size rather than the document size.
+
+The events come from `ijson` if it is installed, or from the
+(slower) pure-python tokenizer of this module otherwise.
+
+The arrays are sampled as by the batch fitter (see `config.array_sample_size`),
+so the schema is the same as that of `fit`. As the length of an array is only
+known at its end, the schemas of its elements are then kept until it ends
+(as runs of the same schema, so an array of same-shaped elements stays small).
+
+NOTE: this is a library api: the inference engines decode the jsons.
+"""
+import codecs
+import io
+import json
+import re
+import typing
+from ..config import config
+from .fitter import add_sampling_stats, try_unify_dict
+from .objs import JsonSchema, Record, Array, Atomic, Unknown
+
+__all__ = ['basic_parse', 'StreamFitter', 'fit_events', 'iter_fit_events', 'fit_stream']
+
+Event = typing.Tuple[str, typing.Any]
+
+_TOKEN = re.compile(r'''
+    [ \t\n\r]*
+    (?:
+        (?P<punct>[{}\[\],:])
+        |(?P<string>"(?:[^"\\]|\\.)*")
+        |(?P<number>-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?)
+        |(?P<literal>true|false|null)
+    )''', re.VERBOSE)
+
+_LITERALS: typing.Dict[str, Event] = {
+    'true': ('boolean', True),
+    'false': ('boolean', False),
+    'null': ('null', None)
+}
+
+
+def _tokens(f, buf_size: int) -> typing.Iterator[typing.Tuple[str, str]]:
+    """
+    Yield the (kind, token) of the json tokens read from the file `f`.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    pos = 0
+    eof = False
+    while True:
+        match = _TOKEN.match(buf, pos)
+        # NOTE: a token reaching the end of the buffer may be incomplete
+        # (as well as a number followed by a partial fraction or exponent)
+        if match is None or not eof and (
+                match.end() == len(buf) or
+                match.lastgroup == 'number' and buf[match.end()] in '.eE'):
+            if eof:
+                if buf[pos:].strip():
+                    raise ValueError(f'Invalid json at: {buf[pos:pos + 20]!r}')
+                return
+            chunk = f.read(buf_size)
+            eof = not chunk
+            if isinstance(chunk, bytes):
+                chunk = decoder.decode(chunk, final=eof)
+            buf = buf[pos:] + chunk
+            pos = 0
+        else:
+            pos = match.end()
+            kind = typing.cast(str, match.lastgroup)
+            yield kind, match.group(kind)
+
+
+def _builtin_basic_parse(f, buf_size: int) -> typing.Iterator[Event]:
+    containers: typing.List[bool] = []  # True for a map and False for an array
+    expect_key = False
+    for kind, token in _tokens(f, buf_size):
+        if kind == 'punct':
+            if token == '{':
+                containers.append(True)
+                expect_key = True
+                yield ('start_map', None)
+            elif token == '}':
+                containers.pop()
+                expect_key = False
+                yield ('end_map', None)
+            elif token == '[':
+                containers.append(False)
+                expect_key = False
+                yield ('start_array', None)
+            elif token == ']':
+                containers.pop()
+                yield ('end_array', None)
+            elif token == ',':
+                expect_key = bool(containers) and containers[-1]
+            else:
+                expect_key = False
+        elif kind == 'string':
+            value = json.loads(token) if '\\' in token else token[1:-1]
+            if expect_key:
+                yield ('map_key', value)
+            else:
+                yield ('string', value)
+        elif kind == 'number':
+            if '.' in token or 'e' in token or 'E' in token:
+                yield ('number', float(token))
+            else:
+                yield ('number', int(token))
+        else:
+            yield _LITERALS[token]
+
+
+def basic_parse(f, buf_size: int = 64 * 1024,
+                use_ijson: bool = True) -> typing.Iterator[Event]:
+    """
+    Yield the ijson-style (event, value) parsing events of the json value(s)
+    read from a file-like object (or bytes / str).
+
+    Args:
+        - f: a binary or text file-like object, bytes or str.
+        - buf_size: number of bytes read at a time.
+        - use_ijson: use `ijson` (if installed) instead of the builtin tokenizer.
+    """
+    if isinstance(f, bytes):
+        f = io.BytesIO(f)
+    elif isinstance(f, str):
+        f = io.StringIO(f)
+    # NOTE: ijson reads bytes, so text files go to the builtin tokenizer
+    if use_ijson and not isinstance(f, io.TextIOBase):
+        try:
+            import ijson
+        except ImportError:
+            pass
+        else:
+            return ijson.basic_parse(
+                f, buf_size=buf_size, multiple_values=True, use_float=True)
+    return _builtin_basic_parse(f, buf_size)
+
+
+class StreamFitter:
+    """
+    Fit the json schemas of json values from their parsing events.
+
+    Feed the events one by one with `feed`, which returns the
+    json schema once the last event of a (top-level) json value is fed.
+    """
+
+    def __init__(self):
+        # frames of the open containers:
+        # [content, key] for a map, and for an array, [merged element schema],
+        # or [[schema, count] runs of the element schemas, length] if sampled
+        self._frames: typing.List[list] = []
+        self._is_map: typing.List[bool] = []
+        self._sample_size = config.array_sample_size
+
+    def feed(self, event: str, value: typing.Any) -> typing.Optional[JsonSchema]:
+        if event == 'map_key':
+            self._frames[-1][1] = value
+            return None
+        elif event == 'start_map':
+            self._frames.append([dict(), None])
+            self._is_map.append(True)
+            return None
+        elif event == 'start_array':
+            self._frames.append([[], 0] if self._sample_size else [Unknown()])
+            self._is_map.append(False)
+            return None
+        elif event == 'end_map':
+            content, _ = self._frames.pop()
+            self._is_map.pop()
+            schema: JsonSchema = Record(content)
+            if config.unify_records:
+                schema = try_unify_dict(schema)
+            return self._complete(schema)
+        elif event == 'end_array':
+            frame = self._frames.pop()
+            self._is_map.pop()
+            element_schema = self._fold_sample(*frame) if self._sample_size else frame[0]
+            return self._complete(Array(element_schema))
+        elif event == 'null':
+            return self._complete(Atomic(None))
+        elif event == 'boolean':
+            return self._complete(Atomic(bool))
+        elif event == 'number':
+            # NOTE: ijson may yield Decimal for non-integers
+            return self._complete(Atomic(int if isinstance(value, int) else float))
+        elif event == 'string':
+            return self._complete(Atomic(str))
+        else:
+            raise ValueError(f'Unknown parsing event: {event}')
+
+    def _complete(self, schema: JsonSchema) -> typing.Optional[JsonSchema]:
+        if not self._frames:
+            return schema
+        frame = self._frames[-1]
+        if self._is_map[-1]:
+            frame[0][frame[1]] = schema
+        elif self._sample_size:
+            runs = frame[0]
+            if runs and runs[-1][0] is schema:
+                runs[-1][1] += 1
+            else:
+                runs.append([schema, 1])
+            frame[1] += 1
+        else:
+            frame[0] = frame[0].merge_into(schema)
+        return None
+
+    def _fold_sample(self, runs: typing.List[list], length: int) -> JsonSchema:
+        """
+        Merge the element schemas of an array sampled as by `fitter.sample_array`
+        (every `step`-th element, counted in `sampling_stats`).
+        """
+        step = 1
+        if length > self._sample_size:
+            step = -(-length // self._sample_size)
+            add_sampling_stats((1, length, -(-length // step)))
+        result: JsonSchema = Unknown()
+        start = 0
+        for schema, count in runs:
+            # NOTE: a run is merged once if any of its elements is sampled
+            # (merging the same schema again changes nothing)
+            if -(-start // step) * step < start + count:
+                result = result.merge_into(schema)
+            start += count
+        return result
+
+    @property
+    def depth(self) -> int:
+        """
+        Number of containers opened but not yet closed.
+        """
+        return len(self._frames)
+
+
+def iter_fit_events(events: typing.Iterable[Event]) -> typing.Iterator[JsonSchema]:
+    """
+    Yield the json schema of each top-level json value of the parsing events.
+    """
+    fitter = StreamFitter()
+    for event, value in events:
+        schema = fitter.feed(event, value)
+        if schema is not None:
+            yield schema
+
+
+def fit_events(events: typing.Iterable[Event]) -> JsonSchema:
+    """
+    Fit the json schema of a json value from its parsing events.
+    """
+    for schema in iter_fit_events(events):
+        return schema
+    return Unknown()
+
+
+def fit_stream(f, buf_size: int = 64 * 1024) -> JsonSchema:
+    """
+    Fit the json schema of the json value read from a file-like object
+    (or bytes / str) without decoding it into python objects.
+    """
+    return fit_events(basic_parse(f, buf_size=buf_size))
@@ -0,0 +1,150 @@
+import collections
+import email.utils
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    A stand-in of a json API:
+        - /json/<n>: a json (kept alive with Content-Length)
+        - /chunked/<n>: a json with chunked transfer encoding
+        - /gzip/<n>: a gzip-encoded json
+        - /close/<n>: a json ended by closing the connection
+        - /flaky/<n>: 503 for the first request, then a json
+        - /slow/<n>: a json after half a second
+        - /etag/<n>: a json with an ETag (304 if matched by If-None-Match)
+        - /modified/<n>: a json with a Last-Modified (304 if matched by If-Modified-Since)
+        - /throttled/<n>: a json after 20 ms, or 429 (Retry-After: 0) if
+            `server.capacity` requests are already being served
+        - /delayed/<n>: a json after 50 ms
+        - /redirect/<n>: a 301 redirect to /json/<n>
+        - /missing/<n>: 404
+        The version of the jsons with validators is `server.versions[n]`.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        _, route, n = self.path.split('/')
+        with self.server.lock:
+            self.server.requests[self.path] += 1
+            count = self.server.requests[self.path]
+        version = self.server.versions[int(n)]
+        body = json.dumps({'id': int(n), 'route': route,
+                           'tags': ['x'] * ((int(n) + version) % 3)}).encode()
+        if route in ('etag', 'modified'):
+            validators = {'etag': ('ETag', 'If-None-Match', f'"{n}-{version}"'),
+                          'modified': ('Last-Modified', 'If-Modified-Since',
+                                       email.utils.formatdate(1e9 + version, usegmt=True))}
+            header, condition, value = validators[route]
+            if self.headers.get(condition) == value:
+                with self.server.lock:
+                    self.server.not_modified += 1
+                self.send_response(304)
+                self.send_header(header, value)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header(header, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if route == 'redirect':
+            self.send_response(301)
+            self.send_header('Location', f'/json/{n}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if route == 'missing':
+            body = b'{"message": "Not Found"}'
+            self.send_response(404)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if route == 'delayed':
+            time.sleep(0.05)
+        if route == 'flaky' and count == 1:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if route == 'slow':
+            time.sleep(0.5)
+        if route == 'throttled':
+            with self.server.lock:
+                throttled = self.server.serving >= self.server.capacity
+                if throttled:
+                    self.server.throttled += 1
+                else:
+                    self.server.serving += 1
+            if throttled:
+                self.send_response(429)
+                self.send_header('Retry-After', '0')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            time.sleep(0.02)
+            with self.server.lock:
+                self.server.serving -= 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if route == 'chunked':
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for i in range(0, len(body), 7):
+                chunk = body[i:i + 7]
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.write(b'0\r\n\r\n')
+        elif route == 'close':
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.wfile.write(body)
+            self.close_connection = True
+        else:
+            if route == 'gzip':
+                body = gzip.compress(body)
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # NOTE: the client may give up (e.g. time out) before the response
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def http_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.requests = collections.Counter()
+    server.versions = collections.Counter()
+    server.not_modified = 0
+    server.capacity = 3
+    server.serving = 0
+    server.throttled = 0
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
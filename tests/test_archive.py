@@ -0,0 +1,123 @@
+import gzip
+import json
+import os
+import typing
+import jsonschema_inference
+from jsonschema_inference.inference import APIInferenceEngine
+from jsonschema_inference.inference.api import JsonlSaver, SchemaReducer
+from jsonschema_inference.inference.archive import ArchiveWriter, archive_paths
+from jsonschema_inference.inference.http_cache import CachedSchema
+from jsonschema_inference.inference.index_store import SQLiteIndexStore
+from jsonschema_inference import fit
+
+
+def _read(paths, compression=None):
+    lines = []
+    for path in paths:
+        with (gzip.open(path) if compression == 'gzip' else open(path, 'rb')) as f:
+            lines.extend(json.loads(line) for line in f)
+    return lines
+
+
+def test_archive_writer(tmp_path):
+    jsons = [{'id': i, 'name': 'x' * (i % 7)} for i in range(1000)]
+    for compression in [None, 'gzip']:
+        path = str(tmp_path / f'{compression}.jsonl')
+        for rotate_bytes in [None, 2000]:
+            for run in range(2):
+                writer = ArchiveWriter(path, compression=compression,
+                                       rotate_bytes=rotate_bytes, buffer_bytes=500)
+                for json_dict in jsons[run * 500:(run + 1) * 500]:
+                    writer.write(json_dict)
+                writer.close()
+                writer.close()
+                assert writer.written == 500
+            paths = archive_paths(path, rotated=rotate_bytes is not None)
+            # appended by the second run
+            assert _read(paths, compression) == jsons
+            if rotate_bytes is not None:
+                assert len(paths) > 1
+                assert os.path.basename(paths[1]) == f'{compression}.00001.jsonl'
+                # the shards end at line breaks, at the first chunk reaching the size
+                assert all(os.path.getsize(p) < rotate_bytes + 1000 for p in paths)
+                assert _read(paths[1:2], compression)
+            for p in paths:
+                os.remove(p)
+        # the jsons enqueued are durable once flushed (before the buffer is full)
+        writer = ArchiveWriter(path, compression=compression, buffer_bytes=1 << 20)
+        for json_dict in jsons[:10]:
+            writer.write(json_dict)
+        writer.flush()
+        assert writer.written == 10 and _read([path], compression) == jsons[:10]
+        writer.write(jsons[10])
+        writer.close()
+        assert _read([path], compression) == jsons[:11]
+        os.remove(path)
+
+
+def test_api_inference_archive(http_server, tmp_path, monkeypatch):
+    jsonschema_inference.init()
+    monkeypatch.chdir(tmp_path)
+
+    class Engine(APIInferenceEngine):
+        def index_generator(self) -> typing.Iterable[str]:
+            return map(str, range(self.index_count))
+
+        def get_url(self, index: str) -> str:
+            return f'{http_server.url}/json/{index}'
+
+        def is_valid_json(self, json_dict: typing.Dict) -> bool:
+            return True
+
+    for index_count in [50, 80]:
+        engine = Engine(api_thread_cnt=4, inference_worker_cnt=1, json_per_worker=7,
+                        index_store='sqlite', jsonl_dump='archive.jsonl.gz',
+                        jsonl_compression='gzip')
+        engine.index_count = index_count
+        engine.get_schema(verbose=False)
+    # the jsons archived by the first run are kept
+    ids = sorted(json_dict['id'] for json_dict in _read(['archive.jsonl.gz'], 'gzip'))
+    assert ids == list(range(80))
+
+
+def test_archive_before_checkpoint(tmp_path):
+    jsonschema_inference.init()
+    jsons = [{'id': i} for i in range(5)]
+    archive_path = str(tmp_path / 'archive.jsonl')
+    saver = JsonlSaver(SQLiteIndexStore(str(tmp_path / 'jsonl_index.sqlite')),
+                       archieve_file_path=archive_path)
+    archived = []
+
+    def before_checkpoint():
+        saver.flush()
+        archived.append(len(_read([archive_path])))
+    reducer = SchemaReducer(None, dump_file_path=str(tmp_path / 'schema.pickle'),
+                            checkpoint_every_batches=2, before_checkpoint=before_checkpoint)
+    pipe = saver.save((json_dict, str(json_dict['id'])) for json_dict in jsons)
+    reducer.reduce((fit(json_dict), [index]) for json_dict, index in pipe)
+    # the jsons of the reduced batches are archived at each checkpoint
+    assert archived == [2, 4, 5]
+
+
+def test_archive_evicted_body(tmp_path):
+    jsonschema_inference.init()
+    archive_path = str(tmp_path / 'archive.jsonl')
+    body_path = tmp_path / 'body'
+    body_path.write_bytes(b'{"id": 0}')
+    cached = [CachedSchema(fit({'id': i}), True, str(body_path if i == 0 else tmp_path / 'evicted'))
+              for i in range(3)]
+    refetched = []
+
+    def refetch(index):
+        refetched.append(index)
+        if index == '2':
+            raise OSError('unreachable')
+        return {'id': int(index)}
+    store = SQLiteIndexStore(str(tmp_path / 'jsonl_index.sqlite'))
+    saver = JsonlSaver(store, archieve_file_path=archive_path, refetch=refetch)
+    # the run goes on when a cached body is evicted: its json is downloaded again
+    assert len(list(saver.save((json, str(i)) for i, json in enumerate(cached)))) == 3
+    assert refetched == ['1', '2']
+    assert _read([archive_path]) == [{'id': 0}, {'id': 1}]
+    # the json failing to be downloaded is left unarchived
+    assert list(store.filter(['0', '1', '2'])) == ['2']
@@ -0,0 +1,82 @@
+import os
+from jsonschema_inference.inference.api import IndexCuckooFilter, SchemaReducer
+from jsonschema_inference.inference.checkpoint import (
+    DeltaLog, atomic_write, read_snapshot, write_snapshot
+)
+from jsonschema_inference import fit
+from jsonschema_inference.schema.inference.reduce import reduce_schema
+import jsonschema_inference
+
+
+def test_snapshot_and_delta_log(tmp_path):
+    path = str(tmp_path / 'dump')
+    atomic_write(path, b'legacy')
+    assert read_snapshot(path) == (0, b'legacy')
+    write_snapshot(path, 7, b'payload')
+    assert read_snapshot(path) == (7, b'payload')
+    # no temporary file is left
+    assert os.listdir(tmp_path) == ['dump']
+    log = DeltaLog(path + '.log')
+    log.open(1)
+    log.append(b'a')
+    log.append(b'bc')
+    log.open(2)
+    log.append(b'd' * 100)
+    log.close()
+    assert log.segments() == [1, 2]
+    assert list(log.read(1)) == [b'a', b'bc']
+    # a record torn by a crash ends the segment
+    with open(log.segment_path(2), 'r+b') as f:
+        f.truncate(50)
+    assert list(log.read(2)) == []
+    with open(log.segment_path(1), 'ab') as f:
+        f.write(b'\x05\x00\x00\x00garbage')
+    assert list(log.read(1)) == [b'a', b'bc']
+    log.remove(1)
+    assert log.segments() == [2]
+
+
+def test_schema_reducer_recovery(tmp_path):
+    jsonschema_inference.init()
+    cuckoo_dump = str(tmp_path / 'cuckoo.pickle')
+    schema_dump = str(tmp_path / 'schema.pickle')
+
+    def indices():
+        return map(str, range(100))
+
+    def batches(start, end):
+        for i in range(start, end, 10):
+            jsons = [{'id': j, 'tags': ['x'] * (j % 3)} for j in range(i, i + 10)]
+            yield reduce_schema(map(fit, jsons)), list(map(str, range(i, i + 10)))
+
+    def build():
+        index_filter = IndexCuckooFilter(indices, dump_file_path=cuckoo_dump)
+        reducer = SchemaReducer(
+            index_filter, dump_file_path=schema_dump,
+            checkpoint_every_batches=1, compact_bytes=200)
+        return index_filter, reducer
+
+    index_filter, reducer = build()
+    reducer.reduce(batches(0, 50))
+    reducer._compaction.join()
+    expected = reducer.union_schema
+    # crashed without saving: recovered from the snapshots and the log
+    index_filter, reducer = build()
+    assert reducer.union_schema is expected
+    assert list(index_filter.filter(indices())) == list(map(str, range(50, 100)))
+    reducer.reduce(batches(50, 70))
+    # a torn record of the last batch is lost (and inferenced again)
+    segment = reducer._log.segment_path(reducer._log.seq)
+    reducer._log.close()
+    with open(segment, 'r+b') as f:
+        f.truncate(os.path.getsize(segment) - 1)
+    index_filter, reducer = build()
+    assert list(index_filter.filter(indices())) == list(map(str, range(60, 100)))
+    reducer.reduce(batches(60, 100))
+    reducer.save()
+    assert reducer._log.segments() == []
+    index_filter, reducer = build()
+    assert list(index_filter.filter(indices())) == []
+    # the same as reducing the batches in one go
+    assert reducer.union_schema is reduce_schema(
+        schema for schema, _ in batches(0, 100))
@@ -0,0 +1,36 @@
+import pytest
+from jsonschema_inference.inference.decoders import DECODERS, available_decoders, get_decoder
+import jsonschema_inference
+
+
+def test_get_decoder():
+    jsonschema_inference.init()
+    assert 'json' in available_decoders()
+    for name in ['auto'] + list(DECODERS):
+        loads = get_decoder(name)
+        assert loads(b'{"a": [1, 2.5, "x", null, true]}') == {
+            'a': [1, 2.5, 'x', None, True]}
+        assert loads('{"b": {}}') == {'b': {}}
+    with pytest.raises(AssertionError):
+        get_decoder('yaml')
+
+
+def test_decoder_from_config():
+    jsonschema_inference.init(decoder='json')
+    assert get_decoder() is get_decoder('json')
+    jsonschema_inference.init()
+
+
+def test_fallback_to_json(monkeypatch):
+    from jsonschema_inference.inference import decoders
+
+    def not_installed():
+        raise ImportError
+
+    monkeypatch.setitem(decoders.DECODERS, 'ujson', not_installed)
+    decoders._load.cache_clear()
+    try:
+        assert 'ujson' not in available_decoders()
+        assert get_decoder('ujson') is get_decoder('json')
+    finally:
+        decoders._load.cache_clear()
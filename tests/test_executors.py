@@ -0,0 +1,40 @@
+import pytest
+from jsonschema_inference.inference.executors import EXECUTORS, get_executor
+from jsonschema_inference.inference.pipeline import bounded_imap_unordered
+from jsonschema_inference.inference import APIInferenceEngine
+from jsonschema_inference.schema.inference.reduce import reduce_schema
+from jsonschema_inference.schema.objs import Record, Atomic, Optional, Union
+import jsonschema_inference
+
+
+@pytest.mark.parametrize('name', EXECUTORS)
+def test_executors(name):
+    if name == 'ray':
+        pytest.importorskip('ray')
+    jsonschema_inference.init()
+    json_index_batches = [
+        [({'id': i, 'name': None if i % 3 else 'x'}, str(i)) for i in range(start, start + 10)]
+        for start in range(0, 100, 10)]
+    with get_executor(name, 2) as pool:
+        results = list(bounded_imap_unordered(
+            pool, APIInferenceEngine._pr_run, json_index_batches, max_pending=3))
+    assert sorted(index for _, indices in results for index in indices) == sorted(map(str, range(100)))
+    assert reduce_schema(schema for schema, _ in results) == Record(
+        {'id': Atomic(int), 'name': Optional(Atomic(str))})
+    with pytest.raises(AssertionError):
+        get_executor('unknown', 2)
+
+
+@pytest.mark.parametrize('name', EXECUTORS)
+def test_executors_config(name):
+    if name == 'ray':
+        pytest.importorskip('ray')
+    jsonschema_inference.init(equivalence_mode='label')
+    try:
+        with get_executor(name, 2) as pool:
+            results = list(bounded_imap_unordered(
+                pool, APIInferenceEngine._pr_run, [[({'a': 1}, '1'), ({'b': 1}, '2')]], max_pending=1))
+    finally:
+        jsonschema_inference.init()
+    assert [schema for schema, _ in results] == [
+        Union({Record({'a': Atomic(int)}), Record({'b': Atomic(int)})})]
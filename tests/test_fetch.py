@@ -0,0 +1,125 @@
+import typing
+import threading
+import time
+import pytest
+from jsonschema_inference.inference import APIInferenceEngine
+from jsonschema_inference.inference import AsyncFetcher
+from jsonschema_inference.inference.fetch import HTTPError
+from jsonschema_inference.schema.objs import Record, Array, Atomic
+import jsonschema_inference
+
+
+def _fetch(fetcher, urls):
+    return sorted(fetcher.fetch_all((url, i) for i, url in enumerate(urls)),
+                  key=lambda x: x[1])
+
+
+def test_async_fetcher(http_server):
+    fetcher = AsyncFetcher(max_in_flight=8, limit_per_host=2, backoff=0.01)
+    for route in ['json', 'chunked', 'gzip', 'close', 'flaky']:
+        urls = [f'{http_server.url}/{route}/{n}' for n in range(20)]
+        results = _fetch(fetcher, urls)
+        assert [json['id'] for json, _ in results] == list(range(20))
+        assert all(json['route'] == route for json, _ in results)
+    # failed requests are retried
+    assert http_server.requests['/flaky/0'] == 2
+    # keep-alive connections are reused (except for /close)
+    assert http_server.connections <= 4 * 2 + 20 + 2 * 3
+    assert fetcher.connections_opened == http_server.connections
+
+
+def test_async_fetcher_errors(http_server):
+    fetcher = AsyncFetcher(timeout=0.2, retries=1, backoff=0.01)
+    with pytest.raises(Exception):
+        _fetch(fetcher, [f'{http_server.url}/slow/1'])
+    assert http_server.requests['/slow/1'] == 2
+    fetcher = AsyncFetcher(retries=0)
+    with pytest.raises(HTTPError):
+        _fetch(fetcher, [f'{http_server.url}/flaky/1'])
+    # the consumer stopping early stops the downloading
+    results = fetcher.fetch_all(
+        (f'{http_server.url}/json/{n}', n) for n in range(1000))
+    next(results)
+    results.close()
+    assert sum(http_server.requests.values()) < 1000
+
+
+def test_async_fetcher_statuses(http_server):
+    fetcher = AsyncFetcher(max_in_flight=8, limit_per_host=2, retries=0)
+    urls = [f'{http_server.url}/{route}/{n}' for n in range(5) for route in ['redirect', 'missing']]
+    results = _fetch(fetcher, urls)
+    # redirects are followed, and the missing urls are skipped
+    assert [json['route'] for json, _ in results] == ['json'] * 5
+    assert [json['id'] for json, _ in results] == list(range(5))
+    assert fetcher.errors == {404: 5}
+    # the wait for a connection to the host does not count in the timeout
+    fetcher = AsyncFetcher(limit_per_host=1, timeout=0.15, retries=0)
+    results = _fetch(fetcher, [f'{http_server.url}/delayed/{n}' for n in range(8)])
+    assert len(results) == 8
+
+
+def test_async_fetcher_blocking_index_pipe(http_server):
+    fetcher = AsyncFetcher()
+    first_done = threading.Event()
+
+    def url_index_pipe():
+        yield f'{http_server.url}/json/0', 0
+        # NOTE: blocks until the first json is consumed
+        assert first_done.wait(5)
+        yield f'{http_server.url}/json/1', 1
+    start = time.monotonic()
+    indices = []
+    for _, index in fetcher.fetch_all(url_index_pipe()):
+        indices.append(index)
+        first_done.set()
+    assert indices == [0, 1]
+    assert time.monotonic() - start < 2
+
+
+def test_api_inference_with_async_fetcher(http_server, tmp_path):
+    jsonschema_inference.init()
+
+    class Engine(APIInferenceEngine):
+        def index_generator(self) -> typing.Iterable[str]:
+            return map(str, range(50))
+
+        def get_url(self, index: str) -> str:
+            return f'{http_server.url}/json/{index}'
+
+        def is_valid_json(self, json_dict: typing.Dict) -> bool:
+            return True
+
+    engine = Engine(
+        inference_worker_cnt=1, json_per_worker=7,
+        cuckoo_dump=str(tmp_path / 'cuckoo.pickle'),
+        schema_dump=str(tmp_path / 'schema.pickle'),
+        async_fetcher=AsyncFetcher(max_in_flight=10))
+    schema = engine.get_schema(verbose=False)
+    assert schema == Record({'id': Atomic(int), 'route': Atomic(str),
+                             'tags': Array(Atomic(str))})
+
+
+def test_api_inference_skips_error_statuses(http_server, tmp_path):
+    jsonschema_inference.init()
+
+    class Engine(APIInferenceEngine):
+        def index_generator(self) -> typing.Iterable[str]:
+            return map(str, range(10))
+
+        def get_url(self, index: str) -> str:
+            route = 'missing' if int(index) % 2 else 'json'
+            return f'{http_server.url}/{route}/{index}'
+
+        def is_valid_json(self, json_dict: typing.Dict) -> bool:
+            return True
+
+    engine = Engine(
+        inference_worker_cnt=1, json_per_worker=3, api_thread_cnt=2,
+        cuckoo_dump=str(tmp_path / 'cuckoo.pickle'),
+        schema_dump=str(tmp_path / 'schema.pickle'))
+    schema = engine.get_schema(verbose=False)
+    # the bodies of the 404 responses are neither decoded nor counted
+    assert schema == Record({'id': Atomic(int), 'route': Atomic(str),
+                             'tags': Array(Atomic(str))})
+    assert engine.metrics.counter['json'] == 5
+    assert engine.metrics.counter['fetch_error'] == 5
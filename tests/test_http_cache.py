@@ -0,0 +1,86 @@
+import json
+import typing
+import pytest
+import jsonschema_inference
+from jsonschema_inference import fit
+from jsonschema_inference.inference import APIInferenceEngine, AsyncFetcher, ResponseCache
+from jsonschema_inference.inference.http_cache import FittedJson, fetch_cached
+from jsonschema_inference.schema.inference.reduce import reduce_schema
+
+
+def test_response_cache(tmp_path):
+    jsonschema_inference.init()
+    cache = ResponseCache(str(tmp_path / 'cache'), max_bytes=30)
+    assert cache.validators('http://a') == dict()
+    cache.store('http://a', {'ETag': '"1"'}, b'{"a": 1}', {'a': 1})
+    # not cached without validators
+    cache.store('http://b', dict(), b'{"b": 1}', {'b': 1})
+    cache.store('http://c', {'Last-Modified': 'x'}, b'{"a": 1}', {'a': 1})
+    assert cache.validators('http://a') == {'If-None-Match': '"1"'}
+    assert cache.validators('http://b') == dict()
+    assert cache.validators('http://c') == {'If-Modified-Since': 'x'}
+    cached = cache.hit('http://c')
+    assert cached.schema is fit({'a': 1}) and cached.valid and cached.load() == {'a': 1}
+    assert cache.stats().size == 8
+    cache.invalidate('http://a')
+    assert not cache.hit('http://a').valid
+    # the least recently used bodies are evicted
+    cache.store('http://d', {'ETag': '"2"'}, b'{"d": "' + b'x' * 20 + b'"}', {'d': 'x'})
+    assert cache.hit('http://a') is None and cache.validators('http://c') == dict()
+    stats = cache.stats()
+    assert stats == (6, 2, 4, 1, 29) and stats.hit_rate == 2 / 6
+    # the schemas fitted under another config are not reused, but fitted again
+    jsonschema_inference.init(unify_records=False)
+    assert cache.hit('http://d') is None
+    schema = cache.store('http://d', {'ETag': '"2"'}, b'{"d": "' + b'x' * 20 + b'"}', {'d': 'x'})
+    assert schema is fit({'d': 'x'}) and cache.hit('http://d').schema is schema
+    jsonschema_inference.init()
+    cache.close()
+    # the downloaded jsons are passed on with the schema fitted when cached
+    cache = ResponseCache(str(tmp_path / 'cache'))
+    fetched = fetch_cached(cache, 'http://e', lambda url, headers: (200, {'ETag': '"3"'}, b'[1]'),
+                           json.loads)
+    assert fetched == FittedJson([1], fit([1])) and cache.hit('http://e').schema is fetched.schema
+    assert fetch_cached(cache, 'http://f', lambda url, headers: (200, dict(), b'[1]'),
+                        json.loads) == [1]
+    cache.close()
+
+
+@pytest.mark.parametrize('fetcher', ['threads', 'async'])
+def test_api_inference_response_cache(http_server, tmp_path, fetcher):
+    jsonschema_inference.init()
+    routes = ['etag', 'modified', 'json']
+
+    class Engine(APIInferenceEngine):
+        def index_generator(self) -> typing.Iterable[str]:
+            return map(str, range(90))
+
+        def get_url(self, index: str) -> str:
+            return f'{http_server.url}/{routes[int(index) % 3]}/{index}'
+
+        def is_valid_json(self, json_dict: typing.Dict) -> bool:
+            return json_dict['id'] % 10 != 1
+
+    def expected():
+        jsons = [{'id': n, 'route': routes[n % 3],
+                  'tags': ['x'] * ((n + http_server.versions[n]) % 3)}
+                 for n in range(90) if n % 10 != 1]
+        return reduce_schema(map(fit, jsons))
+
+    cache = ResponseCache(str(tmp_path / 'cache'))
+    for run in range(2):
+        # NOTE: a new index store downloads all the jsons again (a refresh)
+        engine = Engine(
+            api_thread_cnt=4, inference_worker_cnt=1, json_per_worker=7,
+            async_fetcher=AsyncFetcher() if fetcher == 'async' else None,
+            schema_dump=str(tmp_path / f'schema{run}.pickle'), index_store='sqlite',
+            cuckoo_dump=str(tmp_path / f'index{run}.sqlite'), response_cache=cache)
+        assert engine.get_schema(verbose=False) is expected()
+        assert engine.counter['valid_json'] == 81
+        # the jsons of 10 urls with validators are changed (one of them, 0, was invalid)
+        for n in range(0, 60, 6):
+            http_server.versions[n] += 1
+    # 60 urls with validators, 10 changed
+    assert http_server.not_modified == 50
+    assert cache.stats()[:3] == (180, 50, 130)
+    cache.close()
@@ -0,0 +1,48 @@
+from jsonschema_inference.inference.api import SchemaReducer
+from jsonschema_inference.inference.index_store import SQLiteIndexStore
+from jsonschema_inference import fit
+import jsonschema_inference
+
+
+def test_sqlite_index_store(tmp_path):
+    path = str(tmp_path / 'index.sqlite')
+    store = SQLiteIndexStore(path, write_batch_size=3, filter_batch_size=4)
+    for index in ['1', '3', '5', '7']:
+        store.remove(index)
+    # buffered or written, the processed indices are filtered out
+    assert list(store.filter(map(str, range(10)))) == ['0', '2', '4', '6', '8', '9']
+    assert not store.contains('7') and not store.contains('1') and store.contains('2')
+    store.remove('1')
+    assert len(store) == 4
+    store.seq = 5
+    store.close()
+    store = SQLiteIndexStore(path)
+    assert store.seq == 5
+    assert list(store.filter(map(str, range(10)))) == ['0', '2', '4', '6', '8', '9']
+    store.remove('0')
+    # not committed: lost on a crash
+    store._flush()
+    store._connection.close()
+    assert len(SQLiteIndexStore(path)) == 4
+
+
+def test_sqlite_index_store_recovery(tmp_path):
+    jsonschema_inference.init()
+    path = str(tmp_path / 'index.sqlite')
+    schema_dump = str(tmp_path / 'schema.pickle')
+
+    def batches(start, end):
+        for i in range(start, end):
+            yield fit({'id': i}), [str(i)]
+
+    store = SQLiteIndexStore(path)
+    reducer = SchemaReducer(store, dump_file_path=schema_dump,
+                            checkpoint_every_batches=3, compact_bytes=100)
+    reducer.reduce(batches(0, 10))
+    reducer._compaction.join()
+    store._connection.close()
+    # crashed without saving
+    store = SQLiteIndexStore(path)
+    reducer = SchemaReducer(store, dump_file_path=schema_dump)
+    assert reducer.union_schema is fit({'id': 1})
+    assert list(store.filter(map(str, range(12)))) == ['10', '11']
@@ -0,0 +1,265 @@
+import json
+import random
+import pytest
+from jsonschema_inference.inference import JsonlInferenceEngine
+from jsonschema_inference.inference.incremental import load_state
+from jsonschema_inference.inference.jsonl import get_schema_of_range
+from jsonschema_inference.inference.reader import iter_lines, sample_lines, split_byte_ranges, ValueReader
+from jsonschema_inference.schema.inference.reduce import reduce_schema
+from jsonschema_inference.schema.inference.sampling import reservoir_sample, signature
+from jsonschema_inference.schema.objs import Unknown
+from jsonschema_inference import fit
+import jsonschema_inference
+
+
+def _random_json(rng):
+    json_dict = {'id': rng.randrange(1000), 'name': rng.choice(['a', 'bb', None])}
+    if rng.random() < 0.3:
+        json_dict['tags'] = [rng.choice(['x', 1]) for _ in range(rng.randrange(4))]
+    if rng.random() < 0.2:
+        json_dict['meta'] = {'score': rng.random(), 'ok': rng.random() < 0.5}
+    return json_dict
+
+
+@pytest.fixture()
+def jsonl_path(tmp_path):
+    rng = random.Random(0)
+    path = tmp_path / 'test.jsonl'
+    with open(path, 'w') as f:
+        for _ in range(500):
+            f.write(json.dumps(_random_json(rng)) + '\n')
+    return str(path)
+
+
+def _engine(path, **kwargs):
+    class Engine(JsonlInferenceEngine):
+        @property
+        def jsonl_path(self):
+            return path
+    return Engine(**kwargs)
+
+
+def test_split_byte_ranges(jsonl_path):
+    with open(jsonl_path, 'rb') as f:
+        lines = f.readlines()
+    for split_count in [1, 2, 3, 7, 1000]:
+        byte_ranges = split_byte_ranges(jsonl_path, split_count)
+        assert len(byte_ranges) <= split_count
+        assert byte_ranges[0][0] == 0
+        assert byte_ranges[-1][1] == sum(map(len, lines))
+        read_lines = []
+        with open(jsonl_path, 'rb') as f:
+            for start, end in byte_ranges:
+                f.seek(start)
+                chunk = f.read(end - start)
+                assert chunk.endswith(b'\n')
+                read_lines.extend(chunk.splitlines(keepends=True))
+        assert read_lines == lines
+
+
+def test_parallel_inference(jsonl_path, tmp_path):
+    jsonschema_inference.init()
+    expected = _engine(jsonl_path, inference_worker_cnt=1).get_schema(verbose=False)
+    start, end = split_byte_ranges(jsonl_path, 1)[0]
+    assert get_schema_of_range(jsonl_path, start, end, verbose=False) == expected
+    result = _engine(jsonl_path, inference_worker_cnt=3).get_schema(verbose=False)
+    assert set(result._content.keys()) == set(expected._content.keys())
+    assert get_schema_of_range(jsonl_path, verbose=True) == expected
+    empty_path = tmp_path / 'empty.jsonl'
+    empty_path.write_text('')
+    assert _engine(str(empty_path), inference_worker_cnt=3).get_schema(
+        verbose=False) == Unknown()
+
+
+def test_iter_lines(jsonl_path, tmp_path):
+    class Progress:
+        n = 0
+
+        def update(self, n):
+            self.n += n
+
+    with open(jsonl_path, 'rb') as f:
+        lines = f.readlines()
+    progress = Progress()
+    assert list(iter_lines(jsonl_path, progress=progress,
+                progress_step=100)) == lines
+    assert progress.n == sum(map(len, lines))
+    start = len(lines[0])
+    end = start + len(lines[1]) + 1
+    assert list(iter_lines(jsonl_path, start, end)) == lines[1:3]
+    path = tmp_path / 'blank.jsonl'
+    path.write_bytes(b'{"a": 1}\n\n  \n{"a": 2}')
+    assert list(iter_lines(str(path))) == [b'{"a": 1}\n', b'{"a": 2}']
+    assert split_byte_ranges(str(path), 2) == [(0, 10), (10, 21)]
+
+
+def test_value_reader(tmp_path):
+    rng = random.Random(1)
+    jsons = [_random_json(rng) for _ in range(200)] + [{'name': 'é😀'}, 1, 'x', [None]]
+    array_path = tmp_path / 'array.json'
+    array_path.write_text(json.dumps(jsons, indent=1, ensure_ascii=False))
+    stream_path = tmp_path / 'stream.json'
+    stream_path.write_text(''.join(
+        json.dumps(data, ensure_ascii=False) + rng.choice(['', ' ', '\n'])
+        for data in jsons))
+    # small chunks split the values (and the utf-8 characters)
+    for chunk_size in [1, 7, 1 << 20]:
+        reader = ValueReader(str(array_path), array=True, chunk_size=chunk_size)
+        assert list(reader) == jsons
+        assert reader.begin == array_path.read_text().index('{')
+        assert reader.stop == array_path.stat().st_size
+        assert list(ValueReader(str(stream_path), chunk_size=chunk_size)) == jsons
+    # reading stops at the first value beginning at or after the end
+    reader = ValueReader(str(stream_path), end=10)
+    assert list(reader) == jsons[:1]
+    assert list(ValueReader(str(stream_path), start=reader.stop)) == jsons[1:]
+    # a value beginning is guessed if not aligned
+    reader = ValueReader(str(array_path), start=100, array=True, aligned=False)
+    assert list(reader) == jsons[-len(list(reader)):]
+    # the guessed beginnings of scalars agree with the stops of the previous ranges
+    scalars = [rng.choice([rng.randint(-10 ** 6, 10 ** 6), rng.random(), 'a, b 12', True, None])
+               for _ in range(500)]
+    scalar_array_path = tmp_path / 'scalar_array.json'
+    scalar_array_path.write_text(json.dumps(scalars))
+    scalar_stream_path = tmp_path / 'scalar_stream.json'
+    scalar_stream_path.write_text('\n'.join(map(json.dumps, scalars)))
+    for path, array in [(scalar_array_path, True), (scalar_stream_path, False)]:
+        values = []
+        stop = 0
+        size = path.stat().st_size
+        offsets = [size * i // 7 for i in range(8)]
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            reader = ValueReader(str(path), start=start, end=end, array=array, aligned=start == 0)
+            values.extend(reader)
+            assert reader.begin is None or start == 0 or reader.begin == stop
+            stop = reader.stop
+        assert values == scalars
+    # the numbers split by the chunks (e.g. right after `12.`) are decoded whole
+    numbers = [12.5, -3.25e-7, 1e10, 7, -0.5E+3, 'x', 100] * 5
+    number_array_path = tmp_path / 'numbers.json'
+    number_array_path.write_text(json.dumps(numbers))
+    number_stream_path = tmp_path / 'numbers_stream.json'
+    number_stream_path.write_text(' '.join(map(json.dumps, numbers)))
+    for chunk_size in range(1, 12):
+        assert list(ValueReader(str(number_array_path), array=True, chunk_size=chunk_size)) == numbers
+        assert list(ValueReader(str(number_stream_path), chunk_size=chunk_size)) == numbers
+    long_path = tmp_path / 'long.json'
+    long_path.write_text(json.dumps(['x' * (2 ** 20 - 8), 12.5, 3]))
+    assert list(ValueReader(str(long_path), array=True)) == ['x' * (2 ** 20 - 8), 12.5, 3]
+    empty_path = tmp_path / 'empty.json'
+    empty_path.write_text(' [ ] ')
+    assert list(ValueReader(str(empty_path), array=True)) == []
+    with pytest.raises(ValueError):
+        list(ValueReader(str(stream_path), array=True))
+
+
+def test_values_inference(tmp_path):
+    jsonschema_inference.init()
+    rng = random.Random(2)
+    jsons = [_random_json(rng) for _ in range(500)]
+    for data in jsons[::3]:
+        # misleading beginnings of values
+        data['name'] = '}, {"bad": 1} {"bad": 2}, {'
+    expected = reduce_schema(fit(data) for data in jsons)
+    array_path = tmp_path / 'array.json'
+    array_path.write_text(json.dumps(jsons))
+    stream_path = tmp_path / 'stream.json'
+    stream_path.write_text(' '.join(map(json.dumps, jsons)))
+    for worker_cnt in [1, 3, 16]:
+        result = _engine(str(array_path), inference_worker_cnt=worker_cnt,
+                         input_format='array').get_schema(verbose=False)
+        assert set(result._content.keys()) == set(expected._content.keys())
+        result = _engine(str(stream_path), inference_worker_cnt=worker_cnt,
+                         input_format='stream').get_schema(verbose=False)
+        assert set(result._content.keys()) == set(expected._content.keys())
+    with pytest.raises(AssertionError):
+        _engine(str(array_path), engine='python', input_format='array')
+
+
+def test_sampling_and_convergence(jsonl_path, tmp_path):
+    jsonschema_inference.init()
+    lines = list(iter_lines(jsonl_path))
+    sample = list(sample_lines(jsonl_path, 50, random.Random(0)))
+    assert 40 <= len(sample) <= 50
+    assert len(set(sample)) == len(sample) and set(sample) <= set(lines)
+    assert list(sample_lines(jsonl_path, 10 ** 6, random.Random(0))) == lines
+    sample = reservoir_sample(range(1000), 100, random.Random(0))
+    assert len(set(sample)) == 100 and set(sample) <= set(range(1000))
+    assert reservoir_sample(range(10), 100) == list(range(10))
+    for sampling in ['offset', 'reservoir']:
+        engine = _engine(jsonl_path, inference_worker_cnt=1, sampling=sampling,
+                         sample_size=100, seed=0)
+        schema = engine.get_schema(verbose=False)
+        assert 80 <= engine.documents_seen <= 100
+        assert schema._content.keys() <= {'id', 'name', 'tags', 'meta'}
+    # the key counters change, but not the structure
+    schemas = [fit({'a': 1}), fit({'b': 1})]
+    merged = schemas[0] | schemas[1]
+    assert signature(merged) == signature(merged | schemas[0])
+    assert signature(merged) != signature(merged | fit({'a': None}))
+    path = tmp_path / 'same.jsonl'
+    with open(path, 'w') as f:
+        for i in range(10000):
+            f.write(json.dumps({'id': i, 'name': str(i)}) + '\n')
+    for worker_cnt in [1, 2]:
+        engine = _engine(str(path), inference_worker_cnt=worker_cnt, converge_after=3)
+        assert engine.get_schema(verbose=False) is fit({'id': 1, 'name': 'a'})
+        # the first batch changes the schema, the next 3 do not
+        assert engine.documents_seen == worker_cnt * 4000
+    engine = _engine(str(path), inference_worker_cnt=1)
+    engine.get_schema(verbose=False)
+    assert engine.documents_seen == 10000
+
+
+def test_incremental_inference(tmp_path):
+    jsonschema_inference.init()
+    path = tmp_path / 'append.jsonl'
+    state_path = str(tmp_path / 'append.state')
+    jsons = [{'id': i, 'name': str(i)} for i in range(300)]
+    jsons += [{'id': i, 'tags': [i]} for i in range(300)]
+    for worker_cnt in [1, 2]:
+        with open(path, 'w') as f:
+            for json_dict in jsons[:200]:
+                f.write(json.dumps(json_dict) + '\n')
+            # a line being appended is left for the next run
+            f.write('{"id": 20')
+        engine = _engine(str(path), inference_worker_cnt=worker_cnt, state_path=state_path)
+        assert engine.get_schema(verbose=False) is reduce_schema(map(fit, jsons[:200]))
+        assert engine.rebuilt
+        assert engine.documents_seen == 200
+        with open(path, 'a') as f:
+            f.write('0, "name": "200"}\n')
+            for json_dict in jsons[201:]:
+                f.write(json.dumps(json_dict) + '\n')
+        engine = _engine(str(path), inference_worker_cnt=worker_cnt, state_path=state_path)
+        schema = engine.get_schema(verbose=False)
+        assert not engine.rebuilt
+        assert engine.documents_seen == 400
+        # NOTE: the DynamicRecord key counters depend on how the jsons are grouped
+        assert signature(schema) == signature(reduce_schema(map(fit, jsons)))
+        assert engine.get_schema(verbose=False) is schema
+        assert engine.documents_seen == 0
+        # the prefix changed: inferenced from scratch
+        with open(path, 'r+') as f:
+            f.write('{"id": 0, "name": 0.0}')
+        for verify_prefix in ['sample', 'full']:
+            engine = _engine(str(path), inference_worker_cnt=worker_cnt,
+                             state_path=state_path, verify_prefix=verify_prefix)
+            changed = [{'id': 0, 'name': 0.0}] + jsons[1:]
+            assert signature(engine.get_schema(verbose=False)) == signature(reduce_schema(map(fit, changed)))
+            assert engine.rebuilt == (verify_prefix == 'sample')
+        # an unreadable state file (truncated, or of an older version): inferenced from scratch
+        with open(state_path, 'rb') as f:
+            data = f.read()
+        header_end = data.index(b'\n')
+        header = json.loads(data[:header_end])
+        del header['documents']
+        old_schema = data[:header_end + 4] + b'\x01' + data[header_end + 5:]
+        for broken in [data[:header_end // 2], data[:-3], json.dumps(header).encode() + data[header_end:],
+                       old_schema, b'[]\n']:
+            with open(state_path, 'wb') as f:
+                f.write(broken)
+            assert load_state(state_path) is None
+            engine = _engine(str(path), inference_worker_cnt=worker_cnt, state_path=state_path)
+            engine.get_schema(verbose=False)
+            assert engine.rebuilt and engine.documents_seen == 600
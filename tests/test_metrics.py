@@ -0,0 +1,80 @@
+import json
+import time
+import typing
+import urllib.request
+import jsonschema_inference
+from jsonschema_inference.inference import APIInferenceEngine, JsonlInferenceEngine, Metrics
+
+
+def test_metrics(tmp_path):
+    metrics = Metrics(report_path=str(tmp_path / 'report.json'),
+                      snapshot_path=str(tmp_path / 'snapshots.jsonl'), interval=0.05, port=0)
+    metrics.start(workers=2)
+    lines = list(metrics.count(map(str, range(2500)), 'lines', size=len, activity='io'))
+    assert len(lines) == 2500
+    slow = metrics.timed(lambda x: time.sleep(0.01) or x, 'decode')
+    assert metrics.consume(lambda items: [slow(item) for item in items], range(3), 'fit') == [0, 1, 2]
+    metrics.merge({'counter': {'lines': 10}, 'bytes': {'lines': 20}, 'seconds': {'fit': 0.5},
+                   'peak_rss': 1 << 50})
+    metrics.gauge('queue').set(3)
+    metrics.gauge('queue').set(1)
+    time.sleep(0.15)
+    with urllib.request.urlopen(f'http://127.0.0.1:{metrics.port}/metrics') as response:
+        text = response.read().decode()
+    assert 'jsonschema_inference_items_total{stage="lines"} 2510' in text
+    assert 'jsonschema_inference_queue_depth{queue="queue"} 1' in text
+    metrics.stop()
+    with open(tmp_path / 'report.json') as f:
+        report = json.load(f)
+    assert report['stages']['lines']['items'] == 2510
+    assert report['stages']['lines']['bytes'] == sum(map(len, lines)) + 20
+    assert report['seconds']['decode'] >= 0.03 and report['seconds']['fit'] >= 0.53
+    assert report['queues'] == {'queue': {'depth': 1, 'peak': 3}}
+    assert 0 < report['utilization'] and report['peak_rss']['process'] > 0
+    # the largest peak RSS reported by the workers
+    assert report['peak_rss']['workers'] == 1 << 50
+    with open(tmp_path / 'snapshots.jsonl') as f:
+        assert len(f.readlines()) >= 2
+
+
+def test_pipeline_metrics(http_server, tmp_path):
+    jsonschema_inference.init()
+    path = tmp_path / 'test.jsonl'
+    with open(path, 'w') as f:
+        for i in range(500):
+            f.write(json.dumps({'id': i, 'tags': ['x'] * (i % 3)}) + '\n')
+
+    class Engine(JsonlInferenceEngine):
+        @property
+        def jsonl_path(self):
+            return str(path)
+    for worker_cnt in [1, 2]:
+        engine = Engine(inference_worker_cnt=worker_cnt)
+        engine.get_schema(verbose=False)
+        report = engine.metrics.report()
+        assert report['stages']['lines']['items'] == report['stages']['jsons']['items'] == 500
+        assert report['stages']['lines']['bytes'] == path.stat().st_size
+        assert report['seconds'].keys() >= {'io', 'decode', 'fit', 'reduce'}
+        assert report['workers'] == worker_cnt
+        assert report['peak_rss']['workers'] > 0 or worker_cnt == 1
+
+    class APIEngine(APIInferenceEngine):
+        def index_generator(self) -> typing.Iterable[str]:
+            return map(str, range(50))
+
+        def get_url(self, index: str) -> str:
+            return f'{http_server.url}/json/{index}'
+
+        def is_valid_json(self, json_dict: typing.Dict) -> bool:
+            return True
+
+    engine = APIEngine(api_thread_cnt=4, inference_worker_cnt=1, json_per_worker=7,
+                       cuckoo_dump=str(tmp_path / 'index.sqlite'), index_store='sqlite',
+                       schema_dump=str(tmp_path / 'schema.pickle'))
+    engine.get_schema(verbose=False)
+    report = engine.metrics.report()
+    assert engine.counter == {'index': 50, 'json': 50, 'valid_json': 50, 'schema_batch': 8}
+    assert report['stages']['json']['bytes'] > 50 * 20
+    assert report['seconds'].keys() >= {'io', 'decode', 'fit', 'reduce', 'checkpoint'}
+    assert report['queues']['fetch_queue']['peak'] == 8
+    assert report['queues']['inference_queue']['peak'] >= 1
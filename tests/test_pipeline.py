@@ -0,0 +1,58 @@
+import collections
+import typing
+from multiprocessing.pool import ThreadPool
+import pytest
+from jsonschema_inference.inference import APIInferenceEngine
+from jsonschema_inference.inference.pipeline import bounded_imap_unordered, count
+from jsonschema_inference.schema.objs import Record, Array, Atomic
+import jsonschema_inference
+
+
+def test_bounded_imap_unordered():
+    taken = []
+
+    def items():
+        for i in range(100):
+            taken.append(i)
+            yield i
+    with ThreadPool(4) as pool:
+        results = []
+        for result in bounded_imap_unordered(pool, lambda x: x * 2, items(), max_pending=5):
+            # at most 5 items are taken but not yet yielded
+            assert len(taken) - len(results) <= 5
+            results.append(result)
+        assert sorted(results) == [i * 2 for i in range(100)]
+        with pytest.raises(ZeroDivisionError):
+            list(bounded_imap_unordered(pool, lambda x: 1 / x, range(3), max_pending=2))
+        assert list(bounded_imap_unordered(pool, abs, [], max_pending=1)) == []
+    counter: collections.Counter = collections.Counter()
+    assert list(count(range(3), counter, 'n')) == [0, 1, 2]
+    assert counter['n'] == 3
+
+
+@pytest.mark.parametrize('index_store', ['cuckoo', 'sqlite'])
+def test_api_inference_pipeline(http_server, tmp_path, index_store):
+    jsonschema_inference.init()
+
+    class Engine(APIInferenceEngine):
+        def index_generator(self) -> typing.Iterable[str]:
+            return map(str, range(200))
+
+        def get_url(self, index: str) -> str:
+            return f'{http_server.url}/json/{index}'
+
+        def is_valid_json(self, json_dict: typing.Dict) -> bool:
+            return json_dict['id'] % 10 != 0
+
+    engine = Engine(
+        api_thread_cnt=4, inference_worker_cnt=1, json_per_worker=7,
+        cuckoo_dump=str(tmp_path / 'cuckoo.pickle'),
+        schema_dump=str(tmp_path / 'schema.pickle'), index_store=index_store)
+    schema = engine.get_schema(verbose=False)
+    assert schema == Record({'id': Atomic(int), 'route': Atomic(str),
+                             'tags': Array(Atomic(str))})
+    assert engine.counter == {'index': 200, 'json': 200, 'valid_json': 180,
+                              'schema_batch': 26}
+    # the processed (or invalid) indices are not downloaded again
+    engine.get_schema(verbose=False)
+    assert engine.counter['index'] == 0
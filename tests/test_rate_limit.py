@@ -0,0 +1,76 @@
+import time
+import typing
+import pytest
+import jsonschema_inference
+from jsonschema_inference.inference import APIInferenceEngine, AsyncFetcher, RateController
+from jsonschema_inference.inference.fetch import HTTPError
+from jsonschema_inference.inference.rate_limit import parse_retry_after
+
+
+def test_rate_controller():
+    url = 'http://host/1'
+    controller = RateController(initial_window=2, max_window=4, retries=1, backoff=0.)
+    controller.acquire(url)
+    controller.acquire(url)
+    # the window is full
+    assert controller._try_acquire(url) > 0
+    for _ in range(2):
+        controller.release(url, 200, 0.01)
+    assert controller.metrics()['host'].window == pytest.approx(2.5 + 1 / 2.5)
+    controller.acquire(url)
+    controller.release(url, 429, 0.01, retry_after='1')
+    metrics = controller.metrics()['host']
+    assert metrics.window == pytest.approx((2.5 + 1 / 2.5) / 2)
+    assert (metrics.requests, metrics.throttled, metrics.in_flight) == (3, 1, 0)
+    # held until Retry-After
+    assert controller._try_acquire(url) > 0.9
+    assert controller._try_acquire('http://other/1') == 0
+    assert parse_retry_after('2') == 2
+    assert 59 < parse_retry_after(time.strftime(
+        '%a, %d %b %Y %H:%M:%S GMT', time.gmtime(time.time() + 61))) <= 61
+    # the token bucket caps the rate
+    controller = RateController(rate=20, burst=1)
+    start = time.monotonic()
+    for _ in range(5):
+        controller.acquire(url)
+        controller.release(url, 200, 0.)
+    assert time.monotonic() - start >= 0.15
+    # retries (requests are given up after them)
+    controller = RateController(retries=2, backoff=0.)
+    with pytest.raises(HTTPError):
+        controller.request(url, dict(), lambda url, headers: (503, dict(), b''))
+    metrics = controller.metrics()['host']
+    assert (metrics.requests, metrics.throttled, metrics.retries) == (3, 3, 2)
+
+
+@pytest.mark.parametrize('fetcher', ['threads', 'async'])
+def test_api_inference_rate_controller(http_server, tmp_path, fetcher):
+    jsonschema_inference.init()
+
+    class Engine(APIInferenceEngine):
+        def index_generator(self) -> typing.Iterable[str]:
+            return map(str, range(60))
+
+        def get_url(self, index: str) -> str:
+            return f'{http_server.url}/throttled/{index}'
+
+        def is_valid_json(self, json_dict: typing.Dict) -> bool:
+            return True
+
+    controller = RateController(initial_window=16, retries=20, backoff=0.01)
+    engine = Engine(
+        api_thread_cnt=16, inference_worker_cnt=1,
+        async_fetcher=AsyncFetcher(max_in_flight=16, limit_per_host=16, retries=20, backoff=0.01,
+                                   rate_controller=controller) if fetcher == 'async' else None,
+        rate_controller=controller if fetcher == 'threads' else None,
+        cuckoo_dump=str(tmp_path / 'index.sqlite'), index_store='sqlite',
+        schema_dump=str(tmp_path / 'schema.pickle'))
+    engine.get_schema(verbose=False)
+    # no json is dropped
+    assert engine.counter['valid_json'] == 60
+    metrics, = controller.metrics().values()
+    assert metrics.throttled == http_server.throttled > 0
+    assert metrics.retries == metrics.throttled
+    assert metrics.requests == 60 + metrics.retries
+    # the window shrinks toward the capacity of the server
+    assert metrics.window < 16 and metrics.in_flight == 0
@@ -0,0 +1,66 @@
+import random
+import pytest
+from jsonschema_inference.schema import InferenceEngine
+from jsonschema_inference.schema.columnar import fit_columnar
+from jsonschema_inference.schema.objs import Record, Array, Atomic, Optional, Union, Unknown
+from jsonschema_inference.schema.shape import ShapeCache, fit_batch
+import jsonschema_inference
+
+SCALARS = [None, True, 1, 1.5, 'a']
+
+
+def random_template(rng, depth=0):
+    x = rng.random()
+    if depth > 2 or x < 0.5:
+        return 'scalar'
+    elif x < 0.75:
+        return [random_template(rng, depth + 1)]
+    else:
+        return {f'k{i}': random_template(rng, depth + 1) for i in range(rng.randrange(4))}
+
+
+def random_json(rng, template):
+    if template == 'scalar':
+        return rng.choice(SCALARS)
+    elif isinstance(template, list):
+        return [random_json(rng, template[0]) for _ in range(rng.randrange(4))]
+    else:
+        return {key: random_json(rng, value) for key, value in template.items()}
+
+
+@pytest.mark.parametrize('unify_records', [True, False])
+def test_fit_columnar_as_fit_batch(unify_records):
+    jsonschema_inference.init(unify_records=unify_records)
+    rng = random.Random(0)
+    fitted = 0
+    for _ in range(500):
+        template = {f'c{i}': random_template(rng) for i in range(rng.randrange(1, 5))}
+        batch = [random_json(rng, template) for _ in range(rng.randrange(1, 8))]
+        schema = fit_columnar(batch)
+        if schema is not None:
+            fitted += 1
+            assert schema is fit_batch(batch, cache=ShapeCache(0))
+    assert fitted > 300
+
+
+def test_fit_columnar():
+    jsonschema_inference.init()
+    assert fit_columnar([{'a': 1, 'b': None}, {'b': 'x', 'a': 2}]) is \
+        Record({'a': Atomic(int), 'b': Optional(Atomic(str))})
+    # the contents of the arrays are merged first
+    assert fit_columnar([{'a': [1], 'b': 1}, {'a': ['x', None], 'b': 1}]) is \
+        Record({'a': Array(Optional(Union({Atomic(int), Atomic(str)}))), 'b': Atomic(int)})
+    assert fit_columnar([{'a': [], 'b': {}}]) is Record({'a': Array(Unknown()), 'b': Record({})})
+    # irregular batches
+    assert fit_columnar([]) is None
+    assert fit_columnar([[1], ['a', None]]) is Array(Optional(Union({Atomic(int), Atomic(str)})))
+    assert fit_columnar([[1], [None, {'a': 1}]]) is None
+    assert fit_columnar([{'a': 1}, {'b': 1}]) is None
+    assert fit_columnar([{'a': {'x': 1}}, {'a': {'x': 1}}]) is None
+    assert fit_columnar([{'a': None}, {'a': {'x': 1}}]) is None
+    # with DynamicRecords, the batch is fitted document by document
+    batch = [{'a': 1, 'b': 2}, {'a': 1}, {'a': 1, 'b': 2}]
+    assert InferenceEngine.get_schema(batch) is fit_batch(batch)
+    jsonschema_inference.init(columnar=False)
+    assert InferenceEngine.get_schema(batch) is fit_batch(batch)
+    jsonschema_inference.init()
@@ -1,4 +1,7 @@
 from jsonschema_inference.schema.objs import Record, Array, Atomic, Optional, Union, UniformRecord, Unknown
+from jsonschema_inference.schema.fitter import sampling_stats, reset_sampling_stats
+from jsonschema_inference.schema.inference.reduce import reduce_schema
+from jsonschema_inference.schema.shape import fingerprint
 from jsonschema_inference import fit
 import jsonschema_inference
 
@@ -38,3 +41,20 @@ def test_no_unify_records():
     assert fit(
         {'1': [{'a': 5, 'b': 6}], '2': [{'a': 34, 'b': None}]}
     ) == Record({'1': Array(Record({'a': Atomic(int), 'b': Atomic(int)})), '2': Array(Record({'a': Atomic(int), 'b': Atomic(None)}))})
+
+
+def test_fit_scalar_arrays():
+    jsonschema_inference.init()
+    # the same as fitting the elements one by one
+    for data in [[1, 'a', None, 2], [None, 1, 'a'], [True, 1, 1.5], ['a'] * 100]:
+        assert fit(data) is Array(reduce_schema(fit(e) for e in data))
+    assert fit([1, {'a': None}, [1]]) is Array(reduce_schema(
+        [Atomic(int), Record({'a': Atomic(None)}), Array(Atomic(int))]))
+    assert fingerprint(list(range(5)) + ['a', 'b', 1]) == (list, int, str, int)
+    reset_sampling_stats()
+    jsonschema_inference.init(array_sample_size=10)
+    assert fit(list(range(100)) + [1.5]) is Array(Atomic(int))
+    assert fit([list(range(10))]) is Array(Array(Atomic(int)))
+    assert sampling_stats() == (1, 101, 10)
+    jsonschema_inference.init()
+    assert fit(list(range(100)) + [1.5]) is Array(Union({Atomic(int), Atomic(float)}))
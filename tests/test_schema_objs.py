@@ -1,5 +1,6 @@
 import pytest
 import copy
+import pickle
 from collections import Counter
 from jsonschema_inference.schema.objs import Atomic, Array, Record, Union, Optional, UniformRecord, Unknown, DynamicRecord
 from jsonschema_inference.schema.inference.reduce import reduce_schema
@@ -179,3 +180,119 @@ def test_set(simple_int, simple_float, simple_none,
 def test_to_uniform_dict(int_float_dict, simple_int, simple_float):
     assert int_float_dict.to_uniform_dict() == UniformRecord(
         Union({simple_int, simple_float}))
+
+
+def test_merge_into(simple_int, simple_float, int_list, float_list):
+    jsonschema_inference.init()
+    # neither operand is changed by a merge
+    left = Record({'a': Atomic(int), 'b': Array(Atomic(int))})
+    right = Record({'a': Atomic(None), 'b': Array(Atomic(float))})
+    result = left.merge_into(right)
+    assert left == Record({'a': Atomic(int), 'b': Array(Atomic(int))})
+    assert right == Record({'a': Atomic(None), 'b': Array(Atomic(float))})
+    assert result == left | right
+    assert result == Record({'a': Optional(Atomic(int)), 'b': Array(
+        Union({Atomic(int), Atomic(float)}))})
+    # merging a schema that adds nothing returns the left schema itself
+    assert result.merge_into(left) is result
+    # sub-schemas of the right schema are reused without copying
+    nested = Array(Atomic(str))
+    acc = Record({'a': Atomic(int)})
+    acc |= Record({'a': Atomic(int), 'b': nested})
+    assert acc == DynamicRecord(
+        {'a': Atomic(int), 'b': Array(Atomic(str))}, Counter({'a': 2, 'b': 1}))
+    assert acc._content['b'] is nested
+    acc |= Record({'a': Atomic(int)})
+    assert acc._key_counter == Counter({'a': 3, 'b': 1})
+    # DynamicRecord counters are added up when merged with itself
+    assert (acc | acc)._key_counter == Counter({'a': 6, 'b': 2})
+    assert Array(acc) | Array(acc) == Array(acc | acc)
+    assert reduce_schema(map(lambda x: x, [])) == Unknown()
+
+
+def test_interning(complex_dict):
+    assert Atomic(int) is Atomic(int)
+    assert Record({'a': Atomic(int), 'b': Atomic(float)}) is Record(
+        {'b': Atomic(float), 'a': Atomic(int)})
+    assert Record({'a': Atomic(str), 'b': Optional(Atomic(int))}
+                  ) is complex_dict._content['c']
+    assert Union({Atomic(int), Atomic(float)}) is Union(
+        {Atomic(float), Atomic(int)})
+    assert Optional(Atomic(int)) is not Union({Atomic(None), Atomic(int)})
+    assert DynamicRecord({'a': Atomic(int)}, Counter({'a': 2})) is not DynamicRecord(
+        {'a': Atomic(int)}, Counter({'a': 3}))
+    assert hash(complex_dict) == hash(copy.deepcopy(complex_dict))
+    assert pickle.loads(pickle.dumps(complex_dict)) is complex_dict
+    dynamic = DynamicRecord({'a': Atomic(int), 'b': Array(Unknown())},
+                            Counter({'a': 4, 'b': 2}))
+    assert pickle.loads(pickle.dumps(dynamic)) is dynamic
+    assert pickle.loads(pickle.dumps(Optional(dynamic))) is Optional(dynamic)
+
+
+def test_reduce_strategies(simple_int, simple_float, int_list, float_list, complex_dict):
+    jsonschema_inference.init()
+    with pytest.raises(AssertionError):
+        reduce_schema([simple_int], strategy='unknown')
+    for strategy in ['fold', 'tree', 'dedupe']:
+        assert reduce_schema([], strategy=strategy) == Unknown()
+        assert reduce_schema(map(lambda x: x, []),
+                             strategy=strategy) == Unknown()
+        assert reduce_schema([simple_int], strategy=strategy) == simple_int
+        assert reduce_schema([int_list, float_list, int_list],
+                             strategy=strategy) == Array(Union({simple_int, simple_float}))
+        assert reduce_schema(iter([complex_dict] * 7),
+                             strategy=strategy) == complex_dict
+        records = [Record({'a': Atomic(int), 'b': Atomic(int)})] + \
+            [Record({'a': Atomic(int)}) | Record({'b': Atomic(int)})] * 6
+        assert reduce_schema(records, strategy=strategy) == DynamicRecord(
+            {'a': Atomic(int), 'b': Atomic(int)}, Counter({'a': 7, 'b': 7}))
+
+
+def test_accumulator():
+    import functools
+    import random
+    from jsonschema_inference import fit
+    from jsonschema_inference.schema.objs.accumulator import Accumulator
+    rng = random.Random(0)
+
+    def document(depth=0):
+        keys = rng.sample(['a', 'b', 'c', 'd'], rng.randint(0, 3))
+        values = [None, 1, 'x', 1.5]
+        if depth < 3:
+            values += [[document(depth + 1)], {'v': document(depth + 1)}]
+        return {key: rng.choice(values) for key in keys}
+    for mode in ['kind', 'label']:
+        jsonschema_inference.init(equivalence_mode=mode)
+        try:
+            schemas = [fit(document()) for _ in range(300)]
+            schemas += [reduce_schema(schemas[i:i + 5]) for i in range(0, 50, 5)]
+            schemas += [Optional(schema) for schema in schemas[:20]] + [Atomic(None)] * 3
+            rng.shuffle(schemas)
+            before = list(map(repr, schemas))
+            expected = functools.reduce(lambda acc, schema: acc.merge_into(schema), schemas, Unknown())
+            accumulator = Accumulator()
+            for schema in schemas:
+                accumulator.merge(schema)
+            assert accumulator.schema() is expected
+            assert reduce_schema(schemas) is expected
+            # NOTE: the interned schemas merged in place are left unchanged
+            assert list(map(repr, schemas)) == before
+            accumulator.merge(schemas[0], 10)
+            assert accumulator.schema() is functools.reduce(
+                lambda acc, schema: acc.merge_into(schema), [schemas[0]] * 10, expected)
+        finally:
+            jsonschema_inference.init()
+    dynamic = DynamicRecord({'a': Atomic(int)}, Counter({'a': 2}))
+    grown = DynamicRecord({'a': Atomic(int)}, Counter({'a': 3}))
+    for sequence in [[Optional(dynamic), dynamic, Optional(dynamic)],
+                     [Optional(dynamic), Record({'a': Atomic(int)}), Optional(grown), grown],
+                     [Array(dynamic), Array(dynamic), Atomic(None), Array(grown)]]:
+        accumulator = Accumulator()
+        for schema in sequence:
+            accumulator.merge(schema)
+        assert accumulator.schema() is functools.reduce(
+            lambda acc, schema: acc.merge_into(schema), sequence, Unknown())
+    with pytest.raises(TypeError):
+        dynamic._content['b'] = Atomic(int)
+    with pytest.raises(TypeError):
+        dynamic._key_counter['a'] += 1
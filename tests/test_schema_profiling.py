@@ -0,0 +1,66 @@
+import pstats
+import threading
+import jsonschema_inference
+from jsonschema_inference.schema.objs import Atomic, Array, Record, Union
+from jsonschema_inference.schema.objs.accumulator import Accumulator
+from jsonschema_inference.schema.inference import InferenceEngine
+from jsonschema_inference.schema.profiling import profile_merges
+
+
+def test_profile_merges():
+    left = Record({'a': Atomic(int), 'b': Array(Atomic(int))})
+    right = Record({'a': Atomic(int), 'b': Array(Atomic(str))})
+    with profile_merges(slowest=3) as profile:
+        result = left | right
+    assert result is Record({'a': Atomic(int), 'b': Array(Union({Atomic(int), Atomic(str)}))})
+    report = profile.report()
+    pairs = {(pair['left'], pair['right']): pair['count'] for pair in report['pairs']}
+    assert pairs == {('Record', 'Record'): 1, ('Atomic', 'Atomic'): 2, ('Array', 'Array'): 1}
+    assert report['merges'] == 4
+    assert report['unions'] == {'created': 1, 'max_size': 2, 'mean_size': 2., 'grown': 1}
+    assert [slow['path'] for slow in report['slowest']][0] == '$'
+    assert {slow['path'] for slow in report['slowest']} <= {'$', '$.a', '$.b', '$.b[]'}
+    # NOTE: the original methods are restored
+    assert Record.__or__.__name__ == '__or__' and not hasattr(Record.__or__, '__wrapped__')
+
+
+def test_inference_engine_profile(tmp_path):
+    dump_path = str(tmp_path / 'profile.pstats')
+    jsons = [{'id': i, 'tags': [str(i)] * (i % 3), f'key_{i % 4}': i} for i in range(50)]
+    jsonschema_inference.init(profile=True, profile_dump=dump_path)
+    try:
+        engine = InferenceEngine(batch_size=10)
+        schema = engine.get_schema_iteratively(jsons)
+    finally:
+        jsonschema_inference.init()
+    assert engine.profile['merges'] > 0
+    assert engine.profile['dynamic_records']['max_size'] == 6
+    assert pstats.Stats(dump_path).total_calls > 0
+    engine = InferenceEngine(batch_size=10)
+    assert engine.get_schema_iteratively(jsons) is schema
+    assert engine.profile is None
+
+
+def test_nested_profile_merges():
+    left = Record({'a': Atomic(int)})
+    right = Record({'a': Atomic(str)})
+    with profile_merges() as outer:
+        left | right
+        with profile_merges() as inner:
+            left | left
+        assert Accumulator.in_place is False and hasattr(Record.__or__, '__wrapped__')
+        # the merges of another thread are only recorded by its own profile
+        reports = []
+
+        def run():
+            with profile_merges() as profile:
+                right | right
+            reports.append(profile.report())
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        assert hasattr(Record.__or__, '__wrapped__')
+    assert inner.report()['merges'] == 1
+    assert outer.report()['merges'] == 2 + 1
+    assert reports[0]['merges'] == 1
+    assert Accumulator.in_place is True and not hasattr(Record.__or__, '__wrapped__')
@@ -0,0 +1,95 @@
+from collections import Counter
+from jsonschema_inference.schema.objs import Record, Array, Atomic, Optional, DynamicRecord, Unknown
+from jsonschema_inference.schema.shape import fingerprint, ShapeCache, fit_batch, shape_cache
+from jsonschema_inference.schema.fitter import sampling_stats, reset_sampling_stats
+from jsonschema_inference.schema.inference.base import InferenceEngine
+from jsonschema_inference.schema.inference.reduce import reduce_schema, merge_repeatedly
+from jsonschema_inference import fit
+from jsonschema_inference.config import config
+import jsonschema_inference
+
+
+def test_fingerprint():
+    assert fingerprint({'a': 1, 'b': 'x'}) == fingerprint({'a': 2, 'b': 'y'})
+    assert fingerprint({'a': 1}) != fingerprint({'a': 1.0})
+    assert fingerprint({'a': 1}) != fingerprint({'a': True})
+    assert fingerprint({'a': None}) != fingerprint({'a': [None]})
+    assert fingerprint([1, 2, 3]) == fingerprint([4])
+    assert fingerprint([1, 'a', 2]) != fingerprint([1, 2, 'a'])
+    assert fingerprint([{'a': 1}, {'a': 2}]) != fingerprint([{'a': 1}])
+
+
+def test_shape_cache():
+    jsonschema_inference.init()
+    cache = ShapeCache(maxsize=2)
+    assert cache.fit({'a': 1}) is fit({'a': 1})
+    assert cache.fit({'a': 2}) is fit({'a': 1})
+    cache.fit({'b': 1})
+    cache.fit({'c': 1})
+    assert cache.cache_info() == (1, 3, 2, 2)
+    cache.fit({'a': 1})
+    assert cache.cache_info().misses == 4
+    cache.clear()
+    assert cache.cache_info() == (0, 0, 2, 0)
+
+
+def test_merge_repeatedly():
+    jsonschema_inference.init()
+    record_a = Record({'a': Atomic(int)})
+    record_ab = Record({'a': Atomic(int), 'b': Array(
+        Record({'c': Atomic(str)}) | Record({'d': Atomic(str)}))})
+    for acc in [Unknown(), record_a, Optional(record_a), Array(record_ab)]:
+        for schema in [record_a, record_ab, Atomic(None), Array(record_ab)]:
+            for times in [1, 2, 3, 10]:
+                expected = reduce_schema([acc] + [schema] * times)
+                assert merge_repeatedly(acc, schema, times) == expected
+
+
+def test_fit_batch():
+    jsonschema_inference.init()
+    batch = [{'a': 1}] * 5 + [{'a': 1, 'b': [{'c': 'x'}, {'d': 'y'}]}] * 3
+    assert fit_batch(batch) == reduce_schema(map(fit, batch))
+    assert fit_batch(batch) == DynamicRecord({
+        'a': Atomic(int),
+        'b': Array(DynamicRecord({'c': Atomic(str), 'd': Atomic(str)},
+                                 Counter({'c': 3, 'd': 3})))
+    }, Counter({'a': 4, 'b': 3}))
+    assert fit_batch([]) == Unknown()
+    assert fit_batch([1, None, 1.5]) == Optional(Atomic(int) | Atomic(float))
+
+
+def test_fit_batch_interleaved_shapes():
+    jsonschema_inference.init()
+    batches = [
+        [{'a': 1}, {'a': 1, 'b': 2}, {'a': 1}],
+        [{'a': 1}, {'b': 'x'}, {'a': 1}, {'a': 1}, {'b': 'x'}, {'c': None}, {'a': 1}],
+    ]
+    for batch in batches:
+        expected = reduce_schema(map(fit, batch))
+        assert fit_batch(batch) is expected
+        assert fit_batch(batch)._key_counter == expected._key_counter
+    assert fit_batch(batches[0])._key_counter == Counter({'a': 3, 'b': 1})
+
+
+def test_shape_cache_sampling():
+    jsonschema_inference.init(array_sample_size=10)
+    # only the sampled elements are walked (and the sampling is counted once per document)
+    long_array = list(range(100)) + ['a']
+    assert fingerprint(long_array) == fingerprint([1])
+    reset_sampling_stats()
+    assert fit_batch([{'a': long_array}] * 3 + [{'a': long_array, 'b': 1}]) is fit_batch(
+        [{'a': [1]}] * 3 + [{'a': [1], 'b': 1}])
+    assert sampling_stats() == (4, 404, 40)
+    # also on the cache hits, and by the columnar fitting
+    fit_batch([{'a': long_array}] * 2)
+    assert sampling_stats() == (6, 606, 60)
+    InferenceEngine.get_schema([{'a': long_array}] * 2)
+    assert sampling_stats() == (8, 808, 80)
+    # the schema of a shape depends on the sample size
+    assert shape_cache.fit(long_array) is Array(Atomic(int))
+    # (the config alone, without clearing the cache)
+    config.init(array_sample_size=0)
+    assert shape_cache.fit(long_array) is Array(Atomic(int) | Atomic(str))
+    # and the schemas cached under the previous config are dropped by init
+    jsonschema_inference.init()
+    assert shape_cache.cache_info().currsize == 0
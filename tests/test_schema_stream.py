@@ -0,0 +1,77 @@
+import io
+import json
+import pytest
+from jsonschema_inference.schema.stream import basic_parse, fit_stream, fit_events, iter_fit_events, StreamFitter
+from jsonschema_inference.schema.objs import Unknown
+from jsonschema_inference.schema.fitter import sampling_stats, reset_sampling_stats
+from jsonschema_inference import fit
+import jsonschema_inference
+
+DOCS = [
+    1, 1.5, -2e-3, 'a', True, None, [], {},
+    [1, None, 2.5, 'x'],
+    {'a': 1, 'b': [{'c': 'x'}, {'c': None, 'd': [1, 2]}], 'e': {}},
+    {'1': {'a': 5, 'b': 6}, '2': {'a': 34, 'b': None}},
+    {'1': [{'a': 5}], '2': [{'a': 34, 'b': None}]},
+    {'esc\\"aped é 😀': ['\n', {'k': [[], [[1]]]}]},
+]
+
+
+@pytest.mark.parametrize('use_ijson', [False, True])
+def test_fit_stream(use_ijson):
+    if use_ijson:
+        pytest.importorskip('ijson')
+    for unify_records in [True, False]:
+        jsonschema_inference.init(unify_records=unify_records)
+        for doc in DOCS:
+            data = json.dumps(doc, ensure_ascii=False).encode()
+            # small buffers split the tokens across reads
+            for buf_size in [1, 3, 1024]:
+                events = basic_parse(io.BytesIO(data), buf_size=buf_size,
+                                     use_ijson=use_ijson)
+                schema = next(iter_fit_events(events))
+                assert schema == fit(doc)
+            assert fit_stream(data) == fit(doc)
+    jsonschema_inference.init()
+
+
+def test_builtin_basic_parse():
+    events = list(basic_parse('{"a": [1, 2.0, "x", null, true]} [] 3', use_ijson=False))
+    assert events == [
+        ('start_map', None), ('map_key', 'a'), ('start_array', None),
+        ('number', 1), ('number', 2.0), ('string', 'x'), ('null', None),
+        ('boolean', True), ('end_array', None), ('end_map', None),
+        ('start_array', None), ('end_array', None), ('number', 3)]
+    with pytest.raises(ValueError):
+        list(basic_parse('{"a": tru}', use_ijson=False))
+
+
+def test_stream_fitter():
+    fitter = StreamFitter()
+    schemas = [fitter.feed(event, value) for event, value in basic_parse(
+        '[{"a": 1}, {"a": 2, "b": 3}]', use_ijson=False)]
+    assert schemas[:-1] == [None] * (len(schemas) - 1)
+    assert schemas[-1] == fit([{'a': 1}, {'a': 2, 'b': 3}])
+    assert fitter.depth == 0
+    assert fit_events([]) == Unknown()
+
+
+def test_fit_stream_sampling():
+    jsonschema_inference.init(array_sample_size=4)
+    docs = [
+        list(range(10)) + ['x'],
+        [1] * 7 + [None] * 5 + [1.5] * 3,
+        [{'a': i} if i % 3 else {'b': i} for i in range(13)] + [[]],
+        {'a': [[1, 'x'][i % 2] for i in range(9)], 'b': [1, 2, 3]},
+    ]
+    for doc in docs:
+        expected = fit(doc)
+        reset_sampling_stats()
+        fit(doc)
+        stats = sampling_stats()
+        reset_sampling_stats()
+        # the same elements are sampled as by the batch fitter
+        assert fit_stream(json.dumps(doc), buf_size=5) == expected
+        assert sampling_stats() == stats
+    reset_sampling_stats()
+    jsonschema_inference.init()
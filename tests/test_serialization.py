@@ -0,0 +1,74 @@
+import pickle
+from collections import Counter
+import pytest
+from jsonschema_inference.schema.serialization import dumps, loads, MAGIC
+from jsonschema_inference.schema.inference.reduce import reduce_schema
+from jsonschema_inference.schema.objs import (
+    Unknown, Atomic, Union, Optional, Array, Record, DynamicRecord, UniformRecord
+)
+from jsonschema_inference.inference.api import SchemaReducer
+from jsonschema_inference import fit
+import jsonschema_inference
+
+
+def test_dumps_loads():
+    jsonschema_inference.init()
+    schemas = [
+        Unknown(), Atomic(None), Atomic(bool), Atomic(float),
+        Union({Atomic(int), Atomic(str), Array(Unknown())}),
+        Optional(Record({})),
+        UniformRecord(Array(Atomic(int))),
+        DynamicRecord({'a': Atomic(int), 'é😀': Atomic(str)}, Counter({'é😀': 2 ** 40, 'a': 1})),
+        DynamicRecord({'a': Atomic(int)}, Counter()),
+        DynamicRecord({'a': Atomic(int), 'b': Atomic(str)}, Counter({'b': 3, 'a': 1})),
+        Record({'': Atomic(int), 'a\0b': Record({'': Atomic(str)})}),
+        Record({f'key_{i}': Atomic(int) for i in range(300)}),
+        reduce_schema(fit(data) for data in [
+            {'a': 1, 'b': [{'c': None}, {'d': 1.5}]},
+            {'a': 'x', 'e': {'1': {'f': 1}, '2': {'f': None}}},
+            [1, 'x', None, [True]]
+        ])
+    ]
+    for schema in schemas:
+        data = dumps(schema)
+        assert loads(data) is schema
+        assert loads(bytearray(data)) is schema
+        assert dumps(loads(data)) == data
+    # the children shared with other children are stored once
+    atoms = [Atomic(int), Atomic(str), Atomic(float), Atomic(bool)]
+    for schema in [Record({'a': Optional(atom), 'b': atom, 'c': Array(Optional(atom))}) for atom in atoms] + \
+            [Union({Array(atom), atom}) for atom in atoms]:
+        assert loads(dumps(schema)) is schema
+    # smaller than pickle
+    assert len(dumps(schemas[-2])) < len(pickle.dumps(schemas[-2]))
+    with pytest.raises(ValueError):
+        loads(b'not a schema')
+    with pytest.raises(ValueError):
+        loads(b'JSI\xff')
+    with pytest.raises(ValueError):
+        dumps(Atomic(complex))
+
+
+def test_pickle():
+    schema = fit({'a': [1, None], 'b': {'c': 'x'}})
+    data = pickle.dumps((schema, ['1']))
+    assert MAGIC in data
+    assert pickle.loads(data) == (schema, ['1'])
+    # NOTE: the atoms not supported by the binary format are pickled node by node
+    unsupported = Record({'a': Atomic(complex)})
+    assert pickle.loads(pickle.dumps(unsupported)) is unsupported
+
+
+def test_schema_reducer_dump(tmp_path):
+    path = str(tmp_path / 'schema.pickle')
+    reducer = SchemaReducer(None, dump_file_path=path)
+    reducer.save()
+    assert SchemaReducer(None, dump_file_path=path).union_schema is None
+    schema = fit({'a': [1, None]})
+    reducer._current_schema = schema
+    reducer.save()
+    assert SchemaReducer(None, dump_file_path=path).union_schema is schema
+    # dumps of the previous versions
+    with open(path, 'wb') as f:
+        pickle.dump(schema, f)
+    assert SchemaReducer(None, dump_file_path=path).union_schema is schema